@@ -1,8 +1,14 @@
+import hashlib
 import re
 from htmlnode import *
 from textnode import TextNode, TextType, split_nodes_delimiter, text_node_to_html_node
+from highlight import fence_language, highlight
+from lrucache import SizedLRUCache
 from enum import Enum
 
+# Bump whenever the HTML produced for a given markdown changes, so cached renders are dropped
+PARSER_VERSION = 6
+
 class BlockType(Enum):
     PARAGRAPH = 1
     HEADING = 2
@@ -11,8 +17,34 @@ class BlockType(Enum):
     UNORDERED_LIST = 5
     ORDERED_LIST = 6
 
+# Images and links in one alternation: the optional "!" decides which one matched. Image and
+# link matches can never overlap, so one left-to-right scan finds the same spans as running
+# split_nodes_image and then split_nodes_link. Neither bracket class can cross the bracket
+# that would end it, so every attempt stops at the next [ ] ( or ) and the scan is linear.
+INLINE_LINK_RE = re.compile(r"(!?)\[([^\[\]]*)\]\(([^\(\)]*)\)")
+INLINE_DELIMITER_RE = re.compile(r"\*\*|_|`")
+ORDERED_ITEM_RE = re.compile(r"\d+\.\s*")
+DELIMITER_TEXT_TYPES = {
+    "**": TextType.BOLD_TEXT,
+    "_": TextType.ITALIC_TEXT,
+    "`": TextType.CODE_TEXT,
+}
+
+
+def iter_link_spans(text):
+    """
+    Find every image and link in text in one left-to-right scan.
+
+    :param text: The input text.
+    :return: An iterator of (is_image, start, end, text, url); start and end are the offsets
+        of the whole ![text](url) or [text](url) span.
+    """
+    for match in INLINE_LINK_RE.finditer(text):
+        yield match.group(1) == "!", match.start(), match.end(), match.group(2), match.group(3)
+
+
 def extract_markdown_images(text):
-    return re.findall(r"!\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    return [(alt, url) for is_image, _, _, alt, url in iter_link_spans(text) if is_image]
 
 def extract_markdown_links(text):
     """
@@ -21,64 +53,105 @@ def extract_markdown_links(text):
     :param text: The input text containing markdown links.
     :return: A list of tuples containing the link text and URL.
     """
-    return re.findall(r"(?<!!)\[([^\[\]]*)\]\(([^\(\)]*)\)", text)
+    return [(anchor, url) for is_image, _, _, anchor, url in iter_link_spans(text) if not is_image]
 
 
-def split_nodes_image(old_nodes):
+def _split_spans(old_nodes, want_images, text_type):
+    """
+    Split the normal text nodes of old_nodes around their image (or link) spans, slicing at
+    the offsets iter_link_spans reports instead of searching for each span again.
+    """
     new_nodes = []
     for old_node in old_nodes:
         if old_node.text_type != TextType.NORMAL_TEXT:
             new_nodes.append(old_node)
             continue
         original_text = old_node.text
-        images = extract_markdown_images(original_text)
-        if len(images) == 0:
+        pos = 0
+        for is_image, start, end, text, url in iter_link_spans(original_text):
+            if is_image != want_images:
+                continue
+            if start > pos:
+                new_nodes.append(TextNode(original_text[pos:start], TextType.NORMAL_TEXT))
+            new_nodes.append(TextNode(text, text_type, url))
+            pos = end
+        if pos == 0:
             new_nodes.append(old_node)
-            continue
-        for image in images:
-            sections = original_text.split(f"![{image[0]}]({image[1]})", 1)
-            if len(sections) != 2:
-                raise ValueError("invalid markdown, image section not closed")
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.NORMAL_TEXT))
-            new_nodes.append(
-                TextNode(
-                    image[0],
-                    TextType.IMAGE,
-                    image[1],
-                )
-            )
-            original_text = sections[1]
-        if original_text != "":
-            new_nodes.append(TextNode(original_text, TextType.NORMAL_TEXT))
+        elif pos < len(original_text):
+            new_nodes.append(TextNode(original_text[pos:], TextType.NORMAL_TEXT))
     return new_nodes
 
 
+def split_nodes_image(old_nodes):
+    return _split_spans(old_nodes, True, TextType.IMAGE)
+
+
 def split_nodes_link(old_nodes):
-    new_nodes = []
-    for old_node in old_nodes:
-        if old_node.text_type != TextType.NORMAL_TEXT:
-            new_nodes.append(old_node)
-            continue
-        original_text = old_node.text
-        links = extract_markdown_links(original_text)
-        if len(links) == 0:
-            new_nodes.append(old_node)
-            continue
-        for link in links:
-            sections = original_text.split(f"[{link[0]}]({link[1]})", 1)
-            if len(sections) != 2:
-                raise ValueError("invalid markdown, link section not closed")
-            if sections[0] != "":
-                new_nodes.append(TextNode(sections[0], TextType.NORMAL_TEXT))
-            new_nodes.append(TextNode(link[0], TextType.LINKS, link[1]))
-            original_text = sections[1]
-        if original_text != "":
-            new_nodes.append(TextNode(original_text, TextType.NORMAL_TEXT))
-    return new_nodes
-    
+    return _split_spans(old_nodes, False, TextType.LINKS)
+
 
 def text_to_textnodes(text):
+    """
+    Convert a line of inline markdown to a list of TextNode objects in a single pass.
+
+    Produces exactly the same nodes (and the same ValueError on unclosed delimiters) as
+    text_to_textnodes_reference, but in linear time and without building intermediate lists.
+    :param text: The inline markdown text.
+    :return: A list of TextNode objects.
+    """
+    nodes = []
+    pos = 0
+    for match in INLINE_LINK_RE.finditer(text):
+        start = match.start()
+        if start > pos:
+            scan_delimiters(text, pos, start, nodes)
+        if match.group(1):
+            nodes.append(TextNode(match.group(2), TextType.IMAGE, match.group(3)))
+        else:
+            nodes.append(TextNode(match.group(2), TextType.LINKS, match.group(3)))
+        pos = match.end()
+    if pos < len(text):
+        scan_delimiters(text, pos, len(text), nodes)
+    return nodes
+
+
+def scan_delimiters(text, start, end, nodes):
+    """
+    Append the bold/italic/code spans of text[start:end] to nodes.
+
+    Mirrors the chained split_nodes_delimiter passes: "**" splits first, so "_" and "`" are
+    literal inside bold; "_" splits next, so "`" is literal inside italic. Crossing one of
+    those boundaries, or leaving a span open, is the same error the chained passes raise.
+    """
+    open_delimiter = None
+    last = start
+    for match in INLINE_DELIMITER_RE.finditer(text, start, end):
+        delimiter = match.group()
+        if open_delimiter is None:
+            if match.start() > last:
+                nodes.append(TextNode(text[last:match.start()], TextType.NORMAL_TEXT))
+            open_delimiter = delimiter
+            last = match.end()
+        elif delimiter == open_delimiter:
+            if match.start() > last:
+                nodes.append(TextNode(text[last:match.start()], DELIMITER_TEXT_TYPES[delimiter]))
+            open_delimiter = None
+            last = match.end()
+        elif open_delimiter == "**" or (open_delimiter == "_" and delimiter == "`"):
+            continue
+        else:
+            raise ValueError("invalid markdown, formatted section not closed")
+    if open_delimiter is not None:
+        raise ValueError("invalid markdown, formatted section not closed")
+    if end > last:
+        nodes.append(TextNode(text[last:end], TextType.NORMAL_TEXT))
+
+
+def text_to_textnodes_reference(text):
+    """
+    The original chain of splitting passes, kept as the reference text_to_textnodes is
+    tested against.
+    """
     #Just use all your splitting functions one after the other.
     nodes = [TextNode(text, TextType.NORMAL_TEXT)]
     nodes = split_nodes_image(nodes)
@@ -89,22 +162,76 @@ def text_to_textnodes(text):
     return nodes
 
 
-def markdown_to_blocks(markdown):
+class Block:
+    """
+    One block of a markdown document: its type, its stripped text and the 1-based line
+    number it starts on.
     """
-    Convert markdown text to a list of TextNode objects.
 
-    :param markdown: The input markdown text.
-    :return: A list of TextNode objects representing the parsed markdown.
+    __slots__ = ("type", "text", "line")
+
+    def __init__(self, block_type, text, line):
+        self.type = block_type
+        self.text = text
+        self.line = line
+
+    def __repr__(self):
+        return f"Block({self.type}, {self.text!r}, line={self.line})"
+
+
+def iter_blocks(markdown):
+    """
+    Walk the markdown once, line by line, yielding typed Blocks lazily.
+
+    Blocks are separated by empty lines, except inside a ``` fence, where empty lines belong
+    to the code. Callers that only need the start of a document (like extract_title) stop
+    early and never scan the rest.
     """
-    # Split the markdown into lines
-    lines = markdown.split("\n\n")
-    blocks = []
-    for line in lines:
+    lines = []
+    start = 0
+    in_fence = False
+    for number, line in enumerate(markdown.split("\n"), 1):
+        if in_fence:
+            lines.append(line)
+            # A closing fence on a line of its own, or at the end of the last line of code
+            stripped = line.strip()
+            if stripped.startswith("```") or stripped.endswith("```"):
+                in_fence = False
+            continue
         if line == "":
+            if lines:
+                block = _make_block(lines, start)
+                if block is not None:
+                    yield block
+                lines = []
             continue
-        line = line.strip()
-        blocks.append(line.strip("\n"))
-    return blocks
+        if not lines:
+            start = number
+            stripped = line.strip()
+            # An opening fence, unless it is closed again on the same line
+            in_fence = stripped.startswith("```") and stripped.count("```") == 1
+        lines.append(line)
+    if lines:
+        block = _make_block(lines, start)
+        if block is not None:
+            yield block
+
+
+def _make_block(lines, start):
+    text = "\n".join(lines).strip()
+    if text == "":
+        return None
+    return Block(block_to_block_type(text), text, start)
+
+
+def markdown_to_blocks(markdown):
+    """
+    Split markdown text into a list of block strings.
+
+    :param markdown: The input markdown text.
+    :return: A list of the stripped text of each block.
+    """
+    return [block.text for block in iter_blocks(markdown)]
 
 def block_to_block_type(block):
     """
@@ -126,10 +253,25 @@ def block_to_block_type(block):
     else:
         return BlockType.PARAGRAPH
     
-def text_to_children(text):
+def rebase_url(url, basepath, assets=None):
+    """
+    Prefix a root-relative URL ("/images/x.png") with basepath; other URLs are returned as is.
+    With assets (an AssetMap), a static file's URL is first swapped for its fingerprinted one.
+    """
+    if assets:
+        url = assets.get(url, url)
+    if basepath != "/" and url.startswith("/"):
+        return basepath + url[1:]
+    return url
+
+
+def text_to_children(text, basepath="/", links=None, assets=None):
     """
     Convert a block of text to its corresponding children nodes using functions from the textnode module and above
     :param text: The input block of text.
+    :param basepath: Prefix for root-relative link and image URLs.
+    :param links: Optional list; ("link" | "image", url) is appended for every link and image, before rebasing.
+    :param assets: Optional AssetMap of fingerprinted static file URLs (and responsive images).
     :return: A list of child nodes representing the parsed text.
     """
     text = text.strip("\n")
@@ -140,79 +282,225 @@ def text_to_children(text):
     # Then convert each TextNode to an HTMLNode
     html_nodes = []
     for text_node in text_nodes:
+        url = text_node.URL
+        if url is not None:
+            if links is not None:
+                links.append(("image" if text_node.text_type == TextType.IMAGE else "link", url))
+            text_node.URL = rebase_url(url, basepath, assets)
         html_node = text_node_to_html_node(text_node)
+        if text_node.text_type == TextType.IMAGE and assets and assets.images is not None:
+            # Responsive images get their size and a srcset of their derivatives
+            attributes = assets.images.attributes(url, basepath)
+            if attributes:
+                html_node.props = {**html_node.props, **attributes}
         html_nodes.append(html_node)
         
     return html_nodes
 
     
-def markdown_to_html_node(markdown):
+def block_to_html_node(block_type, block, basepath="/", links=None, assets=None):
     """
-    we're going to use all the functions above to convert a markdown string to an HTMLNode
+    Convert one block of markdown text of the given BlockType to its HTMLNode.
+    Links and images found in it are appended to links, as text_to_children does.
     """
-    blocks = markdown_to_blocks(markdown)
-    nodes = []
-    for block in blocks:
-        block_type = block_to_block_type(block)
-
-        if block_type == BlockType.PARAGRAPH:
-            nodes.append(ParentNode(tag="p", children=text_to_children(block)))
-        elif block_type == BlockType.HEADING:
-            # Determine heading level by counting #
-            level = 0
-            for char in block:
-                if char == '#':
-                    level += 1
-                else:
-                    break
-            level = min(level, 6)  # Max heading level is h6
-            # Remove the # characters and process the rest
-            text = block.lstrip('#').strip()
-            nodes.append(ParentNode(tag=f"h{level}", children=text_to_children(text)))
-        elif block_type == BlockType.CODE:
-            # For code blocks, don't process inline markdown
-            # Remove the ``` markers and get the content
+    if block_type == BlockType.PARAGRAPH:
+        return ParentNode(tag="p", children=text_to_children(block, basepath, links, assets))
+    elif block_type == BlockType.HEADING:
+        level = heading_level(block)
+        # Remove the # characters and process the rest
+        text = block.lstrip('#').strip()
+        return ParentNode(tag=f"h{level}", children=text_to_children(text, basepath, links, assets))
+    elif block_type == BlockType.CODE:
+        # For code blocks, don't process inline markdown
+        info, code = split_fence(block)
+        if info is None:
+            # Remove the ``` markers and get the content, escaped like every other fence
             content = block.strip('`').strip()
-            text_node = TextNode(content, TextType.CODE_TEXT)
-            html_node = text_node_to_html_node(text_node)
-            nodes.append(ParentNode(tag="pre", children=[html_node]))
-        elif block_type == BlockType.QUOTE:
-            # For quotes, remove the > marker and process the rest
-            text = block.lstrip('>').strip()
-            nodes.append(ParentNode(tag="blockquote", children=text_to_children(text)))
-        elif block_type == BlockType.UNORDERED_LIST:
-            # For unordered lists, remove the - marker and process the rest
-            items = block.split("\n")
-            list_items = []
-            for item in items:
-                item = item.lstrip('-').strip()
-                if item:
-                    list_items.append(ParentNode(tag="li", children=text_to_children(item)))
-            nodes.append(ParentNode(tag="ul", children=list_items))
-        elif block_type == BlockType.ORDERED_LIST:
-            # For ordered lists, remove the number and dot and process the rest
-            items = block.split("\n")
-            list_items = []
-            for item in items:
-                item = re.sub(r"^\d+\.\s*", "", item).strip()
-                if item:
-                    list_items.append(ParentNode(tag="li", children=text_to_children(item)))
-            nodes.append(ParentNode(tag="ol", children=list_items))
+            return ParentNode(tag="pre", children=[LeafNode("code", highlight(content, ""))])
+        # A fence with an info string: its code is escaped, and highlighted when the language has a lexer
+        language = fence_language(info)
+        if language is None:
+            return ParentNode(tag="pre", children=[LeafNode("code", highlight(code, ""))])
+        code_node = LeafNode("code", highlight(code, language), {"class": f"language-{language}"})
+        return ParentNode(tag="pre", children=[code_node])
+    elif block_type == BlockType.QUOTE:
+        # For quotes, remove the > marker and process the rest
+        text = block.lstrip('>').strip()
+        return ParentNode(tag="blockquote", children=text_to_children(text, basepath, links, assets))
+    elif block_type == BlockType.UNORDERED_LIST:
+        # For unordered lists, remove the - marker and process the rest
+        items = block.split("\n")
+        list_items = []
+        for item in items:
+            item = item.lstrip('-').strip()
+            if item:
+                list_items.append(ParentNode(tag="li", children=text_to_children(item, basepath, links, assets)))
+        return ParentNode(tag="ul", children=list_items)
+    elif block_type == BlockType.ORDERED_LIST:
+        # For ordered lists, remove the number and dot and process the rest
+        items = block.split("\n")
+        list_items = []
+        for item in items:
+            match = ORDERED_ITEM_RE.match(item)
+            if match is not None:
+                item = item[match.end():]
+            item = item.strip()
+            if item:
+                list_items.append(ParentNode(tag="li", children=text_to_children(item, basepath, links, assets)))
+        return ParentNode(tag="ol", children=list_items)
+    # For any other type of block, treat it as a paragraph
+    return ParentNode(tag="p", children=text_to_children(block, basepath, links, assets))
+
+
+def split_fence(block):
+    """
+    Split a fenced code block into its info string ("python" in ```python) and its code.
+    The info is None for a fence without one (or a fence closed on its opening line).
+    """
+    first, newline, rest = block.partition("\n")
+    info = first.lstrip("`").strip()
+    if not newline or not info:
+        return None, block
+    if rest.rstrip().endswith("```"):
+        rest = rest.rstrip()[:-3]
+    return info, rest.strip("\n")
+
+
+def heading_level(block):
+    # Determine heading level by counting #
+    level = 0
+    for char in block:
+        if char == '#':
+            level += 1
+        else:
+            break
+    return min(level, 6)  # Max heading level is h6
+
+
+class ParsedPage:
+    """
+    Everything one pass over a markdown document produces: the HTML tree, the title,
+    the headings as (level, text, line) tuples and the links and images as
+    ("link" | "image", url, line) tuples, with URLs as written in the markdown.
+    """
+
+    __slots__ = ("node", "title", "headings", "links")
+
+    def __init__(self, node, title, headings, links=()):
+        self.node = node
+        self.title = title
+        self.headings = headings
+        self.links = links
+
+
+class BlockCache(SizedLRUCache):
+    """
+    The HTML of blocks parsed before, keyed by a hash of the block text (plus the basepath
+    and asset digest it was rendered with), together with the (kind, url) links found in it.
+    parse_page given a BlockCache only parses the blocks whose text it hasn't seen, so
+    re-parsing an edited document costs about the edited blocks, not the whole file.
+    The least recently used fragments are dropped once they add up to more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    @staticmethod
+    def key(text, basepath="/", digest=""):
+        return hashlib.blake2b(f"{basepath}\0{digest}\0{text}".encode("utf-8"), digest_size=16).digest()
+
+    def sizeof(self, entry):
+        return len(entry[0])
+
+    def get(self, key):
+        """
+        Return (html, found) for key, or None.
+        """
+        return super().get(key)
+
+    def put(self, key, html, found):
+        super().put(key, (html, tuple(found)))
+
+
+def parse_page(markdown, basepath="/", assets=None, blocks=None):
+    """
+    Parse a whole page in a single pass over its blocks, collecting the title (the first
+    heading, as extract_title finds it) and every heading along the way.
+    The title is None if the page has no heading.
+    With a BlockCache, each block becomes a raw LeafNode of its cached HTML and only blocks
+    missing from it are parsed; the HTML of the page is the same either way.
+    """
+    nodes = []
+    title = None
+    headings = []
+    found = []
+    links = []
+    digest = assets.digest if assets else ""
+    for block in iter_blocks(markdown):
+        if block.type == BlockType.HEADING:
+            line = block.text.split("\n", 1)[0]
+            if title is None:
+                title = line.strip("#").strip()
+            headings.append((heading_level(block.text), line.lstrip("#").strip(), block.line))
+        if blocks is None:
+            nodes.append(block_to_html_node(block.type, block.text, basepath, found, assets))
         else:
-            # For any other type of block, treat it as a paragraph
-            nodes.append(ParentNode(tag="p", children=text_to_children(block)))
+            nodes.append(_cached_block(blocks, block, basepath, found, assets, digest))
+        if found:
+            links.extend(_link_lines(block, found))
+            found.clear()
     # Return the root node containing all the blocks
-    return ParentNode(tag="div", children=nodes)
+    return ParsedPage(ParentNode(tag="div", children=nodes), title, headings, links)
+
+
+def _cached_block(blocks, block, basepath, found, assets, digest):
+    """
+    The HTML of block as a raw LeafNode, from blocks or parsed and added to it.
+    Links are cached as (kind, url) only; their lines depend on where the block is now.
+    """
+    key = blocks.key(block.text, basepath, digest)
+    cached = blocks.get(key)
+    if cached is None:
+        start = len(found)
+        html = block_to_html_node(block.type, block.text, basepath, found, assets).to_html()
+        blocks.put(key, html, found[start:])
+    else:
+        html, cached_found = cached
+        found.extend(cached_found)
+    return LeafNode(None, html)
+
+
+def _link_lines(block, found):
+    """
+    Attach the source line to the (kind, url) pairs found in block, by finding each
+    "](url)" in order in the block text.
+    """
+    line = block.line
+    position = 0
+    for kind, url in found:
+        index = block.text.find(f"]({url})", position)
+        if index != -1:
+            line += block.text.count("\n", position, index)
+            position = index
+        yield kind, url, line
+
+
+def markdown_to_html_node(markdown, basepath="/", assets=None, blocks=None):
+    """
+    we're going to use all the functions above to convert a markdown string to an HTMLNode
+    Root-relative link and image URLs are prefixed with basepath as the nodes are built.
+    With a BlockCache, blocks parsed before are reused (see parse_page).
+    """
+    return parse_page(markdown, basepath, assets, blocks).node
 
 
 def extract_title(markdown):
     """
     Extract the title from the markdown text.
     The title is assumed to be the first heading (h1) in the markdown.
+    Only the blocks up to the title are scanned.
     """
-    blocks = markdown_to_blocks(markdown)
-    for block in blocks:
-        line = block.strip("\n").split("\n")[0]
-        if line.startswith("#"):
-            return line.strip("#").strip()
-    return ValueError("no title found")
\ No newline at end of file
+    for block in iter_blocks(markdown):
+        if block.type == BlockType.HEADING:
+            return block.text.split("\n", 1)[0].strip("#").strip()
+    return ValueError("no title found")
@@ -1,54 +1,513 @@
+import contextlib
+import html
+import io
+import logging
 import os
-from pathlib import Path
-from ExMarkLink import markdown_to_html_node, extract_title
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ExMarkLink import parse_page
+from frontmatter import split_front_matter
+from manifest import hash_bytes
+from pipeline import Stage, run_pipeline
+from profiler import BuildProfiler, count_nodes, stage
+from siteindex import expand_listings
+from template import load_template
 
-def generate_page(from_path, template_path, dest_path, basepath):
+logger = logging.getLogger(__name__)
 
-    print(f" Generating page from {from_path} to -> {dest_path} using {template_path}")
+
+class PageBuildError(Exception):
+    """
+    Raised when a page can't be generated; names the markdown file that failed.
+    """
+
+    def __init__(self, from_path, error):
+        super().__init__(f"failed to generate {from_path}: {error}")
+        self.from_path = from_path
+
+
+def generate_page(from_path, template_path, dest_path, basepath, manifest=None, cache=None, profiler=None, site=None,
+                  assets=None, search=None, blocks=None):
+    """
+    Generate a single page, skipping it when a manifest is given and neither the markdown,
+    the template, the basepath nor the listings it shows changed since the last build.
+    With a RenderCache, markdown that was rendered before is not parsed again.
+    With a BuildProfiler, the page's stages and counters are recorded into it.
+    With a SiteIndex, {{ pages ... }} listings are filled in from it, and pages it already
+    found unchanged are not read again.
+    With an AssetMap, links to static files point at their fingerprinted names.
+    With a SearchStore, a page that is rendered has its words added to the search index.
+    With a BlockCache, only the blocks of the markdown that weren't parsed before are.
+    The page's front matter (through the SiteIndex) may move it to its slug, pick another
+    template, or leave it out as a draft.
+    Returns True if the page was (re)generated.
+    """
+    meta, listings, deps = _site_inputs(site, from_path)
+    markdown, content_hash = _take_markdown(site, from_path)
+    target = _page_target(site, meta, dest_path, template_path)
+    if target is None:
+        return False
+    dest_path, template_path = target
+    known_hash = None
+    if manifest is not None:
+        template_hash = manifest.template_hash(template_path, assets)
+        known_hash = manifest.known_page_hash(from_path, dest_path, template_hash, basepath, deps, assets)
+    if meta is not None and known_hash == meta.hash:
+        content_hash, generated, links = known_hash, False, None
+    else:
+        content_hash, generated, links = build_page(
+            from_path, template_path, dest_path, basepath, known_hash, cache, profiler, listings, assets, search,
+            blocks, markdown, content_hash,
+        )
+        if meta is not None and content_hash == meta.hash:
+            # Keep one copy of the hash for the index and the manifest
+            content_hash = meta.hash
+    if manifest is not None:
+        manifest.record_page(
+            from_path, dest_path, content_hash, template_hash, basepath, links, deps, _meta_dict(meta), assets
+        )
+    return generated
+
+
+def _take_markdown(site, from_path):
     """
-    Read the markdown file at from_path and store the contents in a variable.
-    Read the template file at template_path and store the contents in a variable."""
-    f = open(from_path)
-    markdown = f.read()
-    f.close()
-    
-    f =  open(template_path)
-    template = f.read()
-    f.close()
+    (markdown, hash) of a page as the SiteIndex read it, or (None, None) if it has to be read.
+    """
+    taken = site.take_markdown(from_path) if site is not None else None
+    return taken or (None, None)
+
+
+def _site_inputs(site, from_path):
+    """
+    (PageMeta, listings, deps) for a page, all None without a SiteIndex.
+    """
+    if site is None:
+        return None, None, None
+    return (site.get(from_path), *site.page_inputs(from_path))
 
+
+def _page_target(site, meta, dest_path, template_path):
     """
-    Use your markdown_to_html_node function and .to_html() method to convert the markdown file to an HTML string.
-    Use the extract_title function to grab the title of the page.
+    (dest_path, template_path) for a page as its front matter has them, or None for a
+    draft the build leaves out. A template is looked up next to the site template; one
+    outside that directory raises PageBuildError.
     """
-    node = markdown_to_html_node(markdown)
-    html = node.to_html()
-    title = extract_title(markdown)
+    if meta is None:
+        return dest_path, template_path
+    if site.excluded(meta):
+        return None
+    if meta.template:
+        template_dir = os.path.abspath(os.path.dirname(template_path))
+        template_path = os.path.join(os.path.dirname(template_path), meta.template)
+        if os.path.commonpath([template_dir, os.path.abspath(template_path)]) != template_dir:
+            raise PageBuildError(meta.source, f"template {meta.template!r} is outside {template_dir}")
+    return meta.output, template_path
+
+
+def _meta_dict(meta):
+    return meta.to_dict() if meta is not None else None
+
+
+def build_page(from_path, template_path, dest_path, basepath, known_hash=None, cache=None, profiler=None, listings=None,
+               assets=None, search=None, blocks=None, markdown=None, content_hash=None):
     """
-    Replace the {{ Title }} and {{ Content }} placeholders in the template with the HTML and title you generated.
+    Read the markdown file at from_path and store the contents in a variable, unless the
+    SiteIndex already did: then markdown and content_hash are passed in (see take_markdown).
+    The template at template_path is compiled once and reused for every page.
+    If the markdown still hashes to known_hash the output is up to date and nothing is written.
+    If cache holds a render of this markdown, its body HTML and title are used as they are.
+    listings fills in the page's {{ pages ... }} paragraphs (see SiteIndex.page_inputs).
+    search, a SearchStore, gets the words of the rendered page.
+    blocks, a BlockCache, holds the HTML of blocks parsed for earlier renders.
+    Returns (content_hash, generated, links), links being the page's (kind, url, line)
+    tuples, or None when nothing was generated. This only touches the filesystem, so it
+    is safe to run in a worker process.
+    """
+    start = time.perf_counter()
+    if markdown is None:
+        with stage(profiler, "read"):
+            markdown, content_hash = read_page(from_path)
+    if known_hash is not None and content_hash == known_hash:
+        return content_hash, False, None
+
+    logger.debug(" Generating page from %s to -> %s using %s", from_path, dest_path, template_path)
+    if listings:
+        markdown = expand_listings(markdown, from_path, listings)
+
+    # Parsed once per build (per worker process), not once per page
+    template = load_template(template_path, basepath, assets)
+    title, content, links, stats = render_page(markdown, basepath, cache, profiler, assets, blocks)
+    if search is not None:
+        with stage(profiler, "search_terms"):
+            search.add(from_path, content_hash, listings, title, content)
+    """
+    Fill the {{ Title }} and {{ Content }} slots of the template with the title and the HTML tree,
+    and the others from the front matter (see page_slots).
     Write the new full HTML page to a file at dest_path. Be sure to create any necessary directories if they don't exist.
     """
-    template = template.replace("{{ Title }}", title).replace("{{ Content }}", html)
-    template = template.replace('href="/', 'href="' + basepath)
-    template = template.replace('src="/', 'src="' + basepath)
+    with stage(profiler, "render_write"), open_output(dest_path) as f:
+        template.render(f, page_slots(template, title, content, markdown))
+    if profiler is not None:
+        profiler.record_page(
+            from_path,
+            seconds=time.perf_counter() - start,
+            output_bytes=os.path.getsize(dest_path),
+            **stats,
+        )
+    return content_hash, True, links
+
+
+def read_page(from_path):
+    """
+    Return the markdown at from_path and its content hash.
+    """
+    with open(from_path) as f:
+        markdown = f.read()
+    return markdown, hash_bytes(markdown.encode("utf-8"))
 
+
+def render_page(markdown, basepath, cache=None, profiler=None, assets=None, blocks=None):
+    """
+    Use parse_page to convert the markdown to an HTML tree and grab the title of the
+    page in the same single pass over its blocks, or take both from cache.
+    With a BlockCache, unchanged blocks are taken from it rather than parsed.
+    Front matter is left out of the body; a title there wins over the first heading.
+    Returns (title, content, links, stats); content is an HTMLNode, or a string when a
+    cache or a BlockCache is used.
+    """
+    stats = {}
+    cached = None
+    if cache is not None:
+        with stage(profiler, "cache_lookup"):
+            cached = cache.get(markdown, basepath, assets.digest if assets else "")
+    if cached is not None:
+        title, content, links = cached
+        stats["cached"] = True
+        return title, content, links, stats
+    with stage(profiler, "parse"):
+        front, body = split_front_matter(markdown)
+        page = parse_page(body, basepath, assets, blocks)
+    content = page.node
+    title = front.get("title") or page.title
+    if title is None:
+        title = "no title found"
+    if profiler is not None:
+        stats["blocks"] = len(content.children)
+        stats["inline_nodes"] = count_nodes(content)
+    if cache is not None or blocks is not None:
+        # The cache needs the body as a string, and cached blocks are already HTML;
+        # otherwise the tree is streamed
+        with stage(profiler, "to_html"):
+            content = content.to_html()
+    if cache is not None:
+        cache.put(markdown, basepath, title, content, page.links, assets.digest if assets else "")
+    return title, content, page.links, stats
+
+
+def page_slots(template, title, content, markdown=None):
+    """
+    The values of the slots of template for a page: its title (escaped) and content, and every
+    other slot from the front matter of its markdown, escaped, with lists joined by commas.
+    Slots the page has no value for are left empty rather than printed. The front matter is
+    part of the markdown, so the manifest and the RenderCache already notice edits to it.
+    """
+    front = split_front_matter(markdown)[0] if markdown else {}
+    values = dict.fromkeys(template.slots, "")
+    for name, value in front.items():
+        if isinstance(value, list):
+            value = ", ".join(map(str, value))
+        elif isinstance(value, bool):
+            value = "true" if value else "false"
+        elif value is None:
+            value = ""
+        values[name.lower()] = html.escape(str(value))
+    values["title"] = html.escape(title)
+    values["content"] = content
+    return values
+
+
+@contextlib.contextmanager
+def open_output(dest_path):
+    """
+    Open dest_path for writing, creating its directories. The file is written next to the
+    destination and renamed into place on success, so a page that fails halfway never
+    leaves a truncated file behind.
+    """
     dest_dir_path = os.path.dirname(dest_path)
     if dest_dir_path != "":
         os.makedirs(dest_dir_path, exist_ok=True)
-    with open(dest_path, "w") as f:
-        f.write(template)    
-    #close files
+    tmp_path = f"{dest_path}.tmp"
+    with open(tmp_path, "w") as f:
+        yield f
+    os.replace(tmp_path, dest_path)
 
-def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath):
+
+def generate_pages_recursive(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, cache=None,
+                             profiler=None, site=None, assets=None, budget=None, search=None):
     """
     Crawl every entry in the content directory
-    For each markdown file found, generate a new .html file using the same template.html. 
+    For each markdown file found, generate a new .html file using the same template.html.
     The generated pages should be written to the public directory in the same directory structure.
+    Pass a BuildManifest to only regenerate the pages that changed, a RenderCache to
+    reuse earlier renders of unchanged markdown, a SiteIndex for pages listing others and
+    an AssetMap to link static files by their fingerprinted names and a SearchStore to
+    collect the words of every page rendered.
+    Pages are generated one at a time as iter_pages finds them, and each page's tree is
+    dropped once it is written; with a MemoryBudget, memory use is checked after every page.
+    """
+    for from_path, dest_path in iter_pages(dir_path_content, dest_dir_path):
+        try:
+            generate_page(from_path, template_path, dest_path, basepath, manifest, cache, profiler, site, assets, search)
+        except PageBuildError:
+            raise
+        except Exception as e:
+            raise PageBuildError(from_path, e) from e
+        if budget is not None:
+            budget.check()
+
+
+def iter_pages(dir_path_content, dest_dir_path):
+    """
+    Yield (from_path, dest_path) for every file under the content directory, in sorted
+    order, mirroring its layout under dest_dir_path with an .html extension.
+    Directories are read with os.scandir and walked with an explicit stack of iterators,
+    so neither memory nor the recursion limit grows with the size or depth of the tree.
     """
-    for filename in os.listdir(dir_path_content):
-        from_path = os.path.join(dir_path_content, filename)
-        dest_path = os.path.join(dest_dir_path, filename)
-        if os.path.isfile(from_path):
-            dest_path = Path(dest_path).with_suffix(".html")
-            generate_page(from_path, template_path, dest_path, basepath)
+    stack = [_sorted_entries(dir_path_content, dest_dir_path)]
+    while stack:
+        for entry, dest_path in stack[-1]:
+            if entry.is_dir():
+                stack.append(_sorted_entries(entry.path, dest_path))
+                break
+            yield entry.path, os.path.splitext(dest_path)[0] + ".html"
         else:
-            generate_pages_recursive(from_path, template_path, dest_path, basepath)
+            stack.pop()
+
+
+def _sorted_entries(dir_path, dest_dir_path):
+    with os.scandir(dir_path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+    for entry in entries:
+        yield entry, os.path.join(dest_dir_path, entry.name)
+
+
+def discover_pages(dir_path_content, dest_dir_path):
+    """
+    Return the list of (from_path, dest_path) pairs iter_pages yields.
+    """
+    return list(iter_pages(dir_path_content, dest_dir_path))
+
+
+_worker_assets = None
+_worker_search = None
+
+
+def _init_worker(assets, search):
+    # The asset map and search store are the same for every page, so they are sent once per worker, not per task
+    global _worker_assets, _worker_search
+    _worker_assets = assets
+    _worker_search = search
+
+
+def _build_page_args(args):
+    *args, listings, markdown, content_hash, profile = args
+    # Workers record into their own profiler and search store; the parent merges what comes back
+    profiler = BuildProfiler() if profile else None
+    result = build_page(
+        *args, profiler=profiler, listings=listings, assets=_worker_assets, search=_worker_search, markdown=markdown,
+        content_hash=content_hash,
+    )
+    recorded = (profiler.events, profiler.pages) if profile else None
+    terms = _worker_search.drain() if _worker_search is not None else None
+    return result, recorded, terms
+
+
+def generate_pages_parallel(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, jobs=None, cache=None,
+                            profiler=None, site=None, assets=None, search=None):
+    """
+    Same output as generate_pages_recursive, but every page is discovered first and then
+    parsed, rendered and written on a pool of jobs worker processes (all cores by default).
+    The manifest is only read and updated here in the parent, in discovery order, so the
+    result doesn't depend on which worker finishes first.
+    Raises PageBuildError naming the source file if any page fails.
+    """
+    pages = discover_pages(dir_path_content, dest_dir_path)
+    if not pages:
+        return
+    tasks = []
+    task_inputs = []
+    for from_path, dest_path in pages:
+        meta, listings, deps = _site_inputs(site, from_path)
+        markdown, content_hash = _take_markdown(site, from_path)
+        target = _page_target(site, meta, dest_path, template_path)
+        if target is None:
+            continue
+        dest_path, page_template = target
+        known_hash = template_hash = None
+        if manifest is not None:
+            template_hash = manifest.template_hash(page_template, assets)
+            known_hash = manifest.known_page_hash(from_path, dest_path, template_hash, basepath, deps, assets)
+        if meta is not None and known_hash == meta.hash:
+            manifest.record_page(
+                from_path, dest_path, known_hash, template_hash, basepath, None, deps, meta.to_dict(), assets
+            )
+            continue
+        tasks.append((
+            from_path, page_template, dest_path, basepath, known_hash, cache, listings, markdown, content_hash,
+            profiler is not None,
+        ))
+        task_inputs.append((deps, _meta_dict(meta), template_hash))
+    if not tasks:
+        return
+
+    jobs = jobs or os.cpu_count() or 1
+    # Batch pages per round trip so IPC overhead stays small next to the parsing work
+    chunksize = max(1, len(tasks) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(assets, search)) as executor:
+        results = executor.map(_build_page_args, tasks, chunksize=chunksize)
+        for (from_path, _, dest_path, *_), (deps, meta, template_hash) in zip(tasks, task_inputs):
+            try:
+                (content_hash, _, links), recorded, terms = next(results)
+            except Exception as e:
+                executor.shutdown(cancel_futures=True)
+                raise PageBuildError(from_path, e) from e
+            if recorded is not None:
+                profiler.merge(*recorded)
+            if terms:
+                search.put(terms)
+            if manifest is not None:
+                manifest.record_page(
+                    from_path, dest_path, content_hash, template_hash, basepath, links, deps, meta, assets
+                )
+
+
+class PageJob:
+    """
+    One page travelling through generate_pages_pipelined. Each stage fills in the next
+    field and drops the ones it consumed, so a queued job holds at most one copy of the page.
+    """
+
+    __slots__ = (
+        "from_path", "dest_path", "template_path", "template_hash", "known_hash", "listings", "deps", "meta",
+        "markdown", "content_hash", "html", "links", "stats", "seconds",
+    )
+
+    def __init__(self, from_path, dest_path, template_path, template_hash=None, known_hash=None, listings=None,
+                 deps=None, meta=None):
+        self.from_path = from_path
+        self.dest_path = dest_path
+        self.template_path = template_path
+        self.template_hash = template_hash
+        self.known_hash = known_hash
+        self.listings = listings
+        self.deps = deps
+        self.meta = meta
+        self.markdown = None
+        self.content_hash = None
+        self.html = None
+        self.links = None
+        self.stats = None
+        self.seconds = 0.0
+
+    @property
+    def unchanged(self):
+        return self.known_hash is not None and self.content_hash == self.known_hash
+
+
+def generate_pages_pipelined(dir_path_content, template_path, dest_dir_path, basepath, manifest=None, cache=None,
+                             profiler=None, io_threads=4, queue_size=32, site=None, assets=None, search=None):
+    """
+    Same output as generate_pages_recursive, but reading, rendering and writing run as
+    separate stages on their own threads, connected by queues of at most queue_size pages.
+    Reads and writes use io_threads threads each, so slow storage (network filesystems,
+    overlay mounts) is waited on in parallel while pages render; a full queue blocks the
+    stage feeding it, so memory stays flat however many pages there are.
+    Raises PageBuildError naming the source file if any page fails.
+    """
+    manifest_lock = threading.Lock()
+
+    def discover():
+        for from_path, dest_path in iter_pages(dir_path_content, dest_dir_path):
+            meta, listings, deps = _site_inputs(site, from_path)
+            markdown, _ = _take_markdown(site, from_path)
+            target = _page_target(site, meta, dest_path, template_path)
+            if target is None:
+                continue
+            dest_path, page_template = target
+            known_hash = template_hash = None
+            if manifest is not None:
+                with manifest_lock:
+                    template_hash = manifest.template_hash(page_template, assets)
+                    known_hash = manifest.known_page_hash(
+                        from_path, dest_path, template_hash, basepath, deps, assets
+                    )
+            job = PageJob(
+                from_path, dest_path, page_template, template_hash, known_hash, listings, deps, _meta_dict(meta)
+            )
+            if meta is not None:
+                # Already read and hashed by the index; if it's unchanged, reading is skipped too
+                job.content_hash = meta.hash
+                if not job.unchanged:
+                    job.markdown = markdown
+            yield job
+
+    def guarded(function):
+        def run(job):
+            start = time.perf_counter()
+            try:
+                function(job)
+            except Exception as e:
+                raise PageBuildError(job.from_path, e) from e
+            job.seconds += time.perf_counter() - start
+            return job
+        return run
+
+    def read(job):
+        if job.unchanged or job.markdown is not None:
+            return
+        with stage(profiler, "read"):
+            job.markdown, job.content_hash = read_page(job.from_path)
+        if job.unchanged:
+            job.markdown = None
+
+    def render(job):
+        if job.unchanged:
+            return
+        logger.debug(" Generating page from %s to -> %s using %s", job.from_path, job.dest_path, job.template_path)
+        if job.listings:
+            job.markdown = expand_listings(job.markdown, job.from_path, job.listings)
+        template = load_template(job.template_path, basepath, assets)
+        title, content, job.links, job.stats = render_page(job.markdown, basepath, cache, profiler, assets)
+        if search is not None:
+            with stage(profiler, "search_terms"):
+                search.add(job.from_path, job.content_hash, job.listings, title, content)
+        with stage(profiler, "render"):
+            buffer = io.StringIO()
+            template.render(buffer, page_slots(template, title, content, job.markdown))
+            job.html = buffer.getvalue()
+        job.markdown = None
+
+    def write(job):
+        if job.unchanged:
+            return
+        with stage(profiler, "write"), open_output(job.dest_path) as f:
+            f.write(job.html)
+        job.stats["output_bytes"] = len(job.html.encode("utf-8"))
+        job.html = None
+
+    stages = [
+        Stage("read", guarded(read), io_threads),
+        # Rendering holds the GIL, so more than one thread would only add contention
+        Stage("render", guarded(render)),
+        Stage("write", guarded(write), io_threads),
+    ]
+    for job in run_pipeline(discover(), stages, queue_size):
+        if profiler is not None and job.stats is not None:
+            profiler.record_page(job.from_path, seconds=job.seconds, **job.stats)
+        if manifest is not None:
+            with manifest_lock:
+                manifest.record_page(
+                    job.from_path, job.dest_path, job.content_hash, job.template_hash, basepath, job.links, job.deps,
+                    job.meta, assets,
+                )
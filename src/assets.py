@@ -0,0 +1,136 @@
+import json
+import os
+import re
+
+from manifest import hash_bytes, hash_file
+
+# Files that are only ever referenced from pages and stylesheets, so their names can change.
+# Anything else (robots.txt, favicon.ico, CNAME, ...) keeps the name clients ask for.
+FINGERPRINT_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".avif",
+    ".woff", ".woff2", ".ttf", ".otf", ".mp4", ".webm", ".mp3", ".pdf",
+}
+FINGERPRINT_LENGTH = 10
+# index.0123456789.css: what a fingerprinted file name looks like
+FINGERPRINTED_RE = re.compile(r"\.[0-9a-f]{%d}\.[^./]+$" % FINGERPRINT_LENGTH)
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+
+
+def fingerprint_name(rel_path, content_hash):
+    """
+    images/tom.png -> images/tom.<first hash characters>.png
+    """
+    root, ext = os.path.splitext(rel_path)
+    if ext.lower() not in FINGERPRINT_EXTENSIONS:
+        return rel_path
+    return f"{root}.{content_hash[:FINGERPRINT_LENGTH]}{ext}"
+
+
+class AssetMap:
+    """
+    The fingerprinted output of every static file, as a lookup table from the URL content
+    and templates use ("/images/tom.png") to the URL it is published at
+    ("/images/tom.0123456789.png").
+
+    Since a fingerprinted name changes whenever the file does, the outputs can be served
+    with a far-future, immutable cache lifetime.
+
+    Without fingerprint files keep their names, and the map only carries the content hash
+    of every file and, in images, an ImageSet giving referenced images a srcset.
+    """
+
+    def __init__(self, static_root, public_root, fingerprint=True):
+        self.static_root = static_root
+        self.public_root = public_root
+        self.fingerprint = fingerprint
+        self.urls = {}
+        self.outputs = {}
+        self.hashes = {}
+        self._images = None
+        self._digest = None
+
+    @classmethod
+    def build(cls, static_root, public_root, manifest=None, fingerprint=True):
+        """
+        Hash every file under static_root. With a manifest, files whose size and mtime match
+        the last build reuse the recorded hash instead of being read again.
+        """
+        assets = cls(static_root, public_root, fingerprint)
+        for dir_path, _, filenames in os.walk(static_root):
+            for filename in sorted(filenames):
+                from_path = os.path.join(dir_path, filename)
+                assets.add(from_path, _known_hash(manifest, from_path) or hash_file(from_path))
+        return assets
+
+    def add(self, from_path, content_hash):
+        rel_path = os.path.relpath(from_path, self.static_root)
+        self.hashes["/" + rel_path.replace(os.sep, "/")] = content_hash
+        self._digest = None
+        published = fingerprint_name(rel_path, content_hash) if self.fingerprint else rel_path
+        self.outputs[os.path.normpath(from_path)] = os.path.normpath(os.path.join(self.public_root, published))
+        if published != rel_path:
+            self.urls["/" + rel_path.replace(os.sep, "/")] = "/" + published.replace(os.sep, "/")
+
+    def output_path(self, from_path):
+        return self.outputs[os.path.normpath(from_path)]
+
+    def get(self, url, default=None):
+        return self.urls.get(url, default)
+
+    def state(self, url):
+        """
+        What a page linking to url depends on, for the manifest: the URL the file is
+        published at, followed by the srcset of a responsive image. None for URLs that
+        are published as they are.
+        """
+        published = self.urls.get(url)
+        if self.images is not None and url in self.images:
+            srcset = self.images.srcset(url)
+            if srcset:
+                return f"{published or url} {srcset}"
+        return published
+
+    @property
+    def images(self):
+        return self._images
+
+    @images.setter
+    def images(self, images):
+        self._images = images
+        self._digest = None
+
+    @property
+    def digest(self):
+        """
+        Changes whenever any published URL (or image srcset) does; used to key renders
+        that embed them. Read several times per page, so it is computed once per map and
+        again only after add() or a new ImageSet.
+        """
+        if self._digest is None:
+            digest = json.dumps(self.urls, sort_keys=True)
+            if self._images is not None:
+                digest += "\0" + self._images.digest
+            self._digest = hash_bytes(digest.encode("utf-8"))
+        return self._digest
+
+    def write(self, path):
+        """
+        Write the URL mapping as JSON, for deploy tooling and anything else that needs to
+        find an asset by its original name.
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.urls, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, path)
+
+
+def _known_hash(manifest, from_path):
+    if manifest is None:
+        return None
+    entry = manifest.static.get(os.path.normpath(from_path))
+    if entry is None:
+        return None
+    st = os.stat(from_path)
+    if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["hash"]
+    return None
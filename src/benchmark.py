@@ -0,0 +1,427 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from htmlnode import LeafNode, ParentNode
+from textnode import TextNode, TextType
+from ExMarkLink import (
+    BlockType,
+    block_to_block_type,
+    extract_markdown_images,
+    extract_markdown_links,
+    markdown_to_blocks,
+    markdown_to_html_node,
+    text_to_textnodes,
+    text_to_textnodes_reference,
+)
+from Generate import discover_pages, iter_pages, read_page, render_page
+from copystatic import sync_files
+from corpus import CorpusShape, generate_site
+from manifest import BuildManifest
+from memory import peak_rss
+from search import SEARCH_DIR, SearchStore, write_search_index
+from siteindex import SiteIndex
+from template import load_template
+
+INLINE_BLOCK_TYPES = (BlockType.PARAGRAPH, BlockType.HEADING, BlockType.QUOTE)
+
+
+def peak_rss_kb():
+    peak = peak_rss()
+    return None if peak is None else peak // 1024
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class StageTimer:
+    """
+    Collects the best-of-N wall time of each build stage plus the bytes it processed.
+    """
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.stages = {}
+
+    @contextlib.contextmanager
+    def stage(self, name, nbytes=0):
+        start = time.perf_counter()
+        yield
+        seconds = time.perf_counter() - start
+        previous = self.stages.get(name)
+        if previous is None or seconds < previous["seconds"]:
+            self.stages[name] = {
+                "seconds": seconds,
+                "pages_per_s": self.pages / seconds if seconds else None,
+                "mb_per_s": nbytes / seconds / 1e6 if seconds and nbytes else None,
+                "bytes": nbytes,
+            }
+        # The process peak so far, whichever repeat produced the best time
+        self.stages[name]["peak_rss_kb"] = peak_rss_kb()
+
+
+def run_benchmark(site, out_dir, repeat=1):
+    """
+    Time every build stage separately over the site produced by corpus.generate_site.
+    Each stage consumes the output of the previous one, so their costs don't overlap.
+    """
+    pages = discover_pages(site["content"], out_dir)
+    timer = StageTimer(len(pages))
+    template = load_template(site["template"], "/")
+
+    for _ in range(repeat):
+        with timer.stage("discovery"):
+            pages = discover_pages(site["content"], out_dir)
+
+        sources = []
+        with timer.stage("read", site["markdown_bytes"]):
+            for from_path, _ in pages:
+                with open(from_path) as f:
+                    sources.append(f.read())
+
+        with timer.stage("markdown_to_blocks", site["markdown_bytes"]):
+            all_blocks = [markdown_to_blocks(markdown) for markdown in sources]
+
+        inline_texts = [
+            block.replace("\n", " ")
+            for blocks in all_blocks
+            for block in blocks
+            if block_to_block_type(block) in INLINE_BLOCK_TYPES
+        ]
+        inline_bytes = sum(len(text) for text in inline_texts)
+        with timer.stage("text_to_textnodes", inline_bytes):
+            for text in inline_texts:
+                text_to_textnodes(text)
+
+        with timer.stage("markdown_to_html_node", site["markdown_bytes"]):
+            nodes = [markdown_to_html_node(markdown) for markdown in sources]
+
+        with timer.stage("to_html"):
+            bodies = [node.to_html() for node in nodes]
+        html_bytes = sum(len(body) for body in bodies)
+        if timer.stages["to_html"]["seconds"]:
+            # The output size is only known once the stage has run
+            timer.stages["to_html"]["mb_per_s"] = html_bytes / timer.stages["to_html"]["seconds"] / 1e6
+
+        rendered = []
+        with timer.stage("template_fill", html_bytes):
+            for node in nodes:
+                buffer = io.StringIO()
+                template.render(buffer, {"title": "Title", "content": node})
+                rendered.append(buffer.getvalue())
+        output_bytes = sum(len(page) for page in rendered)
+
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        with timer.stage("write", output_bytes):
+            for (_, dest_path), page in zip(pages, rendered):
+                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                with open(dest_path, "w") as f:
+                    f.write(page)
+
+        static_bytes = sum(
+            os.path.getsize(os.path.join(dir_path, filename))
+            for dir_path, _, filenames in os.walk(site["static"])
+            for filename in filenames
+        )
+        # As a clean build syncs them: with a fresh manifest, so every file is also hashed
+        manifest = BuildManifest()
+        with timer.stage("static_sync", static_bytes):
+            sync_files(site["static"], out_dir, manifest, False, 8, None)
+
+        del sources, all_blocks, nodes, bodies, rendered
+    return timer.stages
+
+
+class LegacyTextNode:
+    """
+    TextNode as it was before __slots__, kept to measure the difference.
+    """
+
+    def __init__(self, text, text_type, URL=None):
+        self.text = text
+        self.text_type = text_type
+        self.URL = URL
+
+
+class LegacyHTMLNode:
+    """
+    HTMLNode as it was before __slots__: a __dict__ plus fresh empty containers per node.
+    """
+
+    def __init__(self, tag=None, value=None, children=None, props=None):
+        self.tag = tag
+        self.value = value if value else {}
+        self.children = children if children else []
+        self.props = props if props else {}
+
+
+def node_memory(count=100_000):
+    """
+    Measure the bytes per node of the legacy and the slotted node classes with tracemalloc.
+    Node fields point at shared objects, so only the nodes themselves are counted.
+    """
+    leaf = LeafNode(None, "text")
+    children = [leaf]
+    factories = {
+        "TextNode": (
+            lambda: LegacyTextNode("text", TextType.NORMAL_TEXT),
+            lambda: TextNode("text", TextType.NORMAL_TEXT),
+        ),
+        "LeafNode": (
+            lambda: LegacyHTMLNode(None, "text", []),
+            lambda: LeafNode(None, "text"),
+        ),
+        "ParentNode": (
+            lambda: LegacyHTMLNode("p", {}, children),
+            lambda: ParentNode("p", children),
+        ),
+    }
+    results = {}
+    for name, (legacy, slotted) in factories.items():
+        per_node = []
+        for factory in (legacy, slotted):
+            tracemalloc.start()
+            nodes = [factory() for _ in range(count)]
+            allocated = tracemalloc.get_traced_memory()[0] - sys.getsizeof(nodes)
+            tracemalloc.stop()
+            del nodes
+            per_node.append(allocated / count)
+        results[name] = {"legacy_bytes": per_node[0], "slotted_bytes": per_node[1]}
+    return results
+
+
+def print_node_memory(results):
+    print(f"{'node':<24}{'legacy B':>10}{'slotted B':>12}{'saved':>8}")
+    for name, sizes in results.items():
+        saved = 1 - sizes["slotted_bytes"] / sizes["legacy_bytes"]
+        print(f"{name:<24}{sizes['legacy_bytes']:>10.1f}{sizes['slotted_bytes']:>12.1f}{saved:>7.0%}")
+
+
+def adversarial_inputs(size):
+    """
+    Inline markdown of about size characters built to make a backtracking or re-searching
+    scanner go quadratic: runs of unclosed brackets and parentheses, and many links in a row.
+    """
+    return {
+        "open_brackets": "[" * size,
+        "open_parens": "(" * size,
+        "open_images": "![" * (size // 2),
+        "unclosed_links": "[a](" * (size // 4),
+        "unclosed_text": "[" + "a" * size,
+        "unclosed_url": "[a](" + "b" * size,
+        "nested_brackets": "[" * (size // 2) + "]" * (size // 2),
+        "many_links": "[a](b) " * (size // 7),
+        "many_images": "![a](b) " * (size // 8),
+    }
+
+
+INLINE_FUNCTIONS = {
+    "text_to_textnodes": text_to_textnodes,
+    "extract_markdown_links": extract_markdown_links,
+    "extract_markdown_images": extract_markdown_images,
+    "text_to_textnodes_reference": text_to_textnodes_reference,
+}
+
+
+def inline_microbench(size=20_000, repeat=3):
+    """
+    Time every inline scanner on adversarial_inputs(size) and adversarial_inputs(4 * size).
+    growth is the ratio of the two: about 4 for a linear scanner, 16 for a quadratic one.
+    """
+    results = {}
+    small, large = adversarial_inputs(size), adversarial_inputs(4 * size)
+    for name in small:
+        for function_name, function in INLINE_FUNCTIONS.items():
+            seconds = []
+            for text in (small[name], large[name]):
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    function(text)
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                seconds.append(best)
+            results[f"{name}/{function_name}"] = {
+                "seconds": seconds[0],
+                "seconds_4x": seconds[1],
+                "growth": seconds[1] / seconds[0] if seconds[0] else None,
+            }
+    return results
+
+
+def search_benchmark(shape, pages=50_000):
+    """
+    Build the search index of a synthetic site of pages pages (otherwise shaped like
+    shape) and time its parts: collecting the terms of every page into a cold store (the
+    rendering around it is timed apart, as the build pays for that anyway), merging the
+    store into shards, and merging again after one page changed. Reports the size of the
+    published index and of its largest shard.
+    """
+    shape = CorpusShape(**{**shape.to_dict(), "pages": pages})
+    with tempfile.TemporaryDirectory() as root:
+        generate_site(root, shape)
+        content, public = os.path.join(root, "content"), os.path.join(root, "docs")
+        site = SiteIndex.scan(iter_pages(content, public), public)
+        store = SearchStore(os.path.join(root, "search.sqlite3"))
+        manifest = BuildManifest()
+        render_seconds = terms_seconds = 0.0
+        for meta in site.pages.values():
+            start = time.perf_counter()
+            markdown, content_hash = read_page(meta.source)
+            title, body, _, _ = render_page(markdown, "/")
+            middle = time.perf_counter()
+            store.add(meta.source, content_hash, None, title, body)
+            render_seconds += middle - start
+            terms_seconds += time.perf_counter() - middle
+
+        start = time.perf_counter()
+        counts = write_search_index(store, site, manifest, public)
+        merge_seconds = time.perf_counter() - start
+
+        edited = next(iter(site.pages.values()))
+        with open(edited.source, "a") as f:
+            f.write("\nA brand new paragraph about elbereth.\n")
+        site.update(edited.source, edited.output)
+        start = time.perf_counter()
+        incremental = write_search_index(store, site, manifest, public)
+        incremental_seconds = time.perf_counter() - start
+
+        search_dir = os.path.join(public, SEARCH_DIR)
+        sizes = [os.path.getsize(os.path.join(search_dir, name)) for name in os.listdir(search_dir)]
+        store.close()
+    return {
+        "pages": pages,
+        "render_seconds": render_seconds,
+        "terms_seconds": terms_seconds,
+        "merge_seconds": merge_seconds,
+        "incremental_seconds": incremental_seconds,
+        "incremental_written": incremental["written"],
+        "terms": counts["terms"],
+        "shards": counts["shards"],
+        "index_bytes": sum(sizes),
+        "largest_file_bytes": max(sizes),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def print_search_benchmark(results):
+    print(f"search index over {results['pages']} pages: {results['terms']} terms in {results['shards']} shards, "
+          f"{results['index_bytes'] / 1e6:.2f} MB (largest file {results['largest_file_bytes'] / 1e6:.2f} MB)")
+    print(f"{'step':<24}{'seconds':>10}")
+    for name in ("render", "terms", "merge", "incremental"):
+        print(f"{name:<24}{results[name + '_seconds']:>10.3f}")
+    print(f"one page changed: {results['incremental_written']} files rewritten")
+
+
+def print_inline_microbench(results):
+    print(f"{'input/function':<52}{'s':>10}{'s at 4x':>10}{'growth':>8}")
+    for name, timing in results.items():
+        growth = f"{timing['growth']:.1f}" if timing["growth"] else "-"
+        print(f"{name:<52}{timing['seconds']:>10.5f}{timing['seconds_4x']:>10.5f}{growth:>8}")
+
+
+def compare(results, baseline):
+    """
+    Print how each stage moved relative to a previously saved result file.
+    """
+    print(f"{'stage':<24}{'baseline s':>12}{'current s':>12}{'change':>10}")
+    for name, stage in results["stages"].items():
+        old = baseline["stages"].get(name)
+        if old is None:
+            continue
+        change = (stage["seconds"] - old["seconds"]) / old["seconds"] * 100 if old["seconds"] else 0.0
+        print(f"{name:<24}{old['seconds']:>12.4f}{stage['seconds']:>12.4f}{change:>+9.1f}%")
+
+
+def print_results(results):
+    print(f"{results['pages']} pages, {results['markdown_bytes'] / 1e6:.2f} MB of markdown")
+    print(f"{'stage':<24}{'seconds':>10}{'pages/s':>12}{'MB/s':>10}{'peak RSS MB':>14}")
+    for name, stage in results["stages"].items():
+        pages_per_s = f"{stage['pages_per_s']:.0f}" if stage["pages_per_s"] else "-"
+        mb_per_s = f"{stage['mb_per_s']:.2f}" if stage["mb_per_s"] else "-"
+        rss = f"{stage['peak_rss_kb'] / 1024:.1f}" if stage["peak_rss_kb"] else "-"
+        print(f"{name:<24}{stage['seconds']:>10.4f}{pages_per_s:>12}{mb_per_s:>10}{rss:>14}")
+
+
+def parse_args(argv=None):
+    defaults = CorpusShape()
+    parser = argparse.ArgumentParser(description="Benchmark every build stage on a synthetic site.")
+    for name, value in defaults.to_dict().items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=value)
+    parser.add_argument("--repeat", type=int, default=3, help="report the best of N runs per stage")
+    parser.add_argument("--output", help="save the results as JSON to this path")
+    parser.add_argument("--compare", help="compare against a JSON file saved by a previous run")
+    parser.add_argument("--keep", help="generate the site into this directory and keep it")
+    parser.add_argument("--node-memory", action="store_true", help="also measure bytes per TextNode/LeafNode/ParentNode")
+    parser.add_argument(
+        "--inline-adversarial",
+        type=int,
+        metavar="SIZE",
+        help="also time the inline scanners on adversarial inputs of SIZE and 4 x SIZE characters",
+    )
+    parser.add_argument(
+        "--search",
+        type=int,
+        nargs="?",
+        const=50_000,
+        metavar="PAGES",
+        help="also time building the search index of a separate site of PAGES pages (50000 by default)",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    shape = CorpusShape(**{name: getattr(args, name) for name in CorpusShape().to_dict()})
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.keep or tmp
+        site = generate_site(root, shape)
+        stages = run_benchmark(site, os.path.join(root, "docs"), args.repeat)
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "python": platform.python_version(),
+        "corpus": shape.to_dict(),
+        "pages": shape.pages,
+        "markdown_bytes": site["markdown_bytes"],
+        "stages": stages,
+    }
+    if args.node_memory:
+        results["node_memory"] = node_memory()
+    if args.inline_adversarial:
+        results["inline_adversarial"] = inline_microbench(args.inline_adversarial, args.repeat)
+    if args.search:
+        results["search"] = search_benchmark(shape, args.search)
+    print_results(results)
+    if args.node_memory:
+        print_node_memory(results["node_memory"])
+    if args.inline_adversarial:
+        print_inline_microbench(results["inline_adversarial"])
+    if args.search:
+        print_search_benchmark(results["search"])
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
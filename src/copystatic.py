@@ -1,16 +1,103 @@
+import logging
 import os
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 
+logger = logging.getLogger(__name__)
 
-def copy_files_recursive(source_dir_path, dest_dir_path):
-    if not os.path.exists(dest_dir_path):
-        os.mkdir(dest_dir_path)
 
-    for filename in os.listdir(source_dir_path):
-        from_path = os.path.join(source_dir_path, filename)
-        dest_path = os.path.join(dest_dir_path, filename)
-        print(f" * {from_path} -> {dest_path}")
-        if os.path.isfile(from_path):
-            shutil.copy(from_path, dest_path)
-        else:
-            copy_files_recursive(from_path, dest_path)
+def copy_file(from_path, dest_path, manifest=None, hardlink=False):
+    """
+    Bring a single static file up to date, skipping it when it is unchanged.
+    Without a manifest a destination with the same size and mtime counts as unchanged
+    (copies keep the source mtime, hard links share it).
+    Returns how the file was written ("hardlink", "copy_file_range" or "copy"), or None if skipped.
+    """
+    if manifest is not None:
+        fresh, st, content_hash = manifest.static_is_fresh(from_path, dest_path)
+    else:
+        st = os.stat(from_path)
+        fresh = _same_stat(st, dest_path)
+        content_hash = None
+    method = None
+    if not fresh:
+        method = link_or_copy(from_path, dest_path, hardlink)
+        logger.debug(" * %s -> %s (%s)", from_path, dest_path, method)
+    if manifest is not None:
+        manifest.record_static(from_path, dest_path, st, content_hash)
+    return method
+
+
+def _same_stat(st, dest_path):
+    try:
+        dest_st = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    return dest_st.st_size == st.st_size and dest_st.st_mtime_ns == st.st_mtime_ns
+
+
+def link_or_copy(from_path, dest_path, hardlink=False):
+    """
+    Write dest_path with the cheapest method that works here: a hard link (if allowed),
+    then copy_file_range (which reflinks on copy-on-write filesystems and copies in the
+    kernel elsewhere), then a plain byte copy. The file is written next to the
+    destination and renamed into place, so it is never seen half written.
+    Returns the method that succeeded.
+    """
+    tmp_path = f"{dest_path}.tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    if hardlink:
+        try:
+            os.link(from_path, tmp_path)
+            os.replace(tmp_path, dest_path)
+            return "hardlink"
+        except OSError:
+            # Different filesystem, or links not supported: fall through to a copy
+            pass
+    method = "copy"
+    if hasattr(os, "copy_file_range"):
+        try:
+            _copy_file_range(from_path, tmp_path)
+            method = "copy_file_range"
+        except OSError:
+            method = "copy"
+    if method == "copy":
+        shutil.copyfile(from_path, tmp_path)
+    shutil.copystat(from_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+    return method
+
+
+def _copy_file_range(from_path, dest_path):
+    with open(from_path, "rb") as fsrc, open(dest_path, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+
+
+def sync_files(source_dir_path, dest_dir_path, manifest=None, hardlink=False, jobs=8, assets=None):
+    """
+    Mirror the static tree into the public directory on a pool of jobs threads.
+    With an AssetMap every file is written under its fingerprinted name.
+    Unchanged files are skipped; outputs of deleted sources are removed later by the
+    manifest's remove_stale. Safe to run in a background thread while pages are generated.
+    Returns a dict counting files per method ("hardlink", "copy_file_range", "copy", "unchanged").
+    """
+    pairs = []
+    for dir_path, _, filenames in os.walk(source_dir_path):
+        dest_dir = os.path.normpath(os.path.join(dest_dir_path, os.path.relpath(dir_path, source_dir_path)))
+        os.makedirs(dest_dir, exist_ok=True)
+        for filename in sorted(filenames):
+            from_path = os.path.join(dir_path, filename)
+            dest_path = assets.output_path(from_path) if assets is not None else os.path.join(dest_dir, filename)
+            pairs.append((from_path, dest_path))
+
+    counts = {"hardlink": 0, "copy_file_range": 0, "copy": 0, "unchanged": 0}
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for method in executor.map(lambda pair: copy_file(pair[0], pair[1], manifest, hardlink), pairs):
+            counts[method or "unchanged"] += 1
+    return counts
@@ -0,0 +1,158 @@
+import os
+import random
+
+WORDS = (
+    "the ring of power was forged in the fires of mount doom by sauron the deceiver "
+    "and the fellowship set out from rivendell to destroy it across the misty mountains "
+    "through moria and lothlorien down the great river anduin to the gates of mordor"
+).split()
+
+
+class CorpusShape:
+    """
+    How big and what kind of synthetic site to generate. Densities are per page.
+    """
+
+    def __init__(
+        self,
+        pages=100,
+        depth=2,
+        fanout=4,
+        paragraphs=6,
+        words_per_paragraph=60,
+        lists=2,
+        list_items=5,
+        code_blocks=1,
+        code_lines=8,
+        links=4,
+        images=1,
+        long_paragraphs=0,
+        long_paragraph_words=20000,
+        static_files=20,
+        static_file_size=32 * 1024,
+        seed=0,
+    ):
+        self.pages = pages
+        self.depth = depth
+        self.fanout = fanout
+        self.paragraphs = paragraphs
+        self.words_per_paragraph = words_per_paragraph
+        self.lists = lists
+        self.list_items = list_items
+        self.code_blocks = code_blocks
+        self.code_lines = code_lines
+        self.links = links
+        self.images = images
+        self.long_paragraphs = long_paragraphs
+        self.long_paragraph_words = long_paragraph_words
+        self.static_files = static_files
+        self.static_file_size = static_file_size
+        self.seed = seed
+
+    def to_dict(self):
+        return dict(vars(self))
+
+
+def page_path(index, shape, rng):
+    """
+    Pick a directory (up to shape.depth levels, shape.fanout choices per level) for a page.
+    """
+    parts = [f"section{rng.randrange(shape.fanout)}" for _ in range(rng.randint(0, shape.depth))]
+    parts.append(f"page{index}.md")
+    return os.path.join(*parts)
+
+
+def page_url(path):
+    """
+    The URL a page at path (relative to the content directory) is published at.
+    """
+    return "/" + os.path.splitext(path)[0].replace(os.sep, "/") + ".html"
+
+
+def sentence(rng, words, links=0, images=0, image_names=("image0.png",), page_urls=("/",)):
+    """
+    A run of words with some inline markup sprinkled in, always valid for our parser.
+    Links go to page_urls, images to image_names, so a generated site has no broken links.
+    """
+    out = [rng.choice(WORDS) for _ in range(words)]
+    if words >= 8:
+        out[rng.randrange(len(out))] = f"**{rng.choice(WORDS)}**"
+        out[rng.randrange(len(out))] = f"_{rng.choice(WORDS)}_"
+        out[rng.randrange(len(out))] = f"`{rng.choice(WORDS)}`"
+    for _ in range(links):
+        out.insert(rng.randrange(len(out) + 1), f"[{rng.choice(WORDS)}]({rng.choice(page_urls)})")
+    for _ in range(images):
+        out.insert(rng.randrange(len(out) + 1), f"![{rng.choice(WORDS)}](/images/{rng.choice(image_names)})")
+    return " ".join(out)
+
+
+def generate_markdown(index, shape, rng, image_names=("image0.png",), page_urls=("/",)):
+    blocks = [f"# Page {index} about {rng.choice(WORDS)}"]
+    links_left = shape.links
+    images_left = shape.images
+    for p in range(shape.paragraphs):
+        links = links_left if p == shape.paragraphs - 1 else rng.randint(0, links_left)
+        images = images_left if p == shape.paragraphs - 1 else rng.randint(0, images_left)
+        links_left -= links
+        images_left -= images
+        if p % 3 == 1:
+            blocks.append(f"## {sentence(rng, 4)}")
+        blocks.append(sentence(rng, shape.words_per_paragraph, links, images, image_names, page_urls))
+    for _ in range(shape.lists):
+        if rng.random() < 0.5:
+            blocks.append("\n".join(f"- {sentence(rng, 8)}" for _ in range(shape.list_items)))
+        else:
+            blocks.append("\n".join(f"{i + 1}. {sentence(rng, 8)}" for i in range(shape.list_items)))
+    for _ in range(shape.code_blocks):
+        code = "\n".join(f"    {rng.choice(WORDS)}_{rng.choice(WORDS)} = {rng.randrange(1000)}" for _ in range(shape.code_lines))
+        blocks.append(f"```\n{code}\n```")
+    for _ in range(shape.long_paragraphs):
+        blocks.append(sentence(rng, shape.long_paragraph_words, shape.long_paragraph_words // 50))
+    blocks.append(f"> {sentence(rng, 12)}")
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate_site(root, shape=None):
+    """
+    Write a synthetic site under root: root/content/**.md, root/static/ and root/template.html.
+    Returns a dict with the paths and the total markdown bytes written.
+    """
+    shape = shape or CorpusShape()
+    rng = random.Random(shape.seed)
+    content_dir = os.path.join(root, "content")
+    static_dir = os.path.join(root, "static")
+    image_dir = os.path.join(static_dir, "images")
+    os.makedirs(image_dir, exist_ok=True)
+
+    image_names = [f"image{i}.png" for i in range(max(1, shape.static_files - 1))]
+    for name in image_names:
+        with open(os.path.join(image_dir, name), "wb") as f:
+            f.write(rng.randbytes(shape.static_file_size))
+    with open(os.path.join(static_dir, "index.css"), "w") as f:
+        f.write("body { font-family: serif; }\n" * 32)
+
+    # Placed up front, so pages can link to pages written after them
+    paths = [page_path(index, shape, rng) for index in range(shape.pages)]
+    page_urls = [page_url(path) for path in paths]
+    markdown_bytes = 0
+    for index, rel_path in enumerate(paths):
+        path = os.path.join(content_dir, rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        markdown = generate_markdown(index, shape, rng, image_names, page_urls)
+        with open(path, "w") as f:
+            f.write(markdown)
+        markdown_bytes += len(markdown.encode("utf-8"))
+
+    template_path = os.path.join(root, "template.html")
+    with open(template_path, "w") as f:
+        f.write(
+            "<!doctype html>\n<html>\n  <head>\n    <title>{{ Title }}</title>\n"
+            '    <link href="/index.css" rel="stylesheet" />\n  </head>\n'
+            "  <body>\n    <article>{{ Content }}</article>\n  </body>\n</html>\n"
+        )
+    return {
+        "content": content_dir,
+        "static": static_dir,
+        "template": template_path,
+        "markdown_bytes": markdown_bytes,
+    }
@@ -0,0 +1,56 @@
+class DependencyGraph:
+    """
+    Which inputs every output was built from, and the reverse.
+
+    Inputs are plain strings: a source or template path, or a key such as
+    "listing:content/blog" standing for data gathered from other pages. Outputs may be
+    inputs of other outputs; dependents follows such chains.
+    """
+
+    def __init__(self):
+        self.inputs = {}
+        self.outputs = {}
+
+    @classmethod
+    def from_manifest(cls, manifest, template_dependencies=(), page_templates=None):
+        """
+        Every page depends on its markdown, on the template files and on the listing keys
+        recorded in its manifest entry. page_templates maps the template: a page's front
+        matter picks to that template's files, which the page depends on instead.
+        """
+        graph = cls()
+        page_templates = page_templates or {}
+        for source, entry in manifest.pages.items():
+            templates = page_templates.get(entry.get("template"), template_dependencies)
+            graph.add(entry["output"], [source, *templates, *entry.get("deps", {})])
+        return graph
+
+    def add(self, output, inputs):
+        """
+        Set the inputs of output, replacing what was recorded for it before.
+        """
+        self.remove(output)
+        self.inputs[output] = set(inputs)
+        for name in self.inputs[output]:
+            self.outputs.setdefault(name, set()).add(output)
+
+    def remove(self, output):
+        for name in self.inputs.pop(output, ()):
+            dependents = self.outputs.get(name)
+            if dependents is not None:
+                dependents.discard(output)
+                if not dependents:
+                    del self.outputs[name]
+
+    def dependents(self, changed):
+        """
+        All outputs built, directly or through other outputs, from any of the changed inputs.
+        """
+        found = set()
+        pending = list(changed)
+        while pending:
+            for output in self.outputs.get(pending.pop(), ()):
+                if output not in found:
+                    found.add(output)
+                    pending.append(output)
+        return found
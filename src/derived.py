@@ -0,0 +1,315 @@
+import datetime
+import email.utils
+import html
+import io
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from ExMarkLink import rebase_url
+from Generate import open_output, page_slots
+from manifest import hash_bytes, path_key
+from siteindex import listed_in, page_url
+from template import load_template
+
+logger = logging.getLogger(__name__)
+
+SITEMAP_NAME = "sitemap.xml"
+RSS_NAME = "rss.xml"
+ATOM_NAME = "atom.xml"
+# Dated pages in the feeds, newest first
+FEED_LENGTH = 20
+TAGS_DIR = "tags"
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+SLUG_RE = re.compile(r"[^\w]+")
+
+
+class DerivedPage:
+    """
+    A listing page the build writes without any markdown behind it: one page of a
+    content directory's listing, or of a tag's. prev_url and next_url link the pages
+    of the same listing (newer and older entries).
+    """
+
+    __slots__ = ("output", "url", "title", "metas", "prev_url", "next_url")
+
+    def __init__(self, output, url, title, metas, prev_url=None, next_url=None):
+        self.output = output
+        self.url = url
+        self.title = title
+        self.metas = metas
+        self.prev_url = prev_url
+        self.next_url = next_url
+
+
+class TagEntry:
+    """
+    A line of tags/index.html, shaped like the PageMeta a listing shows.
+    """
+
+    __slots__ = ("url", "title", "date")
+
+    def __init__(self, url, title):
+        self.url = url
+        self.title = title
+        self.date = None
+
+
+def derived_key(output, public_root):
+    """
+    The manifest key of an output with no source, like listing_key for listings.
+    """
+    return path_key("derived:" + os.path.relpath(output, public_root))
+
+
+def tag_slug(tag):
+    return SLUG_RE.sub("-", tag.lower()).strip("-") or "tag"
+
+
+def paginate(metas, per_page, output, public_root, title):
+    """
+    Split metas into DerivedPages of per_page entries: the first written to output,
+    the rest to page/2/index.html, page/3/index.html... next to it.
+    """
+    directory = os.path.dirname(output)
+    chunks = [metas[start:start + per_page] for start in range(0, len(metas), per_page)] or [[]]
+    outputs = [output] + [os.path.join(directory, "page", str(number), "index.html") for number in range(2, len(chunks) + 1)]
+    urls = [page_url(path, public_root) for path in outputs]
+    pages = []
+    for number, chunk in enumerate(chunks):
+        pages.append(DerivedPage(
+            path_key(outputs[number]),
+            urls[number],
+            title if number == 0 else f"{title} (page {number + 1} of {len(chunks)})",
+            chunk,
+            urls[number - 1] if number > 0 else None,
+            urls[number + 1] if number + 1 < len(chunks) else None,
+        ))
+    return pages
+
+
+def listing_pages(site, content_root, public_root, per_page):
+    """
+    DerivedPages for every content directory that has pages in it but no index.md of its
+    own, listing what {{ pages ... }} would (see SiteIndex.children).
+    """
+    content_root = os.path.normpath(content_root)
+    sources = set(site.pages)
+    directories = sorted({listed_in(meta.source) for meta in site.pages.values() if not site.excluded(meta)})
+    pages = []
+    for directory in directories:
+        relative = os.path.relpath(directory or os.curdir, content_root)
+        if relative.startswith(os.pardir) or os.path.join(directory, "index.md") in sources:
+            continue
+        output = os.path.join(public_root, relative, "index.html")
+        title = os.path.basename(directory).replace("-", " ").capitalize() if relative != os.curdir else "Pages"
+        pages.extend(paginate(site.children(directory), per_page, output, public_root, title))
+    return pages
+
+
+def tag_pages(site, public_root, per_page):
+    """
+    DerivedPages for every tag in the front matter of published pages, under tags/, plus
+    tags/index.html listing the tags. Pages are ordered like listings: newest first.
+    Tags whose slugs collide ("C++" and "C") are told apart by a -2, -3... suffix, given
+    in sorted tag order so every build picks the same directory for each tag.
+    """
+    tagged = {}
+    for meta in site.pages.values():
+        if not site.excluded(meta):
+            for tag in meta.tags:
+                tagged.setdefault(tag, []).append(meta)
+    if not tagged:
+        return []
+    tags_output = os.path.join(public_root, TAGS_DIR, "index.html")
+    index = DerivedPage(path_key(tags_output), page_url(tags_output, public_root), "Tags", [])
+    pages = [index]
+    slugs = set()
+    for tag in sorted(tagged, key=lambda tag: (tag.lower(), tag)):
+        metas = sorted(tagged[tag], key=lambda meta: meta.url)
+        metas.sort(key=lambda meta: meta.date or "", reverse=True)
+        slug = base = tag_slug(tag)
+        number = 2
+        while slug in slugs:
+            slug = f"{base}-{number}"
+            number += 1
+        slugs.add(slug)
+        output = os.path.join(public_root, TAGS_DIR, slug, "index.html")
+        tag_listing = paginate(metas, per_page, output, public_root, f"Tagged {tag}")
+        index.metas.append(TagEntry(tag_listing[0].url, f"{tag} ({len(metas)})"))
+        pages.extend(tag_listing)
+    return pages
+
+
+def render_listing(page, basepath="/"):
+    """
+    The body HTML of a DerivedPage: its title, a list of links (with dates where pages
+    have them) and links to the neighbouring pages of the listing.
+    """
+    parts = [f"<h1>{html.escape(page.title)}</h1>", "<ul>"]
+    for meta in page.metas:
+        item = f'<a href="{html.escape(rebase_url(meta.url, basepath))}">{html.escape(meta.title or meta.url)}</a>'
+        if meta.date:
+            item += f' <time datetime="{html.escape(meta.date)}">{html.escape(meta.date[:10])}</time>'
+        parts.append(f"<li>{item}</li>")
+    parts.append("</ul>")
+    if page.prev_url or page.next_url:
+        parts.append("<nav>")
+        if page.prev_url:
+            parts.append(f'<a href="{html.escape(rebase_url(page.prev_url, basepath))}" rel="prev">Newer</a>')
+        if page.next_url:
+            parts.append(f'<a href="{html.escape(rebase_url(page.next_url, basepath))}" rel="next">Older</a>')
+        parts.append("</nav>")
+    return "".join(parts)
+
+
+def page_links(page):
+    """
+    The (kind, url, line) links of a DerivedPage, for the manifest and the link check.
+    """
+    urls = [meta.url for meta in page.metas] + [url for url in (page.prev_url, page.next_url) if url]
+    return [("link", url, 0) for url in urls]
+
+
+def parse_date(value):
+    """
+    A front matter date as an aware datetime; dates without a time zone are taken as UTC.
+    """
+    date = datetime.datetime.fromisoformat(value)
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=datetime.timezone.utc)
+    return date
+
+
+def absolute_url(site_url, url, basepath="/"):
+    """
+    The absolute URL of a root-relative one: site_url is where the site is served from
+    (scheme and host), and basepath is prefixed as it is to every link.
+    """
+    return site_url.rstrip("/") + rebase_url(url, basepath)
+
+
+def sitemap_xml(urls, site_url, basepath="/"):
+    """
+    sitemap.xml for urls, an iterable of (url, date or None).
+    """
+    root = ET.Element("urlset", xmlns=SITEMAP_NS)
+    for url, date in urls:
+        entry = ET.SubElement(root, "url")
+        ET.SubElement(entry, "loc").text = absolute_url(site_url, url, basepath)
+        if date:
+            ET.SubElement(entry, "lastmod").text = date
+    return _xml(root)
+
+
+def feed_entries(site, limit=FEED_LENGTH):
+    """
+    The dated, published pages, newest first, at most limit of them.
+    """
+    metas = [meta for meta in site.pages.values() if meta.date and not site.excluded(meta)]
+    metas.sort(key=lambda meta: meta.url)
+    metas.sort(key=lambda meta: parse_date(meta.date), reverse=True)
+    return metas[:limit]
+
+
+def rss_xml(metas, site_url, title, basepath="/"):
+    """
+    An RSS 2.0 feed of metas.
+    """
+    rss = ET.Element("rss", version="2.0")
+    channel = ET.SubElement(rss, "channel")
+    ET.SubElement(channel, "title").text = title
+    ET.SubElement(channel, "link").text = absolute_url(site_url, "/", basepath)
+    ET.SubElement(channel, "description").text = title
+    for meta in metas:
+        item = ET.SubElement(channel, "item")
+        ET.SubElement(item, "title").text = meta.title or meta.url
+        ET.SubElement(item, "link").text = absolute_url(site_url, meta.url, basepath)
+        ET.SubElement(item, "guid").text = absolute_url(site_url, meta.url, basepath)
+        ET.SubElement(item, "pubDate").text = email.utils.format_datetime(parse_date(meta.date))
+        for tag in meta.tags:
+            ET.SubElement(item, "category").text = tag
+    return _xml(rss)
+
+
+def atom_xml(metas, site_url, title, basepath="/"):
+    """
+    An Atom feed of metas.
+    """
+    feed = ET.Element("feed", xmlns=ATOM_NS)
+    ET.SubElement(feed, "title").text = title
+    ET.SubElement(feed, "id").text = absolute_url(site_url, "/", basepath)
+    ET.SubElement(feed, "link", href=absolute_url(site_url, "/" + ATOM_NAME, basepath), rel="self")
+    ET.SubElement(feed, "link", href=absolute_url(site_url, "/", basepath))
+    # The newest entry's date, so an unchanged site produces the same feed
+    updated = parse_date(metas[0].date) if metas else datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    ET.SubElement(feed, "updated").text = updated.isoformat()
+    for meta in metas:
+        entry = ET.SubElement(feed, "entry")
+        ET.SubElement(entry, "title").text = meta.title or meta.url
+        ET.SubElement(entry, "id").text = absolute_url(site_url, meta.url, basepath)
+        ET.SubElement(entry, "link", href=absolute_url(site_url, meta.url, basepath))
+        ET.SubElement(entry, "updated").text = parse_date(meta.date).isoformat()
+        for tag in meta.tags:
+            ET.SubElement(entry, "category", term=tag)
+    return _xml(feed)
+
+
+def _xml(root):
+    ET.indent(root)
+    return '<?xml version="1.0" encoding="utf-8"?>\n' + ET.tostring(root, encoding="unicode") + "\n"
+
+
+def write_derived(site, manifest, content_root, public_root, template_path, basepath="/", site_url=None,
+                  per_page=None, assets=None):
+    """
+    Write everything the build derives from the SiteIndex alone, without reading any
+    markdown: with per_page, paginated listing pages for content directories without an
+    index.md and a page per tag; with site_url (the absolute URL of the site root),
+    sitemap.xml and RSS and Atom feeds of the dated pages.
+    Outputs are recorded in the manifest under derived_key, so they are postprocessed,
+    link-checked and removed once no longer produced like any page. An output whose
+    content didn't change isn't rewritten. Returns counts of outputs written and unchanged.
+    """
+    counts = {"written": 0, "unchanged": 0}
+    template_hash = manifest.template_hash(template_path, assets)
+    taken = {meta.output for meta in site.pages.values()}
+
+    def publish(output, text, links=(), page_template_hash=""):
+        key = derived_key(output, public_root)
+        content_hash = hash_bytes(text.encode("utf-8"))
+        if manifest.known_page_hash(key, output, page_template_hash, basepath) == content_hash:
+            # Still recorded, so remove_stale keeps it; its links are kept from last time
+            manifest.record_page(key, output, content_hash, page_template_hash, basepath)
+            counts["unchanged"] += 1
+            return
+        with open_output(output) as f:
+            f.write(text)
+        manifest.record_page(key, output, content_hash, page_template_hash, basepath, links)
+        counts["written"] += 1
+
+    derived = []
+    if per_page:
+        template = load_template(template_path, basepath, assets)
+        for page in listing_pages(site, content_root, public_root, per_page) + tag_pages(site, public_root, per_page):
+            if page.output in taken:
+                logger.warning(" Not writing a listing to %s: a page is published there", page.output)
+                continue
+            buffer = io.StringIO()
+            template.render(buffer, page_slots(template, page.title, render_listing(page, basepath)))
+            publish(page.output, buffer.getvalue(), page_links(page), template_hash)
+            derived.append(page)
+
+    if site_url:
+        published = sorted((meta for meta in site.pages.values() if not site.excluded(meta)), key=lambda meta: meta.url)
+        urls = [(meta.url, meta.date and meta.date[:10]) for meta in published]
+        urls.extend((page.url, None) for page in derived)
+        publish(os.path.join(public_root, SITEMAP_NAME), sitemap_xml(sorted(urls), site_url, basepath))
+        home = site.get(os.path.join(content_root, "index.md"))
+        title = home.title if home is not None and home.title else site_url
+        entries = feed_entries(site)
+        publish(os.path.join(public_root, RSS_NAME), rss_xml(entries, site_url, title, basepath))
+        publish(os.path.join(public_root, ATOM_NAME), atom_xml(entries, site_url, title, basepath))
+    return counts
@@ -0,0 +1,154 @@
+import datetime
+import re
+
+# The opening and closing line of a front matter block, and how its keys are assigned
+DELIMITERS = {"---": ":", "+++": "="}
+# A header that doesn't close within this many lines is taken to be part of the body
+MAX_HEADER_LINES = 200
+KEY_RE = re.compile(r"^([A-Za-z_][\w-]*)\s*$")
+
+
+class FrontMatterError(ValueError):
+    """
+    Raised for a front matter block that can't be read; names the file when known.
+    """
+
+
+def split_front_matter(markdown, source=None):
+    """
+    Return (front, body): the front matter of a page as a dict ({} when there is none) and
+    the rest of the markdown. The header lines are blanked in body rather than removed, so
+    line numbers in the body still match the file.
+    """
+    if not markdown.startswith(tuple(DELIMITERS)):
+        return {}, markdown
+    lines = markdown.split("\n", MAX_HEADER_LINES + 2)
+    front, count = _parse_lines(lines, source)
+    if count == 0:
+        return {}, markdown
+    return front, "\n" * count + "\n".join(lines[count:])
+
+
+def read_front_matter(path):
+    """
+    Read the front matter of the markdown file at path without reading its body: lines are
+    read one at a time up to the closing delimiter. Returns {} for a page without one.
+    """
+    lines = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            lines.append(line.rstrip("\n"))
+            if len(lines) == 1 and lines[0].rstrip() not in DELIMITERS:
+                return {}
+            if len(lines) > 1 and lines[-1].rstrip() == lines[0].rstrip():
+                break
+            if len(lines) > MAX_HEADER_LINES + 1:
+                return {}
+    return _parse_lines(lines, path)[0]
+
+
+def _parse_lines(lines, source):
+    """
+    Parse the front matter at the start of lines. Returns (front, number of lines it spans
+    including both delimiters), or ({}, 0) when the block never closes.
+    """
+    delimiter = lines[0].rstrip()
+    if delimiter not in DELIMITERS:
+        return {}, 0
+    separator = DELIMITERS[delimiter]
+    for end, line in enumerate(lines[1:MAX_HEADER_LINES + 1], 1):
+        if line.rstrip() == delimiter:
+            break
+    else:
+        return {}, 0
+    front = {}
+    key = None
+    for number, line in enumerate(lines[1:end], 2):
+        stripped = line.strip()
+        if stripped == "" or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") and key is not None and separator == ":":
+            # A YAML block list under the previous key
+            if not isinstance(front[key], list):
+                front[key] = []
+            front[key].append(_scalar(stripped[2:].strip()))
+            continue
+        name, found, value = line.partition(separator)
+        match = KEY_RE.match(name)
+        if not found or match is None:
+            raise FrontMatterError(f"{source or 'front matter'}:{number}: expected 'key{separator} value', got {line!r}")
+        key = match.group(1)
+        front[key] = _value(value.strip())
+    return _normalise(front, source), end + 1
+
+
+def _value(text):
+    if text.startswith("[") and text.endswith("]"):
+        return [_scalar(item.strip()) for item in _split_list(text[1:-1]) if item.strip()]
+    return _scalar(text)
+
+
+def _split_list(text):
+    """
+    Split an inline list on commas outside quotes.
+    """
+    items = []
+    current = []
+    quote = None
+    for char in text:
+        if quote is not None:
+            current.append(char)
+            if char == quote:
+                quote = None
+        elif char in "\"'":
+            quote = char
+            current.append(char)
+        elif char == ",":
+            items.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    items.append("".join(current))
+    return items
+
+
+def _scalar(text):
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        return text[1:-1]
+    if text in ("true", "false"):
+        return text == "true"
+    if text == "":
+        return None
+    return text
+
+
+def _normalise(front, source):
+    """
+    Check and normalise the keys the build uses: date (an ISO date or date-time string),
+    tags (a list of strings), draft (a bool), slug (one path segment), template and title
+    (strings).
+    """
+    if "date" in front:
+        date = front["date"]
+        try:
+            if not isinstance(date, str):
+                raise ValueError(date)
+            datetime.datetime.fromisoformat(date)
+        except ValueError:
+            raise FrontMatterError(f"{source or 'front matter'}: date must be YYYY-MM-DD, got {date!r}") from None
+    if "tags" in front:
+        tags = front["tags"]
+        if tags is None:
+            tags = []
+        elif not isinstance(tags, list):
+            tags = [tag.strip() for tag in str(tags).split(",")]
+        front["tags"] = [str(tag) for tag in tags if tag not in (None, "")]
+    if "draft" in front and not isinstance(front["draft"], bool):
+        raise FrontMatterError(f"{source or 'front matter'}: draft must be true or false, got {front['draft']!r}")
+    for name in ("slug", "template", "title"):
+        if name in front and not isinstance(front[name], str):
+            raise FrontMatterError(f"{source or 'front matter'}: {name} must be a string, got {front[name]!r}")
+    slug = front.get("slug")
+    if slug is not None and ("/" in slug or "\\" in slug or slug in ("", ".", "..")):
+        raise FrontMatterError(f"{source or 'front matter'}: slug must be a single path segment, got {slug!r}")
+    return front
@@ -0,0 +1,170 @@
+import hashlib
+import html
+import re
+
+from lrucache import SizedLRUCache
+
+# The first word of a fence's info string, as in ```python
+LANGUAGE_RE = re.compile(r"[\w+#.-]+")
+
+
+class Lexer:
+    """
+    A regex highlighter: rules are (css class, pattern) pairs tried left to right at every
+    position, the first to match winning. Text between matches is left unstyled. A rule's
+    class may instead be another Lexer, which highlights the matched text (a tag's attributes).
+    Classes follow Pygments' short names (k, s, c, m...), so its style sheets apply.
+    """
+
+    def __init__(self, rules):
+        self.styles = [style for style, _ in rules]
+        self.pattern = re.compile("|".join(f"(?P<g{index}>{pattern})" for index, (_, pattern) in enumerate(rules)))
+
+    def highlight(self, code):
+        parts = []
+        position = 0
+        for match in self.pattern.finditer(code):
+            if match.start() > position:
+                parts.append(html.escape(code[position:match.start()], quote=False))
+            style = self.styles[int(match.lastgroup[1:])]
+            if isinstance(style, Lexer):
+                parts.append(style.highlight(match.group()))
+            else:
+                parts.append(f'<span class="{style}">{html.escape(match.group(), quote=False)}</span>')
+            position = match.end()
+        parts.append(html.escape(code[position:], quote=False))
+        return "".join(parts)
+
+
+def _words(words):
+    return r"\b(?:" + "|".join(words.split()) + r")\b"
+
+
+NUMBER = r"\b0[xXoObB][\da-fA-F_]+\b|\b\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?[jJn]?\b"
+DOUBLE_QUOTED = r'"(?:\\.|[^"\\\n])*"'
+SINGLE_QUOTED = r"'(?:\\.|[^'\\\n])*'"
+
+PYTHON = Lexer([
+    ("c", r"#[^\n]*"),
+    ("s", r'[rRbBuUfF]{0,2}(?:"""[\s\S]*?"""|' + r"'''[\s\S]*?'''|" + DOUBLE_QUOTED + "|" + SINGLE_QUOTED + ")"),
+    ("nd", r"@\w[\w.]*"),
+    ("k", _words(
+        "False None True and as assert async await break class continue def del elif else except finally for "
+        "from global if import in is lambda nonlocal not or pass raise return try while with yield"
+    )),
+    ("nb", _words(
+        "abs all any bool bytes callable dict dir enumerate filter float format frozenset getattr hasattr "
+        "hash id int isinstance issubclass iter len list map max min next object open print range repr "
+        "reversed round set setattr sorted str sum super tuple type zip self"
+    )),
+    ("m", NUMBER),
+])
+
+JAVASCRIPT = Lexer([
+    ("c", r"//[^\n]*|/\*[\s\S]*?\*/"),
+    ("s", DOUBLE_QUOTED + "|" + SINGLE_QUOTED + r"|`(?:\\.|[^`\\])*`"),
+    ("k", _words(
+        "async await break case catch class const continue debugger default delete do else export extends "
+        "false finally for function if import in instanceof let new null of return static super switch this "
+        "throw true try typeof undefined var void while with yield interface type enum implements"
+    )),
+    ("m", NUMBER),
+])
+
+SHELL = Lexer([
+    ("c", r"(?<!\S)#[^\n]*"),
+    ("s", r'"(?:\\.|[^"\\])*"|' + r"'[^']*'"),
+    ("nv", r"\$(?:\w+|\{[^}\n]*\}|[@#?$!*-])"),
+    ("k", _words("if then else elif fi for while until do done case esac function in return export local select")),
+])
+
+JSON = Lexer([
+    ("nt", DOUBLE_QUOTED + r"(?=\s*:)"),
+    ("s", DOUBLE_QUOTED),
+    ("kc", _words("true false null")),
+    ("m", r"-?\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b"),
+])
+
+CSS = Lexer([
+    ("c", r"/\*[\s\S]*?\*/"),
+    ("s", DOUBLE_QUOTED + "|" + SINGLE_QUOTED),
+    ("k", r"@[\w-]+|!important\b"),
+    ("m", r"#[\da-fA-F]{3,8}\b|(?<![\w-])-?\d*\.?\d+(?:%|[a-zA-Z]+)?"),
+    ("nt", r"[\w-]+(?=\s*:\s)"),
+])
+
+MARKUP_TAG = Lexer([
+    ("nt", r"^</?[\w:.-]+|/?>$"),
+    ("na", r"[\w:.-]+(?==)"),
+    ("s", r'"[^"]*"|' + r"'[^']*'"),
+])
+
+MARKUP = Lexer([
+    ("c", r"<!--[\s\S]*?-->"),
+    ("cp", r"<![^>]*>|<\?[\s\S]*?\?>"),
+    (MARKUP_TAG, r"</?[\w:.-]+(?:\s[^<>]*)?/?>"),
+    ("ni", r"&#?\w+;"),
+])
+
+LEXERS = {
+    "python": PYTHON,
+    "javascript": JAVASCRIPT,
+    "shell": SHELL,
+    "json": JSON,
+    "css": CSS,
+    "html": MARKUP,
+}
+
+ALIASES = {
+    "py": "python", "python3": "python",
+    "js": "javascript", "jsx": "javascript", "ts": "javascript", "typescript": "javascript",
+    "sh": "shell", "bash": "shell", "zsh": "shell", "console": "shell",
+    "xml": "html", "svg": "html",
+}
+
+
+def fence_language(info):
+    """
+    The language named by a fence's info string ("python" for "Python title=x.py"),
+    or None when it doesn't start with one.
+    """
+    match = LANGUAGE_RE.match(info.strip())
+    return match.group().lower() if match else None
+
+
+class HighlightCache(SizedLRUCache):
+    """
+    Highlighted HTML keyed by (language, hash of the code), so a snippet repeated across
+    many pages is highlighted once per process. The least recently used entries are
+    dropped once they add up to more than max_bytes.
+    """
+
+    def __init__(self, max_bytes=16 * 1024 * 1024):
+        super().__init__(max_bytes)
+
+    @staticmethod
+    def key(language, code):
+        return language, hashlib.blake2b(code.encode("utf-8"), digest_size=16).digest()
+
+
+# One per process: pool workers each fill their own
+default_cache = HighlightCache()
+
+
+def highlight(code, language, cache=None):
+    """
+    The HTML of code in language: escaped, with its tokens in <span class="...">.
+    Languages without a lexer are only escaped.
+    """
+    language = ALIASES.get(language, language)
+    lexer = LEXERS.get(language)
+    if lexer is None:
+        return html.escape(code, quote=False)
+    if cache is None:
+        cache = default_cache
+    key = cache.key(language, code)
+    highlighted = cache.get(key)
+    if highlighted is None:
+        highlighted = lexer.highlight(code)
+        cache.put(key, highlighted)
+    return highlighted
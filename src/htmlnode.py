@@ -1,16 +1,55 @@
+class FrozenDict(dict):
+    """
+    A dict that refuses to be modified, so one empty instance can be shared by every node
+    that has no props.
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenDict is read-only")
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _readonly
+
+
+# Shared by every node without children/props instead of allocating fresh ones per node
+EMPTY_CHILDREN = ()
+EMPTY_PROPS = FrozenDict()
+
+
 class HTMLNode:
     """
     A class representing an HTML node.
+    Nodes use __slots__ and share EMPTY_CHILDREN / EMPTY_PROPS, since a large page has one
+    node per inline span and per-instance dicts dominated its memory.
     """
 
-    def __init__(self, tag: str = None, value: dict = None, children: list = None, props: dict = None):
+    __slots__ = ("tag", "value", "children", "props")
+
+    def __init__(self, tag: str = None, value: str = None, children: list = None, props: dict = None):
         self.tag = tag
-        self.value = value if value else {}
-        self.children = children if children else []
-        self.props = props if props else {}
+        self.value = value
+        self.children = children if children is not None else EMPTY_CHILDREN
+        self.props = props if props else EMPTY_PROPS
 
     def to_html(self):
         raise NotImplementedError("Subclasses should implement this method.")
+
+    def iter_html(self):
+        """
+        Yield the HTML of this node as a sequence of string chunks.
+        """
+        raise NotImplementedError("Subclasses should implement this method.")
+
+    def write_to(self, fp):
+        """
+        Write the HTML of this node into a file-like object chunk by chunk, so the whole
+        document never has to exist as a single string.
+        :param fp: Any object with a write(str) method (an open file, io.StringIO, ...).
+        """
+        write = fp.write
+        for chunk in self.iter_html():
+            write(chunk)
     
     def props_to_html(self):
         """
@@ -29,9 +68,13 @@ class HTMLNode:
         return f"HTMLNode(tag={self.tag}, value={self.value}, children={self.children}, props={self.props})"
     
 class LeafNode(HTMLNode):
-    def __init__(self, tag: str, value: dict, props: dict = None):
-        super().__init__(tag=tag, value=value, children=[], props=props)
+    __slots__ = ()
+
+    def __init__(self, tag: str, value: str, props: dict = None):
+        if value is None:
+            raise ValueError("LeafNode must have a value.")
         # Ensure that LeafNode does not have children
+        super().__init__(tag=tag, value=value, children=EMPTY_CHILDREN, props=props)
 
     def to_html(self):
         if self.value is None:
@@ -41,6 +84,9 @@ class LeafNode(HTMLNode):
         else:
             props_str = self.props_to_html()
             return f"<{self.tag}{props_str}>{self.value}</{self.tag}>"
+
+    def iter_html(self):
+        yield self.to_html()
         
     def __repr__(self):
         return f"LeafNode(tag={self.tag}, value={self.value}, children=[], props={self.props})"
@@ -55,19 +101,38 @@ It doesn't take a value argument
 props is optional
 (It's the exact opposite of the LeafNode class)"""
 
+    __slots__ = ()
+
     def __init__(self, tag: str, children: list, props: dict = None):
         if not tag:
             raise ValueError("Tag is required for ParentNode.")
-        super().__init__(tag=tag, value={}, children=children, props=props)
+        super().__init__(tag=tag, value=None, children=children, props=props)
 
     def to_html(self):
-
-        if self.tag is None:
-            raise ValueError("Tag is required for ParentNode.")
-        if not self.children:
-            raise ValueError("ParentNode must have children.")
         #return a string representing the HTML tag of the node and its children
-        return f"<{self.tag}{self.props_to_html()}>" + "".join([child.to_html() for child in self.children]) + f"</{self.tag}>"
+        return "".join(self.iter_html())
+
+    def iter_html(self):
+        """
+        Walk the subtree with an explicit stack instead of recursing, yielding opening tags,
+        leaf HTML and closing tags in document order. Nothing is concatenated along the way,
+        so memory stays proportional to the tree depth rather than the document size.
+        """
+        stack = [self]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, str):
+                yield item
+            elif isinstance(item, ParentNode):
+                if item.tag is None:
+                    raise ValueError("Tag is required for ParentNode.")
+                if not item.children:
+                    raise ValueError("ParentNode must have children.")
+                yield f"<{item.tag}{item.props_to_html()}>"
+                stack.append(f"</{item.tag}>")
+                stack.extend(reversed(item.children))
+            else:
+                yield from item.iter_html()
     
     def __repr__(self):
         return f"ParentNode(tag={self.tag}, children={self.children}, props={self.props})"
\ No newline at end of file
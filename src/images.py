@@ -0,0 +1,223 @@
+import hashlib
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from ExMarkLink import rebase_url
+from assets import FINGERPRINT_LENGTH
+from copystatic import link_or_copy
+from manifest import path_key
+
+try:
+    from PIL import Image
+except ImportError:
+    # Without Pillow images are published as they are, with no derivatives
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Images pages can reference that are worth resizing (GIFs may be animated, SVGs scale)
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp"}
+# Widths of the WebP derivatives, for those narrower than the original; the original
+# width always gets one too
+WIDTHS = (480, 960, 1440)
+WEBP_QUALITY = 80
+
+
+def images_supported():
+    return Image is not None
+
+
+def image_size(path):
+    """
+    (width, height) of the image at path, from its header only; None if Pillow can't read it.
+    """
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except (OSError, ValueError):
+        return None
+
+
+def derivative_key(output, public_root):
+    """
+    The manifest key of a derivative, like derived_key for listings.
+    """
+    return path_key("image:" + os.path.relpath(output, public_root))
+
+
+def cache_path(cache_dir, content_hash, width):
+    return os.path.join(cache_dir, f"{content_hash}-{width}.webp")
+
+
+class ImageSet:
+    """
+    The static images pages may show, by URL, with what their <img> tags get: width and
+    height, and a srcset of WebP derivatives named after the original's content hash
+    ("/images/tom.png" -> "/images/tom-480w.0123456789.webp"), like fingerprinted assets,
+    so FINGERPRINTED_RE matches them and they are served as immutable.
+    Image sizes are read lazily, the first time a page references an image, so images no
+    page shows are never opened. Everything is plain data, so the set can be handed to
+    pool workers along with its AssetMap.
+    """
+
+    def __init__(self, assets, widths=WIDTHS, quality=WEBP_QUALITY):
+        self.static_root = assets.static_root
+        self.widths = tuple(widths)
+        self.quality = quality
+        self.hashes = {
+            url: content_hash for url, content_hash in assets.hashes.items()
+            if os.path.splitext(url)[1].lower() in IMAGE_EXTENSIONS
+        }
+        self._sizes = {}
+        self._digest = None
+
+    def __contains__(self, url):
+        return url in self.hashes
+
+    def source_path(self, url):
+        return os.path.join(self.static_root, *url[1:].split("/"))
+
+    def size(self, url):
+        content_hash = self.hashes.get(url)
+        if content_hash is None:
+            return None
+        if content_hash not in self._sizes:
+            self._sizes[content_hash] = image_size(self.source_path(url))
+        return self._sizes[content_hash]
+
+    def derivatives(self, url):
+        """
+        [(width, url)] of the WebP derivatives of the image at url, narrowest first;
+        empty for URLs that aren't images or can't be read.
+        """
+        size = self.size(url)
+        if size is None:
+            return []
+        width = size[0]
+        root = os.path.splitext(url)[0]
+        tag = self.hashes[url][:FINGERPRINT_LENGTH]
+        widths = [candidate for candidate in self.widths if candidate < width] + [width]
+        return [(candidate, f"{root}-{candidate}w.{tag}.webp") for candidate in widths]
+
+    def srcset(self, url, basepath="/"):
+        return ", ".join(f"{rebase_url(derivative, basepath)} {width}w" for width, derivative in self.derivatives(url))
+
+    def attributes(self, url, basepath="/"):
+        """
+        The width, height, srcset and sizes of an <img> showing url, or {} if it has none.
+        """
+        size = self.size(url)
+        if size is None:
+            return {}
+        width, height = size
+        return {
+            "width": str(width),
+            "height": str(height),
+            "srcset": self.srcset(url, basepath),
+            "sizes": f"(max-width: {width}px) 100vw, {width}px",
+        }
+
+    @property
+    def digest(self):
+        """
+        Changes whenever any image or the derivatives made of it do. The set doesn't
+        change once built, so it is computed once.
+        """
+        if self._digest is None:
+            data = json.dumps([self.widths, self.quality, self.hashes], sort_keys=True)
+            self._digest = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        return self._digest
+
+
+def referenced_images(images, manifest, site):
+    """
+    The URLs of the images in images that the published pages of site show, sorted.
+    """
+    urls = set()
+    for meta in site.pages.values():
+        entry = manifest.pages.get(path_key(meta.source))
+        if entry is None or site.excluded(meta):
+            continue
+        urls.update(url for kind, url, _ in entry["links"] if kind == "image" and url in images)
+    return sorted(urls)
+
+
+def make_derivatives(from_path, content_hash, widths, cache_dir, quality=WEBP_QUALITY):
+    """
+    Write the WebP derivatives of the image at from_path that cache_dir lacks, one per
+    width. Runs in a pool worker. Returns the number of files written.
+    """
+    written = 0
+    with Image.open(from_path) as image:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.mode in ("LA", "PA", "P") or "transparency" in image.info else "RGB")
+        for width in widths:
+            path = cache_path(cache_dir, content_hash, width)
+            if os.path.exists(path):
+                continue
+            resized = image
+            if width != image.width:
+                resized = image.resize((width, max(1, round(image.height * width / image.width))), Image.Resampling.LANCZOS)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, "WEBP", quality=quality)
+            os.replace(tmp_path, path)
+            written += 1
+    return written
+
+
+def _make_derivatives(args):
+    return make_derivatives(*args)
+
+
+def write_image_derivatives(images, manifest, site, public_root, cache_dir, jobs=None):
+    """
+    Publish the WebP derivatives of every image the site's pages show, next to the
+    original. Derivatives are made once per original content hash into cache_dir, on a
+    pool of jobs processes (None uses every core), so an unchanged image is never resized
+    again, even after a clean build; images no page shows are skipped entirely.
+    Published derivatives are recorded in the manifest under derivative_key, so those
+    no longer referenced are removed with the other stale outputs. Cached derivatives
+    of image contents no longer in the static tree are deleted, and so are temporary
+    files left behind by a build that was interrupted while making them.
+    Returns counts of images, derivatives made, and derivatives published and unchanged.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    urls = referenced_images(images, manifest, site)
+    counts = {"images": len(urls), "made": 0, "published": 0, "unchanged": 0}
+    tasks = []
+    for url in urls:
+        widths = [width for width, _ in images.derivatives(url)]
+        if not widths:
+            logger.warning(" Can't read %s: it is published without derivatives", images.source_path(url))
+            continue
+        content_hash = images.hashes[url]
+        if any(not os.path.exists(cache_path(cache_dir, content_hash, width)) for width in widths):
+            tasks.append((images.source_path(url), content_hash, widths, cache_dir, images.quality))
+    if len(tasks) > 1 and jobs != 1:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            counts["made"] = sum(executor.map(_make_derivatives, tasks))
+    else:
+        counts["made"] = sum(map(_make_derivatives, tasks))
+
+    for url in urls:
+        content_hash = images.hashes[url]
+        for width, derivative in images.derivatives(url):
+            output = os.path.join(public_root, *derivative[1:].split("/"))
+            key = derivative_key(output, public_root)
+            name = os.path.basename(cache_path(cache_dir, content_hash, width))
+            entry = manifest.static.get(key)
+            if entry is None or entry["hash"] != name or entry["output"] != path_key(output) or not os.path.exists(output):
+                os.makedirs(os.path.dirname(output), exist_ok=True)
+                link_or_copy(cache_path(cache_dir, content_hash, width), output)
+                counts["published"] += 1
+            else:
+                counts["unchanged"] += 1
+            manifest.record_static(key, output, os.stat(output), name)
+
+    live = set(images.hashes.values())
+    for entry in os.scandir(cache_dir):
+        if entry.name.endswith(".tmp") or (entry.name.endswith(".webp") and entry.name.split("-", 1)[0] not in live):
+            os.remove(entry.path)
+    return counts
@@ -0,0 +1,124 @@
+import os
+import posixpath
+import re
+from urllib.parse import unquote
+
+SCHEME_RE = re.compile(r"^[a-zA-Z][a-zA-Z0-9+.-]*:")
+
+
+class BrokenLink:
+    """
+    A link or image in a markdown page whose target isn't part of the built site.
+    """
+
+    __slots__ = ("source", "kind", "url", "line")
+
+    def __init__(self, source, kind, url, line):
+        self.source = source
+        self.kind = kind
+        self.url = url
+        self.line = line
+
+    def __eq__(self, other):
+        return isinstance(other, BrokenLink) and self.as_tuple() == other.as_tuple()
+
+    def __repr__(self):
+        return f"BrokenLink{self.as_tuple()!r}"
+
+    def __str__(self):
+        return f"{self.source}:{self.line}: broken {self.kind} {self.url}"
+
+    def as_tuple(self):
+        return (self.source, self.kind, self.url, self.line)
+
+
+class BrokenLinksError(Exception):
+    """
+    Raised by a build when broken links are treated as errors.
+    """
+
+    def __init__(self, broken):
+        super().__init__(f"{len(broken)} broken link(s):\n" + "\n".join(str(link) for link in broken))
+        self.broken = broken
+
+
+def url_path(url):
+    """
+    Return the site path an internal URL points at, without query or fragment, or None
+    for external URLs (with a scheme or a host) and same-page anchors.
+    """
+    if SCHEME_RE.match(url) or url.startswith("//"):
+        return None
+    for separator in ("#", "?"):
+        url = url.split(separator, 1)[0]
+    if url == "":
+        return None
+    return unquote(url)
+
+
+def output_url(path, public_root):
+    """
+    The root-relative URL of a file written under public_root.
+    """
+    return "/" + os.path.relpath(path, public_root).replace(os.sep, "/")
+
+
+def site_targets(manifest, public_root):
+    """
+    Every root-relative URL the build produced: each page and static file, plus the
+    directory URLs ("/blog/" and "/blog") that serve an index.html.
+    """
+    targets = set()
+    for entries in (manifest.pages, manifest.static):
+        for entry in entries.values():
+            url = output_url(entry["output"], public_root)
+            targets.add(url)
+            if url.endswith("/index.html"):
+                directory = url[: -len("index.html")]
+                targets.add(directory)
+                targets.add(directory.rstrip("/") or "/")
+    return targets
+
+
+def check_links(pages, targets):
+    """
+    Check the links of pages, an iterable of (source, page URL, links) where links holds
+    (kind, url, line) tuples, against the set of targets. Relative URLs resolve against the
+    page URL. Each link costs one set lookup, so the whole check is O(total links).
+    Returns the broken ones as BrokenLink, in the order they were found.
+    """
+    broken = []
+    for source, page_url, links in pages:
+        base = posixpath.dirname(page_url)
+        for kind, url, line in links:
+            path = url_path(url)
+            if path is None:
+                continue
+            if not path.startswith("/"):
+                trailing = "/" if path.endswith("/") else ""
+                path = posixpath.normpath(posixpath.join(base, path)) + trailing
+                path = path.replace("//", "/")
+            if path not in targets:
+                broken.append(BrokenLink(source, kind, url, line))
+    return broken
+
+
+def check_site_links(manifest, public_root, assets=None):
+    """
+    Check the links recorded in the manifest for every page against what the build produced.
+    Links are recorded as written; with an AssetMap they are checked as published, so a
+    root-relative asset URL counts as its fingerprinted name and a relative one, which
+    isn't rewritten, is reported as broken.
+    """
+    targets = site_targets(manifest, public_root)
+    pages = (
+        (source, output_url(entry["output"], public_root), _published(entry.get("links", ()), assets))
+        for source, entry in sorted(manifest.pages.items())
+    )
+    return check_links(pages, targets)
+
+
+def _published(links, assets):
+    if assets is None:
+        return links
+    return [(kind, assets.get(url, url), line) for kind, url, line in links]
@@ -0,0 +1,46 @@
+from collections import OrderedDict
+
+
+class SizedLRUCache:
+    """
+    An in-memory map bounded by the total size of its values rather than their count:
+    the least recently used entries are dropped once sizeof of the values adds up to more
+    than max_bytes. The most recent entry is always kept, however large.
+    Subclasses add a key() for what they store; hits and misses are counted.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def sizeof(self, value):
+        return len(value)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, value):
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size -= self.sizeof(previous)
+        self._entries[key] = value
+        self.size += self.sizeof(value)
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, dropped = self._entries.popitem(last=False)
+            self.size -= self.sizeof(dropped)
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
@@ -1,35 +1,385 @@
+import argparse
+import cProfile
+import logging
 import os
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
-from Generate import generate_pages_recursive
-from copystatic import copy_files_recursive
+from Generate import PageBuildError, generate_pages_parallel, generate_pages_pipelined, generate_pages_recursive, iter_pages
+from assets import ASSET_MANIFEST_NAME, AssetMap
+from copystatic import sync_files
+from derived import write_derived
+from frontmatter import FrontMatterError
+from images import ImageSet, images_supported, write_image_derivatives
+from linkcheck import BrokenLinksError, check_site_links
+from manifest import BuildManifest
+from memory import MemoryBudget, MemoryBudgetError
+from postprocess import postprocess_outputs, reset_outputs
+from profiler import BuildProfiler, stage
+from rendercache import RenderCache
+from search import SearchStore, write_search_index
+from siteindex import KEEP_BYTES, SiteIndex
+
+logger = logging.getLogger(__name__)
 
 
 dir_path_static = "./static"
 dir_path_public = "./docs"
 dir_path_content = "./content"
+dir_path_cache = "./.cache"
 template_path = "./template.html"
 default_basepath = "/"
-    
-def main():
-    basepath = default_basepath
-    if len(sys.argv) > 1:
-        basepath = sys.argv[1]
-    print("Deleting public directory...")
-    if os.path.exists(dir_path_public):
-        shutil.rmtree(dir_path_public)
+manifest_path = os.path.join(dir_path_cache, "manifest.json")
+render_cache_path = os.path.join(dir_path_cache, "render.sqlite3")
+search_store_path = os.path.join(dir_path_cache, "search.sqlite3")
+image_cache_path = os.path.join(dir_path_cache, "images")
 
-    print("Copying static files to public directory...")
-    copy_files_recursive(dir_path_static, dir_path_public)
 
-    # Generate a page from content/index.md using template.html and write it to public/index.html.
-    generate_pages_recursive(
-        dir_path_content,
-        template_path,
-        dir_path_public,
-        basepath=basepath,
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site from content/ into docs/.")
+    parser.add_argument("basepath", nargs="?", default=default_basepath)
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="keep docs/ and only rebuild pages and assets that changed since the last build",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="generate pages on N worker processes (0 uses every core)",
+    )
+    parser.add_argument(
+        "--link-static",
+        action="store_true",
+        help="hard-link static files into docs/ instead of copying them (same filesystem only)",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap reading, rendering and writing pages on threads (helps on slow storage)",
+    )
+    parser.add_argument(
+        "--io-threads",
+        type=int,
+        default=4,
+        help="threads reading and writing pages in --pipeline mode",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="publish static files under content-hashed names and point every reference at them",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse whitespace in HTML and CSS outputs (<pre> and <code> are left alone)",
+    )
+    parser.add_argument(
+        "--precompress",
+        action="store_true",
+        help="write .gz (and .br, when brotli is installed) next to every HTML, CSS and SVG output",
     )
+    parser.add_argument(
+        "--responsive-images",
+        action="store_true",
+        help="give images pages show width, height and a srcset of resized WebP copies (needs Pillow)",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        metavar="MB",
+        help="generate pages one at a time and stop the build if it needs more than MB megabytes of memory",
+    )
+    parser.add_argument(
+        "--drafts",
+        action="store_true",
+        help="build pages marked draft: true in their front matter (left out by default)",
+    )
+    parser.add_argument(
+        "--site-url",
+        metavar="URL",
+        help="scheme and host the site is served from (e.g. https://example.org); "
+        "writes sitemap.xml, rss.xml and atom.xml",
+    )
+    parser.add_argument(
+        "--listing-pages",
+        type=int,
+        metavar="N",
+        help="write listing pages of N entries for content directories without an index.md, and a page per tag",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="write a full-text search index and its loader (search/search.js) into docs/",
+    )
+    parser.add_argument("--no-cache", action="store_true", help="parse every page instead of reusing cached renders")
+    parser.add_argument("--clear-cache", action="store_true", help="empty the render cache before building")
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        default=256,
+        help="evict least recently used renders once the cache exceeds this many MB",
+    )
+    parser.add_argument(
+        "--links",
+        choices=("warn", "error", "off"),
+        default="warn",
+        help="what to do about internal links and images pointing at files the build didn't produce",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="time every build stage and page and print the slowest ones",
+    )
+    parser.add_argument("--trace", metavar="FILE", help="write the profile as a Chrome trace (implies --profile)")
+    parser.add_argument("--cprofile", metavar="FILE", help="run the build under cProfile and save its stats")
+    verbosity = parser.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="log every page and file written")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="only log warnings and errors")
+    return parser.parse_args(argv)
+
+
+def build(basepath=default_basepath, incremental=False, jobs=1, link_static=False, cache=None, profiler=None,
+          pipeline=False, io_threads=4, links="warn", fingerprint=False, minify=False, precompress=False,
+          memory_budget=None, drafts=False, search=False, site_url=None, listing_pages=None, responsive_images=False):
+    """
+    Build the whole site and return the BuildManifest describing it.
+    Pass a RenderCache to skip parsing markdown that was rendered by an earlier build,
+    and a BuildProfiler to record how long every stage and page took.
+    With pipeline, pages are read, rendered and written by the threaded pipeline
+    instead of one after another (jobs is then ignored).
+    Broken internal links are logged as warnings, or raise BrokenLinksError when links is
+    "error"; "off" skips the check.
+    With fingerprint, static files are published under content-hashed names (listed in
+    docs/asset-manifest.json) and pages and the template link to those.
+    minify and precompress run the postprocess stage over the outputs this build wrote.
+    With a memory_budget (in bytes) pages are generated one at a time, however jobs and
+    pipeline are set, and MemoryBudgetError is raised if the build goes over it.
+    Pages marked as drafts in their front matter are left out unless drafts is set.
+    With search, the words of every page are collected as it renders and merged into a
+    sharded index under docs/search/ at the end.
+    With site_url (scheme and host) sitemap.xml and RSS and Atom feeds are written, and
+    with listing_pages paginated listings of directories and tags (see write_derived);
+    both come from the SiteIndex, without reading any markdown again.
+    With responsive_images, images the pages show get width, height and a srcset of WebP
+    derivatives, made on a process pool and kept in a cache under .cache/images (see
+    write_image_derivatives). Without Pillow they are published as they are.
+    """
+    budget = None
+    if memory_budget is not None:
+        budget = MemoryBudget(memory_budget)
+        if pipeline or jobs != 1:
+            logger.info("Memory budget set: generating pages one at a time")
+        pipeline, jobs = False, 1
+    if incremental:
+        manifest = BuildManifest.load(manifest_path)
+    else:
+        logger.info("Deleting public directory...")
+        with stage(profiler, "clean"):
+            if os.path.exists(dir_path_public):
+                shutil.rmtree(dir_path_public)
+        # Still record a manifest so the next incremental build starts warm
+        manifest = BuildManifest(manifest_path)
+
+    # Outputs an earlier build minified are rewritten if this one doesn't minify
+    reset_outputs(manifest, minify, precompress)
+
+    if responsive_images and not images_supported():
+        logger.warning(" Pillow is not installed: images are published without derivatives")
+        responsive_images = False
+    assets = None
+    if fingerprint or responsive_images:
+        # Pages need the fingerprinted names (and image sizes) before they render, so hashing can't wait
+        with stage(profiler, "asset_hash"):
+            assets = AssetMap.build(dir_path_static, dir_path_public, manifest, fingerprint)
+        if responsive_images:
+            assets.images = ImageSet(assets)
+
+    logger.info("Copying static files to public directory...")
+    # Static files sync on their own threads while the pages are generated
+    static_executor = ThreadPoolExecutor(max_workers=1)
+    static_sync = static_executor.submit(
+        _timed, profiler, "static_sync", sync_files, dir_path_static, dir_path_public, manifest, link_static, 8, assets
+    )
+
+    store = SearchStore(search_store_path) if search else None
+
+    # Titles and listings of every page, so index pages can list the others. The markdown
+    # read for them is handed to the page build, unless memory is tight
+    with stage(profiler, "site_index"):
+        site = SiteIndex.scan(
+            iter_pages(dir_path_content, dir_path_public), dir_path_public, manifest, drafts,
+            0 if budget is not None else KEEP_BYTES,
+        )
+    if budget is not None:
+        budget.check("site_index", force=True)
+
+    # Generate a page from content/index.md using template.html and write it to public/index.html.
+    with stage(profiler, "generate_pages", jobs=jobs):
+        if pipeline:
+            generate_pages_pipelined(
+                dir_path_content,
+                template_path,
+                dir_path_public,
+                basepath=basepath,
+                manifest=manifest,
+                cache=cache,
+                profiler=profiler,
+                io_threads=io_threads,
+                site=site,
+                assets=assets,
+                search=store,
+            )
+        elif jobs == 1:
+            generate_pages_recursive(
+                dir_path_content,
+                template_path,
+                dir_path_public,
+                basepath=basepath,
+                manifest=manifest,
+                cache=cache,
+                profiler=profiler,
+                site=site,
+                assets=assets,
+                budget=budget,
+                search=store,
+            )
+        else:
+            generate_pages_parallel(
+                dir_path_content,
+                template_path,
+                dir_path_public,
+                basepath=basepath,
+                manifest=manifest,
+                jobs=jobs or None,
+                cache=cache,
+                profiler=profiler,
+                site=site,
+                assets=assets,
+                search=store,
+            )
+
+    if site_url or listing_pages:
+        with stage(profiler, "derived"):
+            counts = write_derived(
+                site, manifest, dir_path_content, dir_path_public, template_path, basepath, site_url, listing_pages,
+                assets,
+            )
+        logger.info(" Derived outputs: %d written, %d unchanged", counts["written"], counts["unchanged"])
+
+    counts = static_sync.result()
+    static_executor.shutdown()
+    logger.info(" Static files: %s", ", ".join(f"{count} {method}" for method, count in counts.items()))
+
+    if assets is not None and assets.images is not None:
+        with stage(profiler, "images"):
+            counts = write_image_derivatives(
+                assets.images, manifest, site, dir_path_public, image_cache_path,
+                # Under a memory budget the images are resized one at a time too
+                1 if budget is not None else jobs if jobs > 1 else None,
+            )
+        logger.info(
+            " Image derivatives: %d images, %d made, %d published, %d unchanged",
+            counts["images"], counts["made"], counts["published"], counts["unchanged"],
+        )
+
+    if fingerprint:
+        assets.write(os.path.join(dir_path_public, ASSET_MANIFEST_NAME))
+    elif os.path.exists(os.path.join(dir_path_public, ASSET_MANIFEST_NAME)):
+        os.remove(os.path.join(dir_path_public, ASSET_MANIFEST_NAME))
+
+    if store is not None:
+        with stage(profiler, "search_index"):
+            counts = write_search_index(store, site, manifest, dir_path_public, basepath, cache, assets)
+        logger.info(
+            " Search index: %d pages, %d terms in %d shards, %d files written, %d pages indexed late",
+            counts["pages"], counts["terms"], counts["shards"], counts["written"], counts["indexed"],
+        )
+    # Search files this build didn't write go with the other stale outputs
+    with stage(profiler, "remove_stale"):
+        for path in manifest.remove_stale(dir_path_public):
+            logger.info(" Removed stale output %s", path)
+    if minify or precompress:
+        with stage(profiler, "postprocess"):
+            counts = postprocess_outputs(manifest, minify, precompress)
+        logger.info(" Postprocessed outputs: %s", ", ".join(f"{count} {kind}" for kind, count in counts.items()))
+    with stage(profiler, "manifest_save"):
+        manifest.save()
+    if links != "off":
+        with stage(profiler, "link_check"):
+            broken = check_site_links(manifest, dir_path_public, assets)
+        for link in broken:
+            logger.warning(" %s", link)
+        if broken and links == "error":
+            raise BrokenLinksError(broken)
+    if budget is not None:
+        budget.check("link_check", force=True)
+        logger.info(" Peak resident memory: %.0f MiB of %.0f MiB", budget.peak / 2**20, budget.limit / 2**20)
+    if cache is not None:
+        with stage(profiler, "cache_evict"):
+            cache.evict()
+    return manifest
+
+
+def _timed(profiler, name, function, *args):
+    with stage(profiler, name):
+        return function(*args)
+
+
+def main():
+    args = parse_args()
+    level = logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO
+    logging.basicConfig(format="%(message)s", level=level)
+    cache = None
+    if not args.no_cache:
+        cache = RenderCache(render_cache_path, args.cache_size * 1024 * 1024)
+        if args.clear_cache:
+            cache.clear()
+    elif args.clear_cache and os.path.exists(render_cache_path):
+        os.remove(render_cache_path)
+    profiler = BuildProfiler() if args.profile or args.trace else None
+    if args.cprofile:
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+    try:
+        build(
+            args.basepath,
+            args.incremental,
+            args.jobs,
+            args.link_static,
+            cache,
+            profiler,
+            pipeline=args.pipeline,
+            io_threads=args.io_threads,
+            links=args.links,
+            fingerprint=args.fingerprint,
+            minify=args.minify,
+            precompress=args.precompress,
+            memory_budget=args.memory_budget * 2**20 if args.memory_budget else None,
+            drafts=args.drafts,
+            search=args.search,
+            site_url=args.site_url,
+            listing_pages=args.listing_pages,
+            responsive_images=args.responsive_images,
+        )
+    except BrokenLinksError as e:
+        logger.error("%d broken link(s), failing the build", len(e.broken))
+        sys.exit(1)
+    except (FrontMatterError, MemoryBudgetError, PageBuildError) as e:
+        logger.error("%s", e)
+        sys.exit(1)
+    finally:
+        if args.cprofile:
+            cprofiler.disable()
+            cprofiler.dump_stats(args.cprofile)
+    if profiler is not None:
+        print(profiler.summary())
+        if args.trace:
+            profiler.write_trace(args.trace)
 
 
-main()
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import sys
+
+from ExMarkLink import PARSER_VERSION
+from template import URL_ATTR_RE, file_stamps, read_template
+
+MANIFEST_VERSION = 5
+# Precompressed siblings the postprocess stage may write next to an output
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+
+def path_key(path):
+    """
+    The normalised form of a path, interned: the manifest, the SiteIndex and the AssetMap
+    all key on the same sources and outputs, and share one copy of each path string.
+    """
+    return sys.intern(os.path.normpath(path))
+
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path):
+    """
+    Return the sha256 hex digest of the file at path, read in chunks so big static assets
+    don't have to fit in memory.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    """
+    A persistent record of what the last build produced.
+
+    For every page we remember the source path, the hash of the markdown, the hash of the
+    template, the basepath, the output path, the links it contains, its title, listings and
+    the template its front matter picks, and the hashes of the listings it shows (its deps);
+    for every static file the source path, its
+    size/mtime, its hash and the output path. A page is rebuilt only when one of those changed
+    or its output is missing, and outputs whose sources disappeared are deleted at the end.
+    post remembers, per output path, what the postprocess stage last did to it.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.pages = {}
+        self.static = {}
+        self.post = {}
+        self._seen = set()
+        self._template_hashes = {}
+
+    @classmethod
+    def load(cls, path):
+        manifest = cls(path)
+        if not os.path.exists(path):
+            return manifest
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            # A corrupt manifest only costs us a full rebuild
+            return manifest
+        if data.get("version") != MANIFEST_VERSION:
+            return manifest
+        manifest.pages = {path_key(key): _compact_page(entry) for key, entry in data.get("pages", {}).items()}
+        manifest.static = {path_key(key): entry for key, entry in data.get("static", {}).items()}
+        for entry in manifest.static.values():
+            entry["output"] = path_key(entry["output"])
+        manifest.post = data.get("post", {})
+        return manifest
+
+    def save(self):
+        if self.path is None:
+            return
+        dir_path = os.path.dirname(self.path)
+        if dir_path != "":
+            os.makedirs(dir_path, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            data = {"version": MANIFEST_VERSION, "pages": self.pages, "static": self.static, "post": self.post}
+            # Compact: at hundreds of thousands of pages indentation alone is tens of megabytes
+            json.dump(data, f, separators=(",", ":"), sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def template_hash(self, template_path, assets=None):
+        """
+        Hash the template, with its partials included, once per build however many pages
+        use it. The cache is checked against the mtime and size of the template and every
+        partial, so a long-lived manifest (watch mode) notices edits to any of them.
+        With an AssetMap, the fingerprinted URLs the template links to are hashed too.
+        The parser version is hashed in as well, so every page is rebuilt when a new
+        parser renders the same markdown differently.
+        """
+        key = (os.path.normpath(template_path), assets.digest if assets else None, PARSER_VERSION)
+        cached = self._template_hashes.get(key)
+        if cached is not None and cached[0] == file_stamps(cached[1]):
+            return cached[2]
+        source, dependencies = read_template(template_path)
+        if assets:
+            source += "\0" + json.dumps(
+                [assets.get("/" + match.group(2)) for match in URL_ATTR_RE.finditer(source)]
+            )
+        content_hash = hash_bytes(f"{source}\0parser {PARSER_VERSION}".encode("utf-8"))
+        self._template_hashes[key] = (file_stamps(dependencies), dependencies, content_hash)
+        return content_hash
+
+    def known_page_hash(self, from_path, dest_path, template_hash, basepath, deps=None, assets=None):
+        """
+        Return the markdown hash recorded for this page if its template, basepath, output,
+        deps (see SiteIndex.page_inputs) and the published URLs of the assets it links to
+        (see AssetMap) are unchanged and the output still exists, otherwise None. The page is
+        fresh when the current markdown hashes to the returned value.
+        """
+        key = path_key(from_path)
+        self._seen.add(key)
+        entry = self.pages.get(key)
+        if (
+            entry is not None
+            and entry["template_hash"] == template_hash
+            and entry["basepath"] == basepath
+            and entry["output"] == path_key(dest_path)
+            and entry.get("deps", {}) == (deps or {})
+            and entry.get("assets", {}) == _asset_urls(entry["links"], assets)
+            and os.path.exists(dest_path)
+        ):
+            return entry["hash"]
+        return None
+
+    def record_page(self, from_path, dest_path, content_hash, template_hash, basepath, links=None, deps=None,
+                    meta=None, assets=None):
+        """
+        links holds the page's (kind, url, line) tuples and meta its PageMeta.to_dict();
+        None keeps what was recorded for the same markdown last time, for pages that were
+        skipped as unchanged. assets is the AssetMap the page was rendered with, if any.
+        A page that moved (a slug added or edited) has its old output removed.
+        """
+        key = path_key(from_path)
+        self._seen.add(key)
+        previous = self.pages.get(key)
+        if previous is not None and previous["output"] != path_key(dest_path):
+            self._move_output(key, previous["output"], dest_path)
+        if previous is None or previous["hash"] != content_hash:
+            previous = {}
+        entry = {
+            "hash": content_hash,
+            "template_hash": template_hash,
+            "basepath": basepath,
+            "output": path_key(dest_path),
+            "links": [list(link) for link in (previous.get("links", []) if links is None else links)],
+        }
+        # Empty tables are left out, since most pages have neither
+        if deps:
+            entry["deps"] = deps
+        asset_urls = _asset_urls(entry["links"], assets)
+        if asset_urls:
+            entry["assets"] = asset_urls
+        if meta is None:
+            meta = {name: previous[name] for name in ("title", "listings", "template") if name in previous}
+        entry.update(meta)
+        self.pages[key] = entry
+
+    def static_is_fresh(self, from_path, dest_path):
+        """
+        Check a static file against the manifest. Size and mtime are compared first so an
+        unchanged tree costs one stat per file; the file is hashed only when they differ.
+        Returns (fresh, stat_result, hash) so the caller can record the file without
+        stat-ing or hashing it again.
+        """
+        key = path_key(from_path)
+        self._seen.add(key)
+        st = os.stat(from_path)
+        entry = self.static.get(key)
+        if entry is None or entry["output"] != path_key(dest_path) or not os.path.exists(dest_path):
+            return False, st, None
+        if entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+            return True, st, entry["hash"]
+        content_hash = hash_file(from_path)
+        return entry["hash"] == content_hash, st, content_hash
+
+    def record_static(self, from_path, dest_path, st, content_hash=None):
+        key = path_key(from_path)
+        self._seen.add(key)
+        if content_hash is None:
+            content_hash = hash_file(from_path)
+        previous = self.static.get(key)
+        if previous is not None and previous["output"] != path_key(dest_path):
+            # A fingerprinted file that changed, or fingerprinting turned on or off
+            self._move_output(key, previous["output"], dest_path)
+        self.static[key] = {
+            "hash": content_hash,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "output": path_key(dest_path),
+        }
+
+    def _move_output(self, key, old_output, dest_path):
+        """
+        Remove the output a source no longer writes, unless another source now claims it,
+        and prune the directories that leaves empty, up to the one shared with the new output.
+        """
+        for entries in (self.pages, self.static):
+            if any(entry["output"] == old_output for other, entry in entries.items() if other != key):
+                return
+        if self.remove_output(old_output):
+            _prune_empty_dirs(os.path.dirname(old_output), os.path.commonpath([old_output, os.path.normpath(dest_path)]))
+
+    def remove_stale(self, root=None):
+        """
+        Delete the outputs of every source that was not seen during this build and drop them
+        from the manifest. Directories under root left empty by the removal are pruned too.
+        Returns the list of removed output paths.
+        """
+        removed = []
+        live_outputs = set()
+        for entries in (self.pages, self.static):
+            live_outputs.update(entry["output"] for key, entry in entries.items() if key in self._seen)
+        for entries in (self.pages, self.static):
+            for key in [key for key in entries if key not in self._seen]:
+                output = entries.pop(key)["output"]
+                if output not in live_outputs and self.remove_output(output):
+                    removed.append(output)
+                    if root is not None:
+                        _prune_empty_dirs(os.path.dirname(output), root)
+        return removed
+
+    def remove_output(self, path):
+        """
+        Delete an output along with its precompressed siblings and forget its postprocess
+        state. Returns True if the output itself existed.
+        """
+        self.post.pop(path, None)
+        for suffix in COMPRESSED_SUFFIXES:
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+        if not os.path.exists(path):
+            return False
+        os.remove(path)
+        return True
+
+    def remove_source(self, from_path, root=None):
+        """
+        Forget a page or static file whose source was deleted and remove its output.
+        Returns the removed output path, or None if there was nothing to remove.
+        """
+        key = path_key(from_path)
+        self._seen.discard(key)
+        for entries in (self.pages, self.static):
+            if key in entries:
+                output = entries.pop(key)["output"]
+                if self.remove_output(output):
+                    if root is not None:
+                        _prune_empty_dirs(os.path.dirname(output), root)
+                    return output
+        return None
+
+
+def _asset_urls(links, assets):
+    """
+    The published URL (see AssetMap.state) of every fingerprinted asset or responsive
+    image a page links to; empty without an AssetMap, and for pages that only link to
+    other pages.
+    """
+    if not assets:
+        return {}
+    urls = {}
+    for _, url, _ in links:
+        if url.startswith("/"):
+            state = assets.state(url)
+            if state is not None:
+                urls[url] = state
+    return urls
+
+
+def _compact_page(entry):
+    """
+    Share the strings every page entry repeats (paths, the template hash, the basepath, the
+    link kinds) instead of keeping the copy JSON decoding made for each entry.
+    """
+    entry["output"] = path_key(entry["output"])
+    entry["template_hash"] = sys.intern(entry["template_hash"])
+    entry["basepath"] = sys.intern(entry["basepath"])
+    for link in entry["links"]:
+        link[0] = sys.intern(link[0])
+    return entry
+
+
+def _prune_empty_dirs(dir_path, root):
+    root = os.path.normpath(root)
+    dir_path = os.path.normpath(dir_path)
+    while dir_path != root and dir_path.startswith(root + os.sep):
+        if os.listdir(dir_path):
+            return
+        os.rmdir(dir_path)
+        dir_path = os.path.dirname(dir_path)
@@ -0,0 +1,81 @@
+import gc
+import logging
+import os
+import sys
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+
+def peak_rss(children=False):
+    """
+    The peak resident set size in bytes of this process, or with children of the largest
+    child it has waited for; None where getrusage isn't available.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def current_rss():
+    """
+    The resident set size of this process in bytes: read from /proc on Linux, otherwise
+    the peak reported by getrusage (an upper bound), or None where neither is available.
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return peak_rss()
+
+
+class MemoryBudgetError(Exception):
+    """
+    Raised when a build can't stay within its memory budget.
+    """
+
+    def __init__(self, rss, limit, where):
+        super().__init__(
+            f"memory budget exceeded during {where}: {rss / 2**20:.0f} MiB resident, budget {limit / 2**20:.0f} MiB"
+        )
+        self.rss = rss
+        self.limit = limit
+
+
+class MemoryBudget:
+    """
+    An explicit ceiling on the build's resident memory, in bytes.
+
+    check() is cheap enough to call after every page: the RSS is only read every interval
+    calls. Going over the limit first triggers a full garbage collection; if the process is
+    still over afterwards the build stops with MemoryBudgetError rather than swapping or
+    being killed halfway through writing the site.
+    """
+
+    def __init__(self, limit, interval=64):
+        self.limit = limit
+        self.interval = interval
+        self.peak = 0
+        self._calls = 0
+
+    def check(self, where="generate_pages", force=False):
+        self._calls += 1
+        if not force and self._calls % self.interval:
+            return
+        rss = current_rss()
+        if rss is None:
+            return
+        if rss > self.limit:
+            gc.collect()
+            rss = current_rss()
+            if rss > self.limit:
+                raise MemoryBudgetError(rss, self.limit, where)
+        if rss > self.peak:
+            self.peak = rss
+            logger.debug(" Resident memory %.0f MiB after %s", rss / 2**20, where)
@@ -0,0 +1,117 @@
+import queue
+import threading
+
+_DONE = object()
+_STOPPED = object()
+
+
+class Stage:
+    """
+    One step of a pipeline: function is called on every item coming out of the previous
+    step by workers threads, and whatever it returns is handed to the next step.
+    """
+
+    __slots__ = ("name", "function", "workers")
+
+    def __init__(self, name, function, workers=1):
+        if workers < 1:
+            raise ValueError(f"stage {name} needs at least one worker")
+        self.name = name
+        self.function = function
+        self.workers = workers
+
+
+def run_pipeline(source, stages, maxsize=32):
+    """
+    Push every item of the source iterable through stages, each running on its own threads
+    and connected to the next by a queue holding at most maxsize items. A stage that falls
+    behind blocks the ones before it, so no more than about maxsize items per stage are in
+    flight however long the source is.
+
+    This is a generator yielding the output of the last stage as it becomes available, in
+    no particular order. The first exception raised by the source or any stage stops every
+    thread and is re-raised here.
+    """
+    stop = threading.Event()
+    errors = []
+    queues = [queue.Queue(maxsize) for _ in range(len(stages) + 1)]
+    remaining = [stage.workers for stage in stages]
+    lock = threading.Lock()
+
+    def fail(error):
+        with lock:
+            errors.append(error)
+        stop.set()
+
+    def put(q, item):
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.05)
+            except queue.Empty:
+                continue
+        return _STOPPED
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except BaseException as e:
+            fail(e)
+            return
+        for _ in range(stages[0].workers if stages else 1):
+            put(queues[0], _DONE)
+
+    def work(index):
+        stage, inbox, outbox = stages[index], queues[index], queues[index + 1]
+        while True:
+            item = get(inbox)
+            if item is _STOPPED:
+                return
+            if item is _DONE:
+                break
+            try:
+                result = stage.function(item)
+            except BaseException as e:
+                fail(e)
+                return
+            if not put(outbox, result):
+                return
+        with lock:
+            remaining[index] -= 1
+            last = remaining[index] == 0
+        # The last worker out tells every worker of the next stage there is nothing more
+        if last:
+            following = stages[index + 1].workers if index + 1 < len(stages) else 1
+            for _ in range(following):
+                put(outbox, _DONE)
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for index, stage in enumerate(stages):
+        for n in range(stage.workers):
+            threads.append(threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True))
+    for thread in threads:
+        thread.start()
+
+    try:
+        while True:
+            item = get(queues[-1])
+            if item is _STOPPED or item is _DONE:
+                break
+            yield item
+    finally:
+        # Also reached when the caller stops iterating early
+        stop.set()
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,188 @@
+import gzip
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from manifest import COMPRESSED_SUFFIXES
+
+try:
+    import brotli
+except ImportError:
+    # .br files are only written when the brotli package is installed
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+MINIFY_EXTENSIONS = {".html", ".css"}
+COMPRESS_EXTENSIONS = {".html", ".css", ".svg"}
+
+# Elements whose contents are kept byte for byte (a <style> is minified as CSS instead)
+RAW_ELEMENT_RE = re.compile(r"<(pre|code|textarea|script|style)\b[^>]*>.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+STYLE_RE = re.compile(r"(<style\b[^>]*>)(.*?)(</style\s*>)", re.IGNORECASE | re.DOTALL)
+HTML_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+WHITESPACE_RE = re.compile(r"\s+")
+# Whitespace around these tags never renders, so it can go entirely
+BLOCK_TAG_SPACE_RE = re.compile(
+    r" ?(<!doctype[^>]*>|</?(?:html|head|body|title|meta|link|base|article|section|header|footer|nav|main|aside"
+    r"|div|p|h[1-6]|ul|ol|li|blockquote|table|thead|tbody|tr|th|td|hr|br|figure|figcaption)\b[^>]*>) ?",
+    re.IGNORECASE,
+)
+
+CSS_TOKEN_RE = re.compile(
+    r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|(/\*.*?\*/)|(\s+)|([{};,>:])|([^\s"'/{};,>:]+|/)""",
+    re.DOTALL,
+)
+# No space is needed after or before these
+CSS_SPACE_AFTER = frozenset("{};,>:(")
+CSS_SPACE_BEFORE = frozenset("{};,>)")
+
+
+def minify_html(html):
+    """
+    Drop comments and collapse whitespace runs to a single space, removing it entirely next
+    to block-level tags. The contents of <pre>, <code>, <textarea> and <script> are left
+    untouched, and <style> contents are minified as CSS.
+    """
+    parts = []
+    pos = 0
+    for match in RAW_ELEMENT_RE.finditer(html):
+        parts.append(_minify_html_text(html[pos:match.start()]))
+        raw = match.group()
+        if match.group(1).lower() == "style":
+            raw = STYLE_RE.sub(lambda m: m.group(1) + minify_css(m.group(2)) + m.group(3), raw)
+        parts.append(raw)
+        pos = match.end()
+    parts.append(_minify_html_text(html[pos:]))
+    return "".join(parts)
+
+
+def _minify_html_text(text):
+    text = HTML_COMMENT_RE.sub("", text)
+    text = WHITESPACE_RE.sub(" ", text)
+    return BLOCK_TAG_SPACE_RE.sub(r"\1", text)
+
+
+def minify_css(css):
+    """
+    Drop comments and every space that doesn't separate two tokens, and the last semicolon
+    of each block. Strings are kept as they are.
+    """
+    out = []
+    space = False
+    for match in CSS_TOKEN_RE.finditer(css):
+        string, comment, whitespace, punctuation, word = match.groups()
+        if comment is not None or whitespace is not None:
+            space = True
+            continue
+        token = string or punctuation or word
+        if punctuation == "}" and out and out[-1] == ";":
+            out.pop()
+        if space and out and out[-1][-1] not in CSS_SPACE_AFTER and token[0] not in CSS_SPACE_BEFORE:
+            out.append(" ")
+        out.append(token)
+        space = False
+    return "".join(out)
+
+
+def _write_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def postprocess_file(path, options):
+    """
+    Minify the output at path in place and (re)write or remove its .gz and .br siblings as
+    options ({"minify", "gzip", "brotli"}) ask. The minified file replaces the output
+    rather than overwriting it, so a hard-linked static file is never changed at its source.
+    Returns (minified, compressed).
+    """
+    ext = os.path.splitext(path)[1].lower()
+    with open(path, "rb") as f:
+        data = f.read()
+    minified = False
+    if options["minify"] and ext in MINIFY_EXTENSIONS:
+        text = data.decode("utf-8")
+        small = (minify_html(text) if ext == ".html" else minify_css(text)).encode("utf-8")
+        if small != data:
+            _write_atomic(path, small)
+            data = small
+            minified = True
+    compressed = False
+    for suffix, wanted, compress in (
+        (".gz", options["gzip"], lambda data: gzip.compress(data, compresslevel=9, mtime=0)),
+        (".br", options["brotli"], lambda data: brotli.compress(data, quality=11)),
+    ):
+        if wanted and ext in COMPRESS_EXTENSIONS:
+            _write_atomic(path + suffix, compress(data))
+            compressed = True
+        elif os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    return minified, compressed
+
+
+def postprocess_options(minify=False, precompress=False):
+    return {"minify": minify, "gzip": precompress, "brotli": precompress and brotli is not None}
+
+
+def reset_outputs(manifest, minify=False, precompress=False):
+    """
+    Undo what earlier builds did that this one won't: outputs minified in place are deleted
+    so they get written again from their sources, and precompressed siblings are removed.
+    Call before generating, so the deleted outputs are rebuilt by this build.
+    """
+    for path, state in list(manifest.post.items()):
+        if state["options"]["minify"] and not minify:
+            manifest.remove_output(path)
+        elif not precompress and (state["options"]["gzip"] or state["options"]["brotli"]):
+            for suffix in COMPRESSED_SUFFIXES:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+            manifest.post.pop(path)
+
+
+def postprocess_outputs(manifest, minify=False, precompress=False, jobs=8):
+    """
+    Minify and/or precompress every HTML, CSS and SVG output recorded in the manifest, on a
+    pool of jobs threads. An output whose size and mtime are what the stage left behind last
+    time, with the same options, is skipped, so an incremental build only touches the pages
+    and static files it wrote.
+    Returns a dict counting outputs "minified", "compressed" and "unchanged".
+    """
+    options = postprocess_options(minify, precompress)
+    paths = sorted(
+        entry["output"]
+        for entries in (manifest.pages, manifest.static)
+        for entry in entries.values()
+        if os.path.splitext(entry["output"])[1].lower() in MINIFY_EXTENSIONS | COMPRESS_EXTENSIONS
+    )
+    counts = {"minified": 0, "compressed": 0, "unchanged": 0}
+    pending = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            continue
+        state = manifest.post.get(path)
+        if state is not None and state == _state(options, st):
+            counts["unchanged"] += 1
+        else:
+            pending.append(path)
+
+    def process(path):
+        minified, compressed = postprocess_file(path, options)
+        logger.debug(" * %s (minified: %s, compressed: %s)", path, minified, compressed)
+        return path, minified, compressed, os.stat(path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for path, minified, compressed, st in executor.map(process, pending):
+            counts["minified"] += minified
+            counts["compressed"] += compressed
+            manifest.post[path] = _state(options, st)
+    return counts
+
+
+def _state(options, st):
+    return {"options": options, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
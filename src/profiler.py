@@ -0,0 +1,129 @@
+import contextlib
+import json
+import os
+import threading
+import time
+
+
+class BuildProfiler:
+    """
+    Records timed spans for build stages and per-page counters.
+
+    Spans are kept in Chrome trace event form (name, start, duration, pid, tid, args), so
+    they can be summarised on the console or loaded as-is into chrome://tracing / Perfetto.
+    Worker processes record into their own profiler and the parent merges the results;
+    timestamps come from the system-wide monotonic clock, so they line up across processes.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.pages = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def stage(self, name, **args):
+        """
+        Time the body of a with block as one span called name; args end up in the trace.
+        """
+        start = time.perf_counter_ns()
+        try:
+            yield args
+        finally:
+            end = time.perf_counter_ns()
+            event = {
+                "name": name,
+                "ph": "X",
+                "ts": start / 1000,
+                "dur": (end - start) / 1000,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+            }
+            if args:
+                event["args"] = args
+            with self._lock:
+                self.events.append(event)
+
+    def record_page(self, from_path, **stats):
+        """
+        Merge counters (seconds, blocks, inline_nodes, output_bytes, ...) for one page.
+        """
+        with self._lock:
+            self.pages.setdefault(str(from_path), {}).update(stats)
+
+    def merge(self, events, pages):
+        """
+        Add what a worker process recorded.
+        """
+        with self._lock:
+            self.events.extend(events)
+            for from_path, stats in pages.items():
+                self.pages.setdefault(from_path, {}).update(stats)
+
+    def stage_totals(self):
+        """
+        Total seconds and count per stage name, slowest first.
+        """
+        totals = {}
+        for event in self.events:
+            total = totals.setdefault(event["name"], [0.0, 0])
+            total[0] += event["dur"] / 1e6
+            total[1] += 1
+        return sorted(((name, seconds, count) for name, (seconds, count) in totals.items()), key=lambda t: -t[1])
+
+    def slowest_pages(self, top=10):
+        pages = [(path, stats) for path, stats in self.pages.items() if "seconds" in stats]
+        return sorted(pages, key=lambda item: -item[1]["seconds"])[:top]
+
+    def summary(self, top=10):
+        lines = [f"{'stage':<24}{'total s':>10}{'count':>8}"]
+        for name, seconds, count in self.stage_totals():
+            lines.append(f"{name:<24}{seconds:>10.4f}{count:>8}")
+        slowest = self.slowest_pages(top)
+        if slowest:
+            lines.append("")
+            lines.append(f"{'slowest pages':<48}{'s':>9}{'blocks':>8}{'inline':>8}{'bytes':>10}")
+            for path, stats in slowest:
+                lines.append(
+                    f"{path[-48:]:<48}{stats['seconds']:>9.4f}{_count(stats, 'blocks'):>8}"
+                    f"{_count(stats, 'inline_nodes'):>8}{_count(stats, 'output_bytes'):>10}"
+                )
+        return "\n".join(lines)
+
+    def write_trace(self, path):
+        """
+        Write a Chrome trace event file; per-page counters go under otherData.
+        """
+        origin = min((event["ts"] for event in self.events), default=0)
+        events = [dict(event, ts=event["ts"] - origin) for event in self.events]
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"pages": self.pages}}, f)
+
+
+def stage(profiler, name, **args):
+    """
+    profiler.stage(name) when profiling, otherwise a context manager that does nothing,
+    so call sites don't need to check.
+    """
+    if profiler is None:
+        return contextlib.nullcontext()
+    return profiler.stage(name, **args)
+
+
+def _count(stats, key):
+    value = stats.get(key)
+    return "-" if value is None else str(value)
+
+
+def count_nodes(node):
+    """
+    Count the leaf (inline) nodes of an HTMLNode tree without recursing.
+    """
+    count = 0
+    stack = [node]
+    while stack:
+        item = stack.pop()
+        if item.children:
+            stack.extend(item.children)
+        else:
+            count += 1
+    return count
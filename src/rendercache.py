@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from ExMarkLink import PARSER_VERSION
+
+# Bump when the pages table changes; an older cache file is emptied and recreated
+CACHE_SCHEMA = 2
+
+
+class RenderCache:
+    """
+    A persistent sqlite store mapping (parser version, basepath, markdown) to the rendered
+    body HTML, title and links of a page, evicted least-recently-used once it grows past max_bytes.
+
+    With it, a template-only change re-renders every page without parsing any markdown.
+    Each process opens its own connection lazily, so the cache can be handed to pool workers.
+    """
+
+    def __init__(self, path, max_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"path": self.path, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["max_bytes"])
+
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            dir_path = os.path.dirname(self.path)
+            if dir_path != "":
+                os.makedirs(dir_path, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != CACHE_SCHEMA:
+                conn.execute("DROP TABLE IF EXISTS pages")
+                conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA}")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "key TEXT PRIMARY KEY, title TEXT NOT NULL, html TEXT NOT NULL, links TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS pages_last_used ON pages (last_used)")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def key(markdown, basepath, variant=""):
+        """
+        variant names anything else the render depends on, such as the AssetMap digest.
+        """
+        digest = hashlib.sha256(f"{PARSER_VERSION}\0{basepath}\0{variant}\0".encode("utf-8"))
+        digest.update(markdown.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, markdown, basepath, variant=""):
+        """
+        Return (title, html, links) for this markdown, or None on a miss.
+        """
+        key = self.key(markdown, basepath, variant)
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT title, html, links FROM pages WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE pages SET last_used = ? WHERE key = ?", (time.time_ns(), key))
+        title, html, links = row
+        return title, html, [tuple(link) for link in json.loads(links)]
+
+    def put(self, markdown, basepath, title, html, links=(), variant=""):
+        key = self.key(markdown, basepath, variant)
+        links = json.dumps(list(links))
+        size = len(html.encode("utf-8")) + len(title.encode("utf-8")) + len(links)
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO pages (key, title, html, links, size, last_used) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, title, html, links, size, time.time_ns()),
+            )
+
+    def evict(self):
+        """
+        Drop least recently used entries until the cache fits in max_bytes.
+        Returns the number of entries removed.
+        """
+        with self._lock:
+            conn = self._connect()
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+            if total <= self.max_bytes:
+                return 0
+            removed = 0
+            doomed = []
+            for key, size in conn.execute("SELECT key, size FROM pages ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+                removed += 1
+            conn.executemany("DELETE FROM pages WHERE key = ?", doomed)
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM pages")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
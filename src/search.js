@@ -0,0 +1,125 @@
+// Client for the search index search.py writes next to this file.
+//
+// Load it with <script src="/search/search.js" defer></script>. It binds an
+// <input data-search> to a <ul data-search-results> when the page has both, and
+// exposes window.siteSearch(query), a promise of [{url, title, score}], best first.
+//
+// Terms are sharded by their first PREFIX_LENGTH characters (as in search.py), so a
+// query fetches one shard per distinct prefix plus the page table, each at most once.
+(function () {
+  "use strict";
+
+  var PREFIX_LENGTH = 2;
+  var MAX_RESULTS = 20;
+  var TOKEN_RE = /[\p{L}\p{N}_]+/gu;
+  var base = new URL(".", document.currentScript.src);
+  var fetched = {};
+
+  function load(name) {
+    if (!(name in fetched)) {
+      fetched[name] = fetch(new URL(name, base)).then(function (response) {
+        // A prefix no page uses has no shard
+        return response.ok ? response.json() : {};
+      });
+    }
+    return fetched[name];
+  }
+
+  function shardName(term) {
+    var prefix = Array.from(term).slice(0, PREFIX_LENGTH).join("");
+    return Array.from(new TextEncoder().encode(prefix), function (byte) {
+      return byte.toString(16).padStart(2, "0");
+    }).join("") + ".json";
+  }
+
+  // {page id: [positions]} for a term; the last word of a query also matches as a prefix
+  function postings(shard, term, prefix) {
+    var pages = {};
+    Object.keys(shard).forEach(function (candidate) {
+      if (candidate !== term && !(prefix && candidate.startsWith(term))) {
+        return;
+      }
+      shard[candidate].forEach(function (entry) {
+        var positions = pages[entry[0]] || (pages[entry[0]] = []);
+        var position = 0;
+        for (var i = 1; i < entry.length; i++) {
+          position += entry[i];
+          positions.push(position);
+        }
+      });
+    });
+    return pages;
+  }
+
+  function search(query) {
+    var terms = query.toLowerCase().match(TOKEN_RE) || [];
+    if (!terms.length) {
+      return Promise.resolve([]);
+    }
+    return Promise.all(terms.map(function (term) {
+      return load(shardName(term));
+    })).then(function (shards) {
+      var lists = terms.map(function (term, i) {
+        return postings(shards[i], term, i === terms.length - 1);
+      });
+      // Pages with every term, scored by occurrences plus a bonus for terms next to each other
+      var scores = [];
+      Object.keys(lists[0]).forEach(function (page) {
+        var score = 0;
+        for (var i = 0; i < lists.length; i++) {
+          var positions = lists[i][page];
+          if (!positions) {
+            return;
+          }
+          score += positions.length;
+          if (i > 0) {
+            var previous = new Set(lists[i - 1][page]);
+            positions.forEach(function (position) {
+              if (previous.has(position - 1)) {
+                score += 10;
+              }
+            });
+          }
+        }
+        scores.push([Number(page), score]);
+      });
+      scores.sort(function (a, b) {
+        return b[1] - a[1] || a[0] - b[0];
+      });
+      scores = scores.slice(0, MAX_RESULTS);
+      return load("pages.json").then(function (pages) {
+        return scores.map(function (scored) {
+          var page = pages[scored[0]];
+          return {url: page[0], title: page[1], score: scored[1]};
+        });
+      });
+    });
+  }
+
+  window.siteSearch = search;
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var input = document.querySelector("input[data-search]");
+    var list = document.querySelector("[data-search-results]");
+    if (!input || !list) {
+      return;
+    }
+    var latest = 0;
+    input.addEventListener("input", function () {
+      var current = ++latest;
+      search(input.value).then(function (results) {
+        if (current !== latest) {
+          return;
+        }
+        list.replaceChildren.apply(list, results.map(function (result) {
+          var item = document.createElement("li");
+          var link = document.createElement("a");
+          link.href = result.url;
+          link.textContent = result.title;
+          item.appendChild(link);
+          return item;
+        }));
+      });
+    });
+  });
+})();
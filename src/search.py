@@ -0,0 +1,342 @@
+import html
+import json
+import operator
+import os
+import re
+import sqlite3
+import threading
+
+from ExMarkLink import rebase_url
+from Generate import read_page, render_page
+from derived import derived_key
+from manifest import hash_bytes, path_key
+from siteindex import expand_listings
+
+# Bump when the tables or the tokenizer change; an older store is emptied and recreated
+SEARCH_SCHEMA = 1
+# Published under the public root; search.js sits next to the index it reads
+SEARCH_DIR = "search"
+PAGES_NAME = "pages.json"
+LOADER_NAME = "search.js"
+LOADER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), LOADER_NAME)
+# Terms are sharded by their first PREFIX_LENGTH characters; search.js uses the same number
+PREFIX_LENGTH = 2
+# Longer "words" are hashes, base64 and the like, which nobody searches for
+MAX_TERM_LENGTH = 40
+TOKEN_RE = re.compile(r"\w+")
+TAG_RE = re.compile(r"<[^>]*>")
+
+
+def page_text(content):
+    """
+    The text of a rendered page body: the leaf values of an HTMLNode tree, or an HTML
+    string (from the RenderCache) with its tags removed. Tags become spaces either way,
+    so words in neighbouring elements don't run together. Leaf values may hold HTML too
+    (highlighted code, cached blocks), so their tags are removed as well.
+    """
+    if isinstance(content, str):
+        return html.unescape(TAG_RE.sub(" ", content))
+    parts = []
+    stack = [content]
+    while stack:
+        node = stack.pop()
+        if node.children:
+            stack.extend(reversed(node.children))
+        elif node.value:
+            parts.append(node.value)
+    return html.unescape(TAG_RE.sub(" ", " ".join(parts)))
+
+
+def tokenize(text):
+    """
+    Map each lowercased word of text to the list of its positions (word offsets).
+    """
+    terms = {}
+    for position, term in enumerate(TOKEN_RE.findall(text.lower())):
+        positions = terms.get(term)
+        if positions is None:
+            terms[term] = [position]
+        else:
+            positions.append(position)
+    # Dropped afterwards: they are rare, and checking every word costs more
+    for term in [term for term in terms if len(term) > MAX_TERM_LENGTH]:
+        del terms[term]
+    return terms
+
+
+def encode_positions(positions):
+    """
+    The positions of a term as comma-separated gaps ("3,4,10" for 3, 7, 17): short to
+    store, and spliced into the shards as they are.
+    """
+    return ",".join(map(str, [positions[0], *map(operator.sub, positions[1:], positions)]))
+
+
+def shard_name(term):
+    """
+    The file a term's postings are published in: the hex UTF-8 of its prefix.
+    """
+    return term[:PREFIX_LENGTH].encode("utf-8").hex() + ".json"
+
+
+def search_key(content_hash, listings=None):
+    """
+    What a page's postings were computed from: its markdown, and the listings expanded
+    into it, since those change the text without changing the file.
+    """
+    if not listings:
+        return content_hash
+    return hash_bytes(f"{content_hash}\0{sorted(listings.items())!r}".encode("utf-8"))
+
+
+class SearchStore:
+    """
+    A persistent sqlite store of the search postings of every page, keyed by source.
+
+    Pages add their postings as they are rendered (see build_page); write_search_index
+    merges the store into the published shards. Added pages are written batch at a time,
+    since a transaction per page costs more than tokenizing it. A pool worker gets a copy
+    of the store and hands what it added back with drain() instead of writing it itself,
+    so only the parent ever writes.
+    """
+
+    def __init__(self, path, batch=256):
+        self.path = path
+        self.batch = batch
+        self._pending = []
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        return {"path": self.path, "batch": self.batch}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"], state["batch"])
+
+    def _connect(self):
+        if self._conn is None or self._pid != os.getpid():
+            dir_path = os.path.dirname(self.path)
+            if dir_path != "":
+                os.makedirs(dir_path, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            if conn.execute("PRAGMA user_version").fetchone()[0] != SEARCH_SCHEMA:
+                conn.execute("DROP TABLE IF EXISTS pages")
+                conn.execute("DROP TABLE IF EXISTS postings")
+                conn.execute(f"PRAGMA user_version = {SEARCH_SCHEMA}")
+            conn.execute("CREATE TABLE IF NOT EXISTS pages (source TEXT PRIMARY KEY, key TEXT NOT NULL, title TEXT NOT NULL)")
+            # Keyed by source first, so a page's postings are written (and replaced) side by
+            # side; keyed by term, every page touched the whole table. The merge sorts by term.
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                "source TEXT NOT NULL, term TEXT NOT NULL, positions TEXT NOT NULL, PRIMARY KEY (source, term)"
+                ") WITHOUT ROWID"
+            )
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def add(self, source, content_hash, listings, title, content):
+        """
+        Tokenize a rendered page (content as render_page returns it) and queue its postings
+        to replace the stored ones. content_hash and listings are those of the markdown it
+        was rendered from.
+        """
+        terms = tokenize(page_text(content))
+        postings = [(term, encode_positions(positions)) for term, positions in terms.items()]
+        self.put([(path_key(source), search_key(content_hash, listings), title, postings)])
+
+    def put(self, entries):
+        """
+        Queue entries, as add() makes them and drain() returns them.
+        """
+        with self._lock:
+            self._pending.extend(entries)
+            if len(self._pending) >= self.batch:
+                self._flush()
+
+    def drain(self):
+        """
+        Return the queued entries and forget them, without writing anything.
+        """
+        with self._lock:
+            entries, self._pending = self._pending, []
+        return entries
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        # A page added twice keeps its last postings
+        pending = {entry[0]: entry for entry in self._pending}
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN")
+            self._delete(conn, pending)
+            for source, key, title, postings in pending.values():
+                conn.executemany(
+                    "INSERT INTO postings (source, term, positions) VALUES (?, ?, ?)",
+                    [(source, term, positions) for term, positions in postings],
+                )
+                conn.execute("INSERT INTO pages (source, key, title) VALUES (?, ?, ?)", (source, key, title))
+        self._pending = []
+
+    def pages(self):
+        """
+        {source: (key, title)} for every page in the store.
+        """
+        with self._lock:
+            self._flush()
+            rows = self._connect().execute("SELECT source, key, title FROM pages").fetchall()
+        return {source: (key, title) for source, key, title in rows}
+
+    def remove(self, sources):
+        with self._lock:
+            self._flush()
+            conn = self._connect()
+            with conn:
+                conn.execute("BEGIN")
+                self._delete(conn, sources)
+
+    @staticmethod
+    def _delete(conn, sources):
+        rows = [(source,) for source in sources]
+        conn.executemany("DELETE FROM postings WHERE source = ?", rows)
+        conn.executemany("DELETE FROM pages WHERE source = ?", rows)
+
+    def postings(self):
+        """
+        Yield (term, source, positions) for every posting, in term order.
+        """
+        with self._lock:
+            self._flush()
+            cursor = self._connect().execute("SELECT term, source, positions FROM postings ORDER BY term")
+            rows = cursor.fetchmany(4096)
+        while rows:
+            yield from rows
+            with self._lock:
+                rows = cursor.fetchmany(4096)
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def index_page(store, meta, basepath, cache=None, listings=None, assets=None):
+    """
+    Render one page the way build_page does and add it to the store. For pages whose
+    postings are missing or stale but whose output was up to date, so they weren't rendered.
+    """
+    markdown, content_hash = read_page(meta.source)
+    if listings:
+        markdown = expand_listings(markdown, meta.source, listings)
+    title, content, _, _ = render_page(markdown, basepath, cache, assets=assets)
+    store.add(meta.source, content_hash, listings, title, content)
+
+
+def write_search_index(store, site, manifest, public_root, basepath="/", cache=None, assets=None):
+    """
+    Bring the store up to date with every page the build published, then merge it into
+    the files search.js reads, under public_root/search/:
+
+    - pages.json: [[url, title], ...], a page's id being its index (pages sorted by URL)
+    - one shard per term prefix (see shard_name): {term: [[id, gap, gap, ...], ...]},
+      the gaps being the term's positions in that page as encode_positions writes them
+    - search.js, the loader
+
+    Pages added before their output was up to date are reused; the rest are indexed here.
+    Files whose contents didn't change are left alone, so a small edit rewrites a few shards.
+    Every file is recorded in the manifest under derived_key, so the manifest's
+    remove_stale deletes the shards no longer written (and the whole index once a build
+    doesn't write one) while other files under search/ are left alone.
+    Returns counts of pages indexed here, pages, terms and shards, and files written.
+    """
+    metas = sorted((meta for meta in site.pages.values() if not site.excluded(meta)), key=lambda meta: meta.url)
+    stored = store.pages()
+    live = {meta.source for meta in metas}
+    store.remove([source for source in stored if source not in live])
+    indexed = 0
+    for meta in metas:
+        listings, _ = site.page_inputs(meta.source)
+        entry = stored.get(meta.source)
+        if entry is None or entry[0] != search_key(meta.hash, listings):
+            index_page(store, meta, basepath, cache, listings, assets)
+            indexed += 1
+    if indexed:
+        stored = store.pages()
+
+    ids = {meta.source: number for number, meta in enumerate(metas)}
+    search_dir = os.path.join(public_root, SEARCH_DIR)
+    os.makedirs(search_dir, exist_ok=True)
+    counts = {"indexed": indexed, "pages": len(metas), "terms": 0, "shards": 0, "written": 0}
+
+    def publish(name, text):
+        path = os.path.join(search_dir, name)
+        if _write_if_changed(path, text):
+            counts["written"] += 1
+        manifest.record_page(derived_key(path, public_root), path, hash_bytes(text.encode("utf-8")), "", basepath, ())
+
+    with open(LOADER_PATH, encoding="utf-8") as f:
+        publish(LOADER_NAME, f.read())
+    publish(PAGES_NAME, _json_array(
+        f"[{json.dumps(rebase_url(meta.url, basepath))},{json.dumps(stored[meta.source][1])}]" for meta in metas
+    ))
+    # Postings come in term order, so each shard is complete when the prefix changes
+    # and only one shard is held in memory at a time
+    shard, entries = None, []
+    for term, group in _grouped_postings(store, ids):
+        name = shard_name(term)
+        if name != shard:
+            if entries:
+                publish(shard, "{" + ",".join(entries) + "}")
+                counts["shards"] += 1
+            shard, entries = name, []
+        entries.append(f"{json.dumps(term)}:" + _json_array(f"[{page},{positions}]" for page, positions in group))
+        counts["terms"] += 1
+    if entries:
+        publish(shard, "{" + ",".join(entries) + "}")
+        counts["shards"] += 1
+    return counts
+
+
+def _grouped_postings(store, ids):
+    """
+    Yield (term, [(page id, positions)]) for every term in the store, sorted by page id.
+    """
+    term, group = None, []
+    for row_term, source, positions in store.postings():
+        if row_term != term:
+            if group:
+                yield term, sorted(group)
+            term, group = row_term, []
+        group.append((ids[source], positions))
+    if group:
+        yield term, sorted(group)
+
+
+def _json_array(items):
+    return "[" + ",".join(items) + "]"
+
+
+def _write_if_changed(path, text):
+    data = text.encode("utf-8")
+    try:
+        if os.path.getsize(path) == len(data):
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return False
+    except OSError:
+        pass
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return True
@@ -0,0 +1,321 @@
+import argparse
+import functools
+import logging
+import os
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import main as site
+from assets import FINGERPRINTED_RE
+from ExMarkLink import BlockCache
+from Generate import generate_page, iter_pages
+from copystatic import copy_file
+from depgraph import DependencyGraph
+from rendercache import RenderCache
+from siteindex import SiteIndex, listed_in, listing_key
+from template import load_template
+
+logger = logging.getLogger(__name__)
+
+LIVERELOAD_PATH = "/__livereload"
+LIVERELOAD_SCRIPT = (
+    f'<script>new EventSource("{LIVERELOAD_PATH}").onmessage = function () {{ location.reload(); }};</script>'
+)
+
+
+class SiteWatcher:
+    """
+    Polls content/, static/ and the template for changes by comparing (mtime, size) snapshots.
+
+    Polling keeps us free of third-party dependencies; one stat per source file per tick is
+    cheap next to a rebuild, and the interval bounds the latency of noticing a save.
+    """
+
+    def __init__(self, paths):
+        self.paths = paths
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        for path in self.paths:
+            if os.path.isfile(path):
+                st = os.stat(path)
+                snapshot[os.path.normpath(path)] = (st.st_mtime_ns, st.st_size)
+                continue
+            for dir_path, _, filenames in os.walk(path):
+                for filename in filenames:
+                    file_path = os.path.join(dir_path, filename)
+                    try:
+                        st = os.stat(file_path)
+                    except FileNotFoundError:
+                        continue
+                    snapshot[os.path.normpath(file_path)] = (st.st_mtime_ns, st.st_size)
+        return snapshot
+
+    def poll(self):
+        """
+        Return {path: "added" | "modified" | "removed"} for everything that changed since the
+        previous call.
+        """
+        snapshot = self.scan()
+        changes = {}
+        for path, stamp in snapshot.items():
+            previous = self.snapshot.get(path)
+            if previous is None:
+                changes[path] = "added"
+            elif previous != stamp:
+                changes[path] = "modified"
+        for path in self.snapshot:
+            if path not in snapshot:
+                changes[path] = "removed"
+        self.snapshot = snapshot
+        return changes
+
+
+class Rebuilder:
+    """
+    Applies watcher changes to the public directory: a markdown edit regenerates that page
+    and the pages listing it, a static edit copies that one file, and a template or partial
+    edit regenerates every page using it, the site template or one picked in the front
+    matter. Affected pages are found through a DependencyGraph built from the manifest.
+    A BlockCache is kept across rebuilds, so editing one paragraph of a long page only
+    parses that paragraph again.
+    """
+
+    def __init__(self, manifest, basepath=site.default_basepath, content=site.dir_path_content,
+                 static=site.dir_path_static, public=site.dir_path_public, template=site.template_path, cache=None):
+        self.manifest = manifest
+        self.cache = cache
+        self.blocks = BlockCache()
+        self.basepath = basepath
+        self.content = os.path.normpath(content)
+        self.static = os.path.normpath(static)
+        self.public = os.path.normpath(public)
+        self.template = os.path.normpath(template)
+        self.site = SiteIndex.scan(iter_pages(self.content, self.public), self.public, manifest)
+
+    def template_dependencies(self):
+        return load_template(self.template, self.basepath).dependencies
+
+    def page_templates(self):
+        """
+        {template: value: its files} for every template the manifest records a page picking.
+        A template that doesn't exist yet is watched for under its own path.
+        """
+        page_templates = {}
+        for name in {entry["template"] for entry in self.manifest.pages.values() if "template" in entry}:
+            path = os.path.normpath(os.path.join(os.path.dirname(self.template), name))
+            page_templates[name] = load_template(path, self.basepath).dependencies if os.path.isfile(path) else [path]
+        return page_templates
+
+    def template_files(self):
+        files = set(self.template_dependencies())
+        for dependencies in self.page_templates().values():
+            files.update(dependencies)
+        return sorted(files)
+
+    def watched_paths(self):
+        return [self.content, self.static, *self.template_files()]
+
+    def output_path(self, path, source_root, suffix=None):
+        dest_path = os.path.join(self.public, os.path.relpath(path, source_root))
+        if suffix is not None:
+            dest_path = str(Path(dest_path).with_suffix(suffix))
+        return dest_path
+
+    def apply(self, changes):
+        """
+        Rebuild what changes touches. Returns the list of outputs written or removed.
+        """
+        touched = []
+        # Inputs other pages may depend on: template files and the listings of changed pages
+        changed_inputs = {path for path in self.template_files() if path in changes}
+        for path, kind in sorted(changes.items()):
+            if path.startswith(self.content + os.sep):
+                changed_inputs.add(listing_key(listed_in(path)))
+                if kind == "removed":
+                    self.site.remove(path)
+                    removed = self.manifest.remove_source(path, self.public)
+                    if removed is not None:
+                        touched.append(removed)
+                else:
+                    # The front matter may move the page to its slug
+                    meta = self.site.update(path, self.output_path(path, self.content, ".html"), self.manifest)
+                    dest_path = meta.output
+                    if self.generate(path, dest_path):
+                        touched.append(dest_path)
+            elif path.startswith(self.static + os.sep):
+                if kind == "removed":
+                    removed = self.manifest.remove_source(path, self.public)
+                    if removed is not None:
+                        touched.append(removed)
+                else:
+                    dest_path = self.output_path(path, self.static)
+                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                    if copy_file(path, dest_path, self.manifest):
+                        touched.append(dest_path)
+        # Dependents whose inputs didn't really change (say, a listed page whose title stayed
+        # the same) are found fresh by the manifest and skipped
+        graph = DependencyGraph.from_manifest(self.manifest, self.template_dependencies(), self.page_templates())
+        sources = {entry["output"]: source for source, entry in self.manifest.pages.items()}
+        for dest_path in sorted(graph.dependents(changed_inputs)):
+            source = sources.get(dest_path)
+            if source is not None and source not in changes and self.generate(source, dest_path):
+                touched.append(dest_path)
+        if touched:
+            self.manifest.save()
+        return touched
+
+    def generate(self, path, dest_path):
+        return generate_page(
+            path, self.template, dest_path, self.basepath, self.manifest, self.cache, site=self.site,
+            blocks=self.blocks,
+        )
+
+
+class LiveReload:
+    """
+    A build counter browsers can wait on; bumping it tells every open page to reload.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self.condition = threading.Condition()
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def wait(self, seen, timeout):
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != seen, timeout)
+            return self.version
+
+
+def inject_livereload(html):
+    """
+    Add the live-reload client to an HTML page, right before </body> when there is one.
+    """
+    index = html.rfind("</body>")
+    if index == -1:
+        return html + LIVERELOAD_SCRIPT
+    return html[:index] + LIVERELOAD_SCRIPT + html[index:]
+
+
+class DevRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Serves the public directory, adding the live-reload client to HTML pages and an
+    event stream at LIVERELOAD_PATH that fires after every rebuild. Fingerprinted assets
+    are sent with a year-long, immutable cache lifetime, as a production host would.
+    """
+
+    livereload = None
+
+    def end_headers(self):
+        if FINGERPRINTED_RE.search(self.path.split("?", 1)[0]):
+            self.send_header("Cache-Control", "public, max-age=31536000, immutable")
+        super().end_headers()
+
+    def do_GET(self):
+        if self.path == LIVERELOAD_PATH:
+            return self.stream_reloads()
+        path = self.translate_path(self.path)
+        if os.path.isdir(path) and self.path.endswith("/"):
+            path = os.path.join(path, "index.html")
+        if not path.endswith(".html") or not os.path.isfile(path):
+            return super().do_GET()
+        with open(path, encoding="utf-8") as f:
+            body = inject_livereload(f.read()).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream_reloads(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        seen = self.livereload.version
+        try:
+            while True:
+                version = self.livereload.wait(seen, timeout=15)
+                # A comment line keeps idle connections from being dropped by proxies
+                self.wfile.write(b"data: reload\n\n" if version != seen else b": ping\n\n")
+                self.wfile.flush()
+                seen = version
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        if self.path != LIVERELOAD_PATH:
+            super().log_message(format, *args)
+
+
+def watch(rebuilder, watcher, livereload, interval, stop):
+    while not stop.is_set():
+        changes = watcher.poll()
+        if changes:
+            start = time.perf_counter()
+            try:
+                touched = rebuilder.apply(changes)
+            except Exception:
+                # Keep serving the last good build; the next save gets another try
+                logger.exception("Rebuild failed")
+            else:
+                if touched:
+                    logger.info(" Rebuilt %d output(s) in %.1f ms", len(touched), (time.perf_counter() - start) * 1000)
+                    livereload.notify()
+                    # Pages may have picked other templates, or partials may have changed
+                    watcher.paths = rebuilder.watched_paths()
+        stop.wait(interval)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve docs/ locally, optionally rebuilding on changes.")
+    parser.add_argument("--port", type=int, default=8888)
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--watch", action="store_true", help="rebuild changed pages and assets and reload the browser")
+    parser.add_argument("--interval", type=float, default=0.1, help="seconds between change polls")
+    parser.add_argument("--basepath", default=site.default_basepath)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every page and file written")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(format="%(message)s", level=logging.DEBUG if args.verbose else logging.INFO)
+    cache = RenderCache(site.render_cache_path)
+    manifest = site.build(args.basepath, incremental=True, cache=cache)
+
+    livereload = LiveReload()
+    handler = functools.partial(DevRequestHandler, directory=site.dir_path_public)
+    DevRequestHandler.livereload = livereload
+    server = ThreadingHTTPServer((args.bind, args.port), handler)
+    server.daemon_threads = True
+
+    stop = threading.Event()
+    if args.watch:
+        rebuilder = Rebuilder(manifest, args.basepath, cache=cache)
+        watcher = SiteWatcher(rebuilder.watched_paths())
+        threading.Thread(
+            target=watch, args=(rebuilder, watcher, livereload, args.interval, stop), daemon=True
+        ).start()
+
+    logger.info("Serving %s on http://%s:%d/", site.dir_path_public, args.bind, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+import os
+import re
+import time
+
+from ExMarkLink import BlockType, iter_blocks
+from frontmatter import read_front_matter, split_front_matter
+from linkcheck import output_url
+from manifest import hash_bytes, path_key
+
+# A paragraph that is only {{ pages blog }} lists the pages in blog/, relative to the page
+LISTING_RE = re.compile(r"^\{\{\s*pages\s+(\S+?)\s*\}\}$")
+LISTING_LINE_RE = re.compile(r"^\{\{\s*pages\s+(\S+?)\s*\}\}[ \t]*$", re.MULTILINE)
+# A file modified this recently may be modified again within the same mtime tick, so its
+# size and mtime aren't trusted to tell whether it changed (as git does for its index)
+RACY_NS = 2 * 10**9
+# How much markdown a SiteIndex holds on to for the page build (see SiteIndex.take_markdown)
+KEEP_BYTES = 64 * 2**20
+
+
+class PageMeta:
+    """
+    What other pages may need to know about a page without rendering it: where it ends up,
+    its title, the directories it lists (as normalised content paths) and its front matter.
+    stamp is the (size, mtime) the markdown had when it was read, if it can be trusted.
+    markdown is the text itself, while the index keeps it for the page build.
+    """
+
+    __slots__ = ("source", "output", "url", "title", "listings", "hash", "front", "stamp", "markdown")
+
+    def __init__(self, source, output, url, title, listings, content_hash, front=None, stamp=None):
+        self.source = source
+        self.output = output
+        self.url = url
+        self.title = title
+        self.listings = listings
+        self.hash = content_hash
+        # None rather than an empty dict for the many pages without front matter
+        self.front = front or None
+        self.stamp = stamp
+        self.markdown = None
+
+    @property
+    def date(self):
+        return self.front.get("date") if self.front else None
+
+    @property
+    def tags(self):
+        return self.front.get("tags", []) if self.front else []
+
+    @property
+    def draft(self):
+        return bool(self.front and self.front.get("draft"))
+
+    @property
+    def template(self):
+        return self.front.get("template") if self.front else None
+
+    def to_dict(self):
+        meta = {"title": self.title}
+        if self.listings:
+            meta["listings"] = list(self.listings)
+        if self.stamp is not None:
+            meta["stamp"] = list(self.stamp)
+        if self.template:
+            meta["template"] = self.template
+        return meta
+
+
+def page_url(dest_path, public_root):
+    """
+    The URL a page is linked at: "/blog/tom" for blog/tom/index.html, "/" for index.html.
+    """
+    url = output_url(dest_path, public_root)
+    if url == "/index.html" or url.endswith("/index.html"):
+        url = url[: -len("/index.html")] or "/"
+    return url
+
+
+def slug_output(dest_path, slug, public_root):
+    """
+    Where a page with a slug in its front matter is written: the slug replaces its file
+    name, or its directory name for an index.md. The site's own index.html keeps its place.
+    """
+    if not slug:
+        return dest_path
+    directory, name = os.path.split(dest_path)
+    if name != "index.html":
+        return os.path.join(directory, slug + ".html")
+    if os.path.normpath(directory) == os.path.normpath(public_root):
+        return dest_path
+    return os.path.join(os.path.dirname(directory), slug, "index.html")
+
+
+def scan_markdown(markdown):
+    """
+    Return (title, listings) for a page: its first heading and the directory names of its
+    {{ pages ... }} paragraphs. Blocks are split but no inline markdown is parsed, and for
+    the many pages without a {{ pages ... }} line, only up to the first heading.
+    """
+    title = None
+    listings = []
+    may_list = LISTING_LINE_RE.search(markdown) is not None
+    for block in iter_blocks(markdown):
+        if block.type == BlockType.HEADING:
+            if title is None:
+                title = block.text.split("\n", 1)[0].strip("#").strip()
+                if not may_list:
+                    break
+        elif block.type == BlockType.PARAGRAPH:
+            match = LISTING_RE.match(block.text)
+            if match is not None:
+                listings.append(match.group(1))
+    return title, listings
+
+
+def listing_key(directory):
+    return f"listing:{directory}"
+
+
+def listed_in(source):
+    """
+    The content directory whose listing shows the page at source: its own directory, or
+    the parent directory for an index.md.
+    """
+    parent = os.path.dirname(source)
+    if os.path.basename(source) == "index.md":
+        parent = os.path.dirname(parent)
+    return parent
+
+
+class SiteIndex:
+    """
+    A table of PageMeta for every page of the site, filled before any page is rendered, so
+    a page can list other pages and the build knows which pages a change affects.
+    The markdown of pages read in full is kept, up to keep_bytes in all, for the page build
+    to take (see take_markdown) instead of reading and hashing it a second time.
+    """
+
+    def __init__(self, public_root, drafts=False, keep_bytes=0):
+        self.public_root = public_root
+        self.drafts = drafts
+        self.keep_bytes = keep_bytes
+        self.pages = {}
+        self._children = None
+        self._kept = 0
+
+    @classmethod
+    def scan(cls, pages, public_root, manifest=None, drafts=False, keep_bytes=0):
+        """
+        Build the index for pages, an iterable of (from_path, dest_path). Pages whose size
+        and mtime match the manifest only have their front matter read; the title, listings
+        and hash come from the manifest. The rest are read in full, and scanned with
+        scan_markdown unless their hash matches the manifest. Drafts are left out of
+        listings (and, by the generators, out of the build) unless drafts is set.
+        """
+        index = cls(public_root, drafts, keep_bytes)
+        for from_path, dest_path in pages:
+            index.update(from_path, dest_path, manifest)
+        return index
+
+    def update(self, from_path, dest_path, manifest=None):
+        """
+        (Re)read one page into the index and return its PageMeta.
+        """
+        key = path_key(from_path)
+        st = os.stat(from_path)
+        stamp = (st.st_size, st.st_mtime_ns)
+        entry = manifest.pages.get(key) if manifest is not None else None
+        markdown = None
+        if entry is not None and "title" in entry and entry.get("stamp") == list(stamp):
+            # Untouched since the last build: the body isn't read at all
+            front = read_front_matter(from_path)
+            content_hash, title, listings = entry["hash"], entry["title"], entry.get("listings")
+        else:
+            with open(from_path) as f:
+                markdown = f.read()
+            content_hash = hash_bytes(markdown.encode("utf-8"))
+            front, body = split_front_matter(markdown, from_path)
+            if entry is not None and entry["hash"] == content_hash and "title" in entry:
+                # Share the manifest's strings rather than holding a second copy of each
+                content_hash, title, listings = entry["hash"], entry["title"], entry.get("listings")
+            else:
+                title, names = scan_markdown(body)
+                title = front.get("title") or title
+                listings = [os.path.normpath(os.path.join(os.path.dirname(key), name)) for name in names]
+        if time.time_ns() - st.st_mtime_ns < RACY_NS:
+            stamp = None
+        # Most pages list nothing; the empty tuple is a singleton, an empty list is not
+        listings = listings or ()
+        dest_path = path_key(slug_output(dest_path, front.get("slug"), self.public_root))
+        meta = PageMeta(
+            key, dest_path, page_url(dest_path, self.public_root), title, listings, content_hash, front, stamp
+        )
+        previous = self.pages.get(key)
+        if previous is not None and previous.markdown is not None:
+            self._kept -= len(previous.markdown)
+        if markdown is not None and self._kept + len(markdown) <= self.keep_bytes:
+            meta.markdown = markdown
+            self._kept += len(markdown)
+        self.pages[key] = meta
+        self._children = None
+        return meta
+
+    def take_markdown(self, from_path):
+        """
+        Return (markdown, hash) of a page as update read it, or None when it wasn't kept,
+        and let go of it: each page's markdown is handed out once.
+        """
+        meta = self.get(from_path)
+        if meta is None or meta.markdown is None:
+            return None
+        markdown, meta.markdown = meta.markdown, None
+        self._kept -= len(markdown)
+        return markdown, meta.hash
+
+    def remove(self, from_path):
+        meta = self.pages.pop(os.path.normpath(from_path), None)
+        if meta is not None and meta.markdown is not None:
+            self._kept -= len(meta.markdown)
+        self._children = None
+
+    def get(self, from_path):
+        return self.pages.get(os.path.normpath(from_path))
+
+    def excluded(self, meta):
+        """
+        Whether the build leaves this page out: it is a draft and drafts aren't built.
+        """
+        return meta.draft and not self.drafts
+
+    def children(self, directory):
+        """
+        The pages directly inside a content directory: its .md files other than index.md,
+        and the index.md of each subdirectory, without excluded drafts. Pages with a date
+        come first, newest first, then the rest; each sorted by URL otherwise.
+        """
+        if self._children is None:
+            children = {}
+            for meta in self.pages.values():
+                if not self.excluded(meta):
+                    children.setdefault(listed_in(meta.source), []).append(meta)
+            for metas in children.values():
+                metas.sort(key=lambda meta: meta.url)
+                # Stable, so equal dates (and undated pages) stay in URL order
+                metas.sort(key=lambda meta: meta.date or "", reverse=True)
+            self._children = children
+        return self._children.get(os.path.normpath(directory), [])
+
+    def listing(self, directory):
+        """
+        [(url, title)] for the pages a {{ pages directory }} paragraph shows.
+        """
+        return [(meta.url, meta.title or meta.url) for meta in self.children(directory)]
+
+    def page_inputs(self, from_path):
+        """
+        Return (listings, deps) for a page: listings maps each directory it lists to that
+        directory's listing, deps maps the matching listing keys to a hash of the listing, so
+        the page goes stale exactly when one of those listings changes. Both are None for
+        pages that don't list anything (or aren't in the index).
+        """
+        meta = self.get(from_path)
+        if meta is None or not meta.listings:
+            return None, None
+        listings = {directory: self.listing(directory) for directory in meta.listings}
+        deps = {
+            listing_key(directory): hash_bytes(repr(listing).encode("utf-8"))
+            for directory, listing in listings.items()
+        }
+        return listings, deps
+
+
+def expand_listings(markdown, from_path, listings):
+    """
+    Replace every {{ pages ... }} paragraph with a markdown list linking to the pages of
+    that directory, so the listing is parsed (and its links checked) like any other list.
+    """
+    base = os.path.dirname(os.path.normpath(from_path))
+
+    def replace(match):
+        listing = listings.get(os.path.normpath(os.path.join(base, match.group(1))))
+        if listing is None:
+            return match.group()
+        if not listing:
+            return ""
+        return "\n".join(f"- [{title}]({url})" for url, title in listing)
+
+    return LISTING_LINE_RE.sub(replace, markdown)
@@ -0,0 +1,130 @@
+import os
+import re
+
+from htmlnode import HTMLNode
+
+# {{ Title }}, {{ Content }}, {{ date }}, ... Slot names are matched case-insensitively.
+SLOT_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# {{> partials/nav.html }} pulls in another file, relative to the one including it
+INCLUDE_RE = re.compile(r"\{\{>\s*([^\s}]+)\s*\}\}")
+# Root-relative href="/..." and src="/..." attributes
+URL_ATTR_RE = re.compile(r'(href|src)="/([^"]*)"')
+
+
+def rebase_urls(html, basepath, assets=None):
+    """
+    Point root-relative href/src attributes at basepath, and at the fingerprinted name of
+    every asset in assets (an AssetMap). One pass over html, one dict lookup per URL.
+    """
+    if basepath == "/" and not assets:
+        return html
+
+    def replace(match):
+        url = "/" + match.group(2)
+        if assets:
+            url = assets.get(url, url)
+        return f'{match.group(1)}="{basepath}{url[1:]}"'
+
+    return URL_ATTR_RE.sub(replace, html)
+
+
+class CompiledTemplate:
+    """
+    A template split once into literal text and named slots.
+
+    The literal text is rebased to basepath (and its assets pointed at their fingerprinted
+    names) at compile time, so rendering a page is just writing the literals and slot values
+    in order; the page body is never scanned again.
+    """
+
+    def __init__(self, source, basepath="/", dependencies=(), assets=None):
+        self.basepath = basepath
+        # The template file and every partial it includes
+        self.dependencies = list(dependencies)
+        # Alternating literal, slot, literal, slot, ..., literal
+        self.literals = []
+        self.slots = []
+        self.placeholders = []
+        pos = 0
+        for match in SLOT_RE.finditer(source):
+            self.literals.append(rebase_urls(source[pos:match.start()], basepath, assets))
+            self.slots.append(match.group(1).lower())
+            self.placeholders.append(match.group())
+            pos = match.end()
+        self.literals.append(rebase_urls(source[pos:], basepath, assets))
+
+    def render(self, fp, values):
+        """
+        Write the template into fp, filling each slot from values.
+        :param fp: A file-like object with a write(str) method.
+        :param values: Slot name -> str, or -> HTMLNode which is streamed with write_to.
+            Slots without a value keep their placeholder text.
+        """
+        write = fp.write
+        write(self.literals[0])
+        for slot, placeholder, literal in zip(self.slots, self.placeholders, self.literals[1:]):
+            value = values.get(slot, placeholder)
+            if isinstance(value, HTMLNode):
+                value.write_to(fp)
+            else:
+                write(str(value))
+            write(literal)
+
+
+def read_template(template_path, _including=()):
+    """
+    Return (source, dependencies): the template with every {{> partial }} replaced by the
+    partial's own (expanded) source, and the normalised paths of the template and all the
+    partials it pulled in. Raises ValueError on an include cycle.
+    """
+    path = os.path.normpath(template_path)
+    if path in _including:
+        raise ValueError("template include cycle: " + " -> ".join(_including + (path,)))
+    with open(path) as f:
+        source = f.read()
+    dependencies = [path]
+    parts = []
+    pos = 0
+    for match in INCLUDE_RE.finditer(source):
+        partial_source, partial_dependencies = read_template(
+            os.path.join(os.path.dirname(path), match.group(1)), _including + (path,)
+        )
+        parts.append(source[pos:match.start()])
+        parts.append(partial_source)
+        pos = match.end()
+        dependencies.extend(d for d in partial_dependencies if d not in dependencies)
+    parts.append(source[pos:])
+    return "".join(parts), dependencies
+
+
+def file_stamps(paths):
+    """
+    (mtime_ns, size) of every path, None for missing ones; equal stamps mean unchanged files.
+    """
+    stamps = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            stamps.append(None)
+            continue
+        stamps.append((st.st_mtime_ns, st.st_size))
+    return tuple(stamps)
+
+
+_template_cache = {}
+
+
+def load_template(template_path, basepath="/", assets=None):
+    """
+    Return the CompiledTemplate for template_path, reading and compiling the file only the
+    first time it is asked for (or again if it or one of its partials changed on disk since).
+    """
+    key = (os.path.normpath(template_path), basepath, assets.digest if assets else None)
+    cached = _template_cache.get(key)
+    if cached is not None and cached[0] == file_stamps(cached[1].dependencies):
+        return cached[1]
+    source, dependencies = read_template(template_path)
+    compiled = CompiledTemplate(source, basepath, dependencies, assets)
+    _template_cache[key] = (file_stamps(dependencies), compiled)
+    return compiled
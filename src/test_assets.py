@@ -0,0 +1,145 @@
+import json
+import os
+import unittest
+
+from Generate import generate_pages_recursive
+from assets import AssetMap, FINGERPRINTED_RE, fingerprint_name
+from copystatic import sync_files
+from images import ImageSet
+from linkcheck import check_site_links
+from manifest import BuildManifest, hash_bytes
+from template import rebase_urls
+from testsupport import TempSite, write
+
+
+class TestFingerprintName(unittest.TestCase):
+    def test_assets_get_the_hash(self):
+        self.assertEqual(fingerprint_name("images/tom.png", "0123456789abcdef"), "images/tom.0123456789.png")
+        self.assertEqual(fingerprint_name("index.css", "abcdef0123456789"), "index.abcdef0123.css")
+        self.assertTrue(FINGERPRINTED_RE.search("/images/tom.0123456789.png"))
+        self.assertFalse(FINGERPRINTED_RE.search("/images/tom.png"))
+
+    def test_other_files_keep_their_name(self):
+        for name in ("robots.txt", "favicon.ico", "CNAME"):
+            self.assertEqual(fingerprint_name(name, "0123456789abcdef"), name)
+
+
+class TestAssetMap(TempSite, unittest.TestCase):
+    TEMPLATE = '<link href="/index.css"><title>{{ Title }}</title>{{ Content }}'
+
+    def setUp(self):
+        super().setUp()
+        write(os.path.join(self.static, "index.css"), "body {}")
+        write(os.path.join(self.static, "robots.txt"), "")
+        write(os.path.join(self.static, "images", "a.png"), "png")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![a](/images/a.png)")
+        write(os.path.join(self.content, "post", "index.md"), "# Post\n\n[home](/)")
+
+    def published(self, rel_path, text):
+        return "/" + fingerprint_name(rel_path, hash_bytes(text.encode("utf-8")))
+
+    def build(self, manifest, basepath="/"):
+        assets = AssetMap.build(self.static, self.public, manifest)
+        sync_files(self.static, self.public, manifest, assets=assets)
+        generate_pages_recursive(self.content, self.template, self.public, basepath, manifest, assets=assets)
+        return assets
+
+    def read(self, *parts):
+        with open(os.path.join(self.public, *parts)) as f:
+            return f.read()
+
+    def touch(self, path, text):
+        write(path, text)
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_urls(self):
+        assets = AssetMap.build(self.static, self.public)
+        self.assertEqual(
+            assets.urls,
+            {
+                "/index.css": self.published("index.css", "body {}"),
+                "/images/a.png": self.published("images/a.png", "png"),
+            },
+        )
+        self.assertEqual(assets.output_path(os.path.join(self.static, "robots.txt")), os.path.join(self.public, "robots.txt"))
+
+    def test_digest_follows_content(self):
+        before = AssetMap.build(self.static, self.public).digest
+        self.assertEqual(AssetMap.build(self.static, self.public).digest, before)
+        write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.assertNotEqual(AssetMap.build(self.static, self.public).digest, before)
+
+    def test_digest_is_recomputed_after_changes(self):
+        assets = AssetMap.build(self.static, self.public)
+        before = assets.digest
+        self.assertIs(assets.digest, before)
+        write(os.path.join(self.static, "extra.css"), "p {}")
+        assets.add(os.path.join(self.static, "extra.css"), hash_bytes(b"p {}"))
+        self.assertNotEqual(assets.digest, before)
+        after_add = assets.digest
+        assets.images = ImageSet(assets)
+        self.assertNotEqual(assets.digest, after_add)
+
+    def test_write(self):
+        assets = AssetMap.build(self.static, self.public)
+        path = os.path.join(self.tmp.name, "asset-manifest.json")
+        assets.write(path)
+        with open(path) as f:
+            self.assertEqual(json.load(f), assets.urls)
+
+    def test_rebase_urls(self):
+        assets = AssetMap.build(self.static, self.public)
+        css = self.published("index.css", "body {}")
+        html = '<link href="/index.css"><a href="/post">x</a><img src="/missing.png">'
+        self.assertEqual(
+            rebase_urls(html, "/Ssite/", assets),
+            f'<link href="/Ssite{css}"><a href="/Ssite/post">x</a><img src="/Ssite/missing.png">',
+        )
+
+    def test_pages_and_template_point_at_fingerprinted_names(self):
+        self.build(BuildManifest(), "/Ssite/")
+        css = self.published("index.css", "body {}")
+        png = self.published("images/a.png", "png")
+        home = self.read("index.html")
+        self.assertIn(f'href="/Ssite{css}"', home)
+        self.assertIn(f'src="/Ssite{png}"', home)
+        self.assertTrue(os.path.exists(self.public + css))
+        self.assertTrue(os.path.exists(self.public + png))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "robots.txt")))
+
+    def test_asset_change_rebuilds_only_pages_using_it(self):
+        manifest = BuildManifest()
+        self.build(manifest)
+        old_png = self.public + self.published("images/a.png", "png")
+        self.touch(os.path.join(self.static, "images", "a.png"), "png2")
+        post_before = os.stat(os.path.join(self.public, "post", "index.html")).st_mtime_ns
+        self.build(manifest)
+        new_png = self.published("images/a.png", "png2")
+        self.assertIn(f'src="{new_png}"', self.read("index.html"))
+        self.assertTrue(os.path.exists(self.public + new_png))
+        self.assertFalse(os.path.exists(old_png))
+        self.assertEqual(os.stat(os.path.join(self.public, "post", "index.html")).st_mtime_ns, post_before)
+
+    def test_template_asset_change_rebuilds_every_page(self):
+        manifest = BuildManifest()
+        self.build(manifest)
+        self.touch(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.build(manifest)
+        css = self.published("index.css", "body { margin: 0 }")
+        for page in (("index.html",), ("post", "index.html")):
+            self.assertIn(f'href="{css}"', self.read(*page))
+
+    def test_link_check(self):
+        manifest = BuildManifest()
+        assets = self.build(manifest)
+        self.assertEqual(check_site_links(manifest, self.public, assets), [])
+        # Relative references aren't rewritten, so they really are broken once fingerprinted
+        write(os.path.join(self.content, "post", "index.md"), "# Post\n\n![a](../images/a.png)")
+        assets = self.build(manifest)
+        self.assertEqual([link.url for link in check_site_links(manifest, self.public, assets)], ["../images/a.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
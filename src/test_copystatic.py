@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from copystatic import sync_files
+from manifest import BuildManifest
+from testsupport import write
+
+
+class TestSyncFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        self.public = os.path.join(self.tmp.name, "docs")
+        write(os.path.join(self.static, "index.css"), b"body {}")
+        write(os.path.join(self.static, "images", "a.png"), b"\x89PNG" * 100)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, *parts):
+        with open(os.path.join(self.public, *parts), "rb") as f:
+            return f.read()
+
+    def test_copies_then_skips_unchanged(self):
+        counts = sync_files(self.static, self.public)
+        self.assertEqual(counts["unchanged"], 0)
+        self.assertEqual(self.read("images", "a.png"), b"\x89PNG" * 100)
+        self.assertEqual(sync_files(self.static, self.public)["unchanged"], 2)
+
+    def test_copy_keeps_mtime(self):
+        sync_files(self.static, self.public)
+        self.assertEqual(
+            os.stat(os.path.join(self.static, "index.css")).st_mtime_ns,
+            os.stat(os.path.join(self.public, "index.css")).st_mtime_ns,
+        )
+
+    def test_changed_file_is_recopied(self):
+        sync_files(self.static, self.public)
+        write(os.path.join(self.static, "index.css"), b"body { color: red; }")
+        counts = sync_files(self.static, self.public)
+        self.assertEqual(counts["unchanged"], 1)
+        self.assertEqual(self.read("index.css"), b"body { color: red; }")
+
+    def test_hardlink(self):
+        counts = sync_files(self.static, self.public, hardlink=True)
+        self.assertEqual(counts["hardlink"], 2)
+        self.assertTrue(os.path.samefile(os.path.join(self.static, "index.css"), os.path.join(self.public, "index.css")))
+
+    def test_manifest_removes_deleted_sources(self):
+        manifest_path = os.path.join(self.tmp.name, "manifest.json")
+        manifest = BuildManifest(manifest_path)
+        sync_files(self.static, self.public, manifest)
+        manifest.save()
+        os.remove(os.path.join(self.static, "images", "a.png"))
+        manifest = BuildManifest.load(manifest_path)
+        self.assertEqual(sync_files(self.static, self.public, manifest)["unchanged"], 1)
+        manifest.remove_stale(self.public)
+        self.assertFalse(os.path.exists(os.path.join(self.public, "images")))
+
+
+if __name__ == "__main__":
+    unittest.main()
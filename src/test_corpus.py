@@ -0,0 +1,60 @@
+import os
+import tempfile
+import unittest
+
+from ExMarkLink import markdown_to_html_node
+from benchmark import run_benchmark
+from Generate import generate_pages_recursive
+from copystatic import sync_files
+from corpus import CorpusShape, generate_site
+from linkcheck import check_site_links
+from manifest import BuildManifest
+
+
+class TestCorpus(unittest.TestCase):
+    def test_generated_site_parses(self):
+        shape = CorpusShape(pages=20, depth=3, long_paragraphs=1, long_paragraph_words=500, static_files=3, static_file_size=64)
+        with tempfile.TemporaryDirectory() as tmp:
+            site = generate_site(tmp, shape)
+            paths = [
+                os.path.join(dir_path, filename)
+                for dir_path, _, filenames in os.walk(site["content"])
+                for filename in filenames
+            ]
+            self.assertEqual(len(paths), 20)
+            for path in paths:
+                with open(path) as f:
+                    html = markdown_to_html_node(f.read()).to_html()
+                self.assertIn("<h1>", html)
+                self.assertIn("<a href=", html)
+            self.assertEqual(len(os.listdir(os.path.join(site["static"], "images"))), 2)
+
+    def test_links_resolve(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site = generate_site(tmp, CorpusShape(pages=30, depth=3, static_files=3, static_file_size=16))
+            public = os.path.join(tmp, "docs")
+            manifest = BuildManifest()
+            generate_pages_recursive(site["content"], site["template"], public, "/", manifest)
+            sync_files(site["static"], public, manifest)
+            self.assertTrue(any(entry["links"] for entry in manifest.pages.values()))
+            self.assertEqual(check_site_links(manifest, public), [])
+
+    def test_same_seed_same_site(self):
+        shape = CorpusShape(pages=5, static_files=1, static_file_size=16, seed=7)
+        with tempfile.TemporaryDirectory() as a, tempfile.TemporaryDirectory() as b:
+            self.assertEqual(generate_site(a, shape)["markdown_bytes"], generate_site(b, shape)["markdown_bytes"])
+
+    def test_benchmark_reports_every_stage(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            site = generate_site(tmp, CorpusShape(pages=5, static_files=2, static_file_size=16))
+            stages = run_benchmark(site, os.path.join(tmp, "docs"))
+        self.assertEqual(
+            list(stages),
+            ["discovery", "read", "markdown_to_blocks", "text_to_textnodes", "markdown_to_html_node",
+             "to_html", "template_fill", "write", "static_sync"],
+        )
+        self.assertTrue(all(stage["seconds"] >= 0 for stage in stages.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import unittest
+
+from depgraph import DependencyGraph
+from manifest import BuildManifest
+
+
+class TestDependencyGraph(unittest.TestCase):
+    def test_dependents_follow_chains(self):
+        graph = DependencyGraph()
+        graph.add("post.html", ["post.md", "template.html"])
+        graph.add("index.html", ["index.md", "template.html", "listing:blog"])
+        graph.add("listing:blog", ["post.html"])
+        self.assertEqual(graph.dependents(["post.md"]), {"post.html", "listing:blog", "index.html"})
+        self.assertEqual(graph.dependents(["template.html"]), {"post.html", "listing:blog", "index.html"})
+        self.assertEqual(graph.dependents(["unknown"]), set())
+
+    def test_add_replaces_and_remove_forgets(self):
+        graph = DependencyGraph()
+        graph.add("a.html", ["a.md", "old.html"])
+        graph.add("a.html", ["a.md", "new.html"])
+        self.assertEqual(graph.dependents(["old.html"]), set())
+        graph.remove("a.html")
+        self.assertEqual(graph.dependents(["a.md"]), set())
+        self.assertEqual(graph.outputs, {})
+
+    def test_from_manifest(self):
+        manifest = BuildManifest()
+        manifest.record_page("content/index.md", "docs/index.html", "h", "t", "/", deps={"listing:content/blog": "x"})
+        manifest.record_page("content/blog/a.md", "docs/blog/a.html", "h", "t", "/")
+        graph = DependencyGraph.from_manifest(manifest, ["template.html"])
+        self.assertEqual(graph.dependents(["listing:content/blog"]), {"docs/index.html"})
+        self.assertEqual(graph.dependents(["template.html"]), {"docs/index.html", "docs/blog/a.html"})
+
+    def test_from_manifest_with_page_templates(self):
+        manifest = BuildManifest()
+        manifest.record_page("content/index.md", "docs/index.html", "h", "t", "/")
+        manifest.record_page("content/blog/a.md", "docs/blog/a.html", "h", "t", "/", meta={"title": "A", "template": "post.html"})
+        graph = DependencyGraph.from_manifest(manifest, ["template.html"], {"post.html": ["post.html", "nav.html"]})
+        self.assertEqual(graph.dependents(["template.html"]), {"docs/index.html"})
+        self.assertEqual(graph.dependents(["nav.html"]), {"docs/blog/a.html"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import os
+import unittest
+import xml.etree.ElementTree as ET
+
+from Generate import discover_pages, generate_pages_recursive
+from derived import (
+    ATOM_NAME, ATOM_NS, RSS_NAME, SITEMAP_NAME, SITEMAP_NS, listing_pages, paginate, render_listing, tag_pages,
+    tag_slug, write_derived,
+)
+from linkcheck import check_site_links
+from manifest import BuildManifest
+from siteindex import SiteIndex
+from testsupport import TempSite, write
+
+
+class TestPaginate(unittest.TestCase):
+    def test_pages_link_each_other(self):
+        pages = paginate(list("abcde"), 2, os.path.join("docs", "blog", "index.html"), "docs", "Blog")
+        self.assertEqual([page.url for page in pages], ["/blog", "/blog/page/2", "/blog/page/3"])
+        self.assertEqual([page.metas for page in pages], [["a", "b"], ["c", "d"], ["e"]])
+        self.assertEqual([page.title for page in pages], ["Blog", "Blog (page 2 of 3)", "Blog (page 3 of 3)"])
+        self.assertEqual([(page.prev_url, page.next_url) for page in pages],
+                         [(None, "/blog/page/2"), ("/blog", "/blog/page/3"), ("/blog/page/2", None)])
+        self.assertEqual(pages[2].output, os.path.join("docs", "blog", "page", "3", "index.html"))
+
+    def test_tag_slug(self):
+        self.assertEqual(tag_slug("Middle-earth & Co."), "middle-earth-co")
+        self.assertEqual(tag_slug("!!"), "tag")
+
+
+class TestDerived(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.manifest_path = os.path.join(root, "manifest.json")
+        write(os.path.join(self.content, "index.md"), "# Fan Club")
+        write(os.path.join(self.content, "about.md"), "# About")
+        write(os.path.join(self.content, "blog", "tom.md"), "---\ndate: 2024-03-01\ntags: [Hobbits, songs]\n---\n# Tom")
+        write(os.path.join(self.content, "blog", "ring.md"), "---\ndate: 2024-05-01T12:30:00\ntags: [rings]\n---\n# Ring & co")
+        write(os.path.join(self.content, "blog", "old.md"), "---\ndate: 2023-01-01\ntags: [songs]\n---\n# Old")
+        write(os.path.join(self.content, "blog", "draft.md"), "---\ndate: 2025-01-01\ndraft: true\ntags: [secret]\n---\n# Draft")
+
+    def build(self, basepath="/", **kwargs):
+        manifest = BuildManifest.load(self.manifest_path)
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, manifest)
+        generate_pages_recursive(self.content, self.template, self.public, basepath, manifest, site=site)
+        counts = write_derived(site, manifest, self.content, self.public, self.template, basepath, **kwargs)
+        manifest.remove_stale(self.public)
+        manifest.save()
+        self.manifest, self.site = manifest, site
+        return counts
+
+    def read(self, *parts):
+        with open(os.path.join(self.public, *parts)) as f:
+            return f.read()
+
+    def test_listing_pages(self):
+        self.build(per_page=2)
+        pages = listing_pages(self.site, self.content, self.public, 2)
+        # content/ has an index.md of its own, so only blog/ gets one
+        self.assertEqual([page.url for page in pages], ["/blog", "/blog/page/2"])
+        self.assertEqual([meta.title for meta in pages[0].metas], ["Ring & co", "Tom"])
+        self.assertEqual(
+            render_listing(pages[1], "/site/"),
+            '<h1>Blog (page 2 of 2)</h1><ul><li><a href="/site/blog/old.html">Old</a> '
+            '<time datetime="2023-01-01">2023-01-01</time></li></ul><nav><a href="/site/blog" rel="prev">Newer</a></nav>',
+        )
+        self.assertIn("<title>Blog</title>", self.read("blog", "index.html"))
+        self.assertEqual(check_site_links(self.manifest, self.public), [])
+
+    def test_tag_pages(self):
+        self.build(per_page=10)
+        pages = tag_pages(self.site, self.public, 10)
+        self.assertEqual([page.url for page in pages], ["/tags", "/tags/hobbits", "/tags/rings", "/tags/songs"])
+        self.assertEqual([entry.title for entry in pages[0].metas], ["Hobbits (1)", "rings (1)", "songs (2)"])
+        self.assertEqual([meta.title for meta in pages[3].metas], ["Tom", "Old"])
+        self.assertIn('<a href="/blog/tom.html">Tom</a>', self.read("tags", "songs", "index.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "tags", "secret")))
+
+    def test_colliding_tag_slugs_get_a_suffix(self):
+        write(os.path.join(self.content, "blog", "langs.md"), "---\ntags: [C++, c, C]\n---\n# Languages")
+        self.build(per_page=10)
+        pages = tag_pages(self.site, self.public, 10)
+        self.assertEqual(
+            [(page.url, page.title) for page in pages[1:4]],
+            [("/tags/c", "Tagged C"), ("/tags/c-2", "Tagged c"), ("/tags/c-3", "Tagged C++")],
+        )
+        self.assertIn("<title>Tagged C++</title>", self.read("tags", "c-3", "index.html"))
+
+    def test_sitemap_and_feeds(self):
+        self.build("/site/", site_url="https://example.org/")
+        ns = {"s": SITEMAP_NS}
+        sitemap = ET.fromstring(self.read(SITEMAP_NAME))
+        self.assertEqual(
+            [(url.findtext("s:loc", namespaces=ns), url.findtext("s:lastmod", namespaces=ns))
+             for url in sitemap.findall("s:url", ns)],
+            [("https://example.org/site/", None), ("https://example.org/site/about.html", None),
+             ("https://example.org/site/blog/old.html", "2023-01-01"),
+             ("https://example.org/site/blog/ring.html", "2024-05-01"),
+             ("https://example.org/site/blog/tom.html", "2024-03-01")],
+        )
+        channel = ET.fromstring(self.read(RSS_NAME)).find("channel")
+        self.assertEqual(channel.findtext("title"), "Fan Club")
+        items = channel.findall("item")
+        self.assertEqual([item.findtext("title") for item in items], ["Ring & co", "Tom", "Old"])
+        self.assertEqual(items[0].findtext("link"), "https://example.org/site/blog/ring.html")
+        self.assertEqual(items[0].findtext("pubDate"), "Wed, 01 May 2024 12:30:00 +0000")
+        self.assertEqual([category.text for category in items[1].findall("category")], ["Hobbits", "songs"])
+        atom = ET.fromstring(self.read(ATOM_NAME))
+        ns = {"a": ATOM_NS}
+        self.assertEqual(atom.findtext("a:updated", namespaces=ns), "2024-05-01T12:30:00+00:00")
+        self.assertEqual(len(atom.findall("a:entry", ns)), 3)
+
+    def test_unchanged_outputs_are_kept_and_dropped_ones_removed(self):
+        self.assertEqual(self.build(site_url="https://example.org", per_page=2), {"written": 9, "unchanged": 0})
+        self.assertEqual(self.build(site_url="https://example.org", per_page=2), {"written": 0, "unchanged": 9})
+        write(os.path.join(self.content, "blog", "new.md"), "---\ndate: 2024-06-01\n---\n# New")
+        # Both blog pages shift, and the sitemap and feeds gain the post
+        self.assertEqual(self.build(site_url="https://example.org", per_page=2), {"written": 5, "unchanged": 4})
+        self.build()
+        for name in (SITEMAP_NAME, RSS_NAME, os.path.join("blog", "index.html"), os.path.join("tags", "index.html")):
+            self.assertFalse(os.path.exists(os.path.join(self.public, name)), name)
+
+    def test_pages_win_over_listings(self):
+        write(os.path.join(self.content, "tags", "index.md"), "# My tags")
+        with self.assertLogs("derived", "WARNING"):
+            self.build(per_page=10)
+        self.assertIn("My tags", self.read("tags", "index.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,9 @@
+import random
+import time
 from ExMarkLink import *
 from htmlnode import LeafNode, ParentNode
 from textnode import TextNode, TextType
+from benchmark import adversarial_inputs
 import unittest
 
 class TestExtract(unittest.TestCase):
@@ -181,4 +184,189 @@ this is not
 
     """
         title = extract_title(md)
-        self.assertEqual(title, "This is a heading")
\ No newline at end of file
+        self.assertEqual(title, "This is a heading")
+
+class TestSinglePassInline(unittest.TestCase):
+    # text_to_textnodes must agree with the chained reference passes, errors included
+    TOKENS = ["a", " ", "**", "*", "_", "`", "[", "]", "(", ")", "!", "![i](u)", "[l](v)"]
+
+    def run_both(self, text):
+        results = []
+        for func in (text_to_textnodes, text_to_textnodes_reference):
+            try:
+                results.append(func(text))
+            except ValueError:
+                results.append(ValueError)
+        return results
+
+    def test_matches_reference_on_random_inputs(self):
+        rng = random.Random(1234)
+        for _ in range(5000):
+            text = "".join(rng.choice(self.TOKENS) for _ in range(rng.randint(0, 12)))
+            new, reference = self.run_both(text)
+            self.assertEqual(new, reference, text)
+
+    def test_nested_delimiters(self):
+        text = "**bold _not italic_** _italic `not code`_ `code` ![a](b)[c](d)"
+        self.assertEqual(
+            text_to_textnodes(text),
+            [
+                TextNode("bold _not italic_", TextType.BOLD_TEXT),
+                TextNode(" ", TextType.NORMAL_TEXT),
+                TextNode("italic `not code`", TextType.ITALIC_TEXT),
+                TextNode(" ", TextType.NORMAL_TEXT),
+                TextNode("code", TextType.CODE_TEXT),
+                TextNode(" ", TextType.NORMAL_TEXT),
+                TextNode("a", TextType.IMAGE, "b"),
+                TextNode("c", TextType.LINKS, "d"),
+            ],
+        )
+        self.assertEqual(text_to_textnodes(text), text_to_textnodes_reference(text))
+
+    def test_crossing_delimiters_raise(self):
+        for text in ["_a **b** c_", "`a_b_c`", "**open", "a `b"]:
+            with self.assertRaises(ValueError):
+                text_to_textnodes(text)
+
+    def test_link_heavy_paragraph(self):
+        text = "see [link](https://example.com) and " * 2000
+        nodes = text_to_textnodes(text)
+        self.assertEqual(len(nodes), 4001)
+        self.assertEqual(nodes, text_to_textnodes_reference(text))
+
+
+class TestLinkSpans(unittest.TestCase):
+    def test_spans_are_offsets(self):
+        text = "![a](b) and [a](b)"
+        self.assertEqual(list(iter_link_spans(text)), [(True, 0, 7, "a", "b"), (False, 12, 18, "a", "b")])
+
+    def test_repeated_span_is_split_where_it_was_found(self):
+        node = TextNode("[a](b) x [a](b)", TextType.NORMAL_TEXT)
+        self.assertEqual(
+            split_nodes_link([node]),
+            [TextNode("a", TextType.LINKS, "b"), TextNode(" x ", TextType.NORMAL_TEXT), TextNode("a", TextType.LINKS, "b")],
+        )
+
+    def test_links_skip_images(self):
+        node = TextNode("![i](u) [l](v)", TextType.NORMAL_TEXT)
+        self.assertEqual(
+            split_nodes_link([node]),
+            [TextNode("![i](u) ", TextType.NORMAL_TEXT), TextNode("l", TextType.LINKS, "v")],
+        )
+
+    def test_adversarial_inputs_stay_linear(self):
+        # A quadratic scanner needs minutes for these; a linear one a few milliseconds
+        for name, text in adversarial_inputs(200_000).items():
+            for function in (text_to_textnodes, extract_markdown_links, extract_markdown_images):
+                start = time.perf_counter()
+                function(text)
+                self.assertLess(time.perf_counter() - start, 2.0, f"{function.__name__} on {name}")
+
+    def test_adversarial_inputs_match_reference(self):
+        for text in adversarial_inputs(2_000).values():
+            self.assertEqual(text_to_textnodes(text), text_to_textnodes_reference(text))
+
+
+class TestBlockScanner(unittest.TestCase):
+    def test_blocks_carry_type_and_line(self):
+        md = "# Title\n\nSome text\nmore text\n\n\n- a\n- b\n"
+        blocks = list(iter_blocks(md))
+        self.assertEqual([block.type for block in blocks], [BlockType.HEADING, BlockType.PARAGRAPH, BlockType.UNORDERED_LIST])
+        self.assertEqual([block.line for block in blocks], [1, 3, 7])
+        self.assertEqual(blocks[1].text, "Some text\nmore text")
+
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "Intro\n\n```\nfirst\n\nsecond\n```\n\nOutro"
+        self.assertEqual(markdown_to_blocks(md), ["Intro", "```\nfirst\n\nsecond\n```", "Outro"])
+        html = markdown_to_html_node(md).to_html()
+        self.assertEqual(html, "<div><p>Intro</p><pre><code>first\n\nsecond</code></pre><p>Outro</p></div>")
+
+    def test_fence_language_highlights_code(self):
+        md = "```python title=x.py\n    if a < b:\n        pass\n```"
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            '<div><pre><code class="language-python">    <span class="k">if</span> a &lt; b:\n'
+            '        <span class="k">pass</span></code></pre></div>',
+        )
+        # The info string is no longer part of the code, whether or not the language is known
+        self.assertEqual(
+            markdown_to_html_node("```cobol\nMOVE A TO B\n```").to_html(),
+            '<div><pre><code class="language-cobol">MOVE A TO B</code></pre></div>',
+        )
+
+    def test_fence_closed_at_the_end_of_a_line(self):
+        md = "```\nprint(1)```\n\n# Heading\n\npara"
+        self.assertEqual(markdown_to_blocks(md), ["```\nprint(1)```", "# Heading", "para"])
+        self.assertEqual(
+            markdown_to_html_node(md).to_html(),
+            "<div><pre><code>print(1)</code></pre><h1>Heading</h1><p>para</p></div>",
+        )
+
+    def test_untagged_fence_is_escaped(self):
+        self.assertEqual(
+            markdown_to_html_node("```\nif a < b && c:\n    <br>\n```").to_html(),
+            "<div><pre><code>if a &lt; b &amp;&amp; c:\n    &lt;br&gt;</code></pre></div>",
+        )
+
+    def test_whitespace_only_block_is_skipped(self):
+        self.assertEqual(markdown_to_blocks("a\n\n   \n\nb"), ["a", "b"])
+
+    def test_parse_page_collects_title_and_headings(self):
+        md = "Intro\n\n# Title\n\n## Part _one_\n\ntext\n\n### Part two"
+        page = parse_page(md)
+        self.assertEqual(page.title, "Title")
+        self.assertEqual(page.headings, [(1, "Title", 3), (2, "Part _one_", 5), (3, "Part two", 9)])
+        self.assertEqual(page.node.to_html(), markdown_to_html_node(md).to_html())
+
+    def test_parse_page_collects_links_with_lines(self):
+        md = "# [Home](/)\n\nsome text\nand a [link](/blog) then\n![img](/a.png)\n\n- [one](one)\n- [two](https://x.org)"
+        page = parse_page(md, "/Ssite/")
+        self.assertEqual(
+            page.links,
+            [("link", "/", 1), ("link", "/blog", 4), ("image", "/a.png", 5), ("link", "one", 7), ("link", "https://x.org", 8)],
+        )
+
+    def test_parse_page_without_title(self):
+        self.assertIsNone(parse_page("just text").title)
+
+    def test_extract_title_stops_at_the_title(self):
+        # The broken inline markup after the title is never looked at
+        self.assertEqual(extract_title("# Title\n\n**unclosed"), "Title")
+
+
+class TestBlockCache(unittest.TestCase):
+    md = "# Title\n\nIntro with a [link](/a)\n\n```\ncode\n\nmore\n```\n\n- one\n- ![two](/b.png)\n\nOutro"
+
+    def test_same_html_and_links_as_without_cache(self):
+        blocks = BlockCache()
+        for _ in range(2):
+            page = parse_page(self.md, "/Ssite/", blocks=blocks)
+            plain = parse_page(self.md, "/Ssite/")
+            self.assertEqual(page.node.to_html(), plain.node.to_html())
+            self.assertEqual(page.links, plain.links)
+            self.assertEqual(page.headings, plain.headings)
+        self.assertEqual((blocks.hits, blocks.misses), (5, 5))
+
+    def test_edit_parses_only_the_changed_block(self):
+        blocks = BlockCache()
+        parse_page(self.md, blocks=blocks)
+        # A new block moves every block below it: their links still get their new lines
+        edited = self.md.replace("Intro with", "Inserted\n\nIntro with").replace("Outro", "Changed outro")
+        page = parse_page(edited, blocks=blocks)
+        self.assertEqual(blocks.misses, 5 + 2)
+        self.assertEqual(page.links, parse_page(edited).links)
+        self.assertEqual(page.links[0], ("link", "/a", 5))
+
+    def test_basepath_is_part_of_the_key(self):
+        blocks = BlockCache()
+        parse_page("[x](/y)", "/", blocks=blocks)
+        self.assertEqual(parse_page("[x](/y)", "/Ssite/", blocks=blocks).node.to_html(), '<div><p><a href="/Ssite/y">x</a></p></div>')
+
+    def test_least_recently_used_blocks_are_dropped(self):
+        blocks = BlockCache(max_bytes=30)
+        parse_page("aaaa\n\nbbbb\n\ncccc", blocks=blocks)
+        # Each fragment is 11 bytes ("<p>aaaa</p>"), so only the last two fit
+        self.assertEqual(len(blocks), 2)
+        self.assertEqual(blocks.size, 22)
+        parse_page("aaaa", blocks=blocks)
+        self.assertEqual(blocks.hits, 0)
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from frontmatter import FrontMatterError, read_front_matter, split_front_matter
+
+
+class TestSplitFrontMatter(unittest.TestCase):
+    def test_yaml(self):
+        md = '---\ntitle: "Tom: a story"\ndate: 2024-05-01\ntags: [tolkien, "books, old"]\ndraft: false\nslug: tom\n---\n# Tom\n\ntext'
+        front, body = split_front_matter(md)
+        self.assertEqual(
+            front,
+            {"title": "Tom: a story", "date": "2024-05-01", "tags": ["tolkien", "books, old"], "draft": False, "slug": "tom"},
+        )
+        # The header is blanked, so the heading is still on line 8
+        self.assertEqual(body, "\n" * 7 + "# Tom\n\ntext")
+
+    def test_yaml_block_list(self):
+        front, _ = split_front_matter("---\ntags:\n  - a\n  - b\n# comment\n---\n")
+        self.assertEqual(front, {"tags": ["a", "b"]})
+
+    def test_toml(self):
+        front, body = split_front_matter('+++\ntitle = "x"\ndate = 2024-05-01T10:00:00\ndraft = true\n+++\nbody')
+        self.assertEqual(front, {"title": "x", "date": "2024-05-01T10:00:00", "draft": True})
+        self.assertEqual(body, "\n\n\n\n\nbody")
+
+    def test_comma_separated_tags(self):
+        self.assertEqual(split_front_matter("---\ntags: a, b\n---\n")[0], {"tags": ["a", "b"]})
+
+    def test_no_front_matter(self):
+        for md in ("# Title\n\n---\nx: y\n---", "----\nx", "---\nnever closed: true\n\n# Title"):
+            self.assertEqual(split_front_matter(md), ({}, md))
+
+    def test_errors_name_the_source(self):
+        for md in ("---\njust text\n---\n", "---\ndate: yesterday\n---\n", "---\ndraft: maybe\n---\n",
+                   "---\nslug: a/b\n---\n"):
+            with self.assertRaises(FrontMatterError) as raised:
+                split_front_matter(md, "post.md")
+            self.assertIn("post.md", str(raised.exception))
+
+
+class TestReadFrontMatter(unittest.TestCase):
+    def test_reads_only_the_header(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "page.md")
+            # The body isn't valid UTF-8, so decoding it would fail
+            with open(path, "wb") as f:
+                f.write(b"---\ntitle: Hi\n---\n" + b"\n" * 10000 + b"\xff\xfe")
+            self.assertEqual(read_front_matter(path), {"title": "Hi"})
+            with open(path, "w") as f:
+                f.write("# No front matter\n")
+            self.assertEqual(read_front_matter(path), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import unittest
+
+from Generate import PageBuildError, discover_pages, generate_pages_parallel, generate_pages_pipelined, generate_pages_recursive
+from manifest import BuildManifest
+from rendercache import RenderCache
+from testsupport import TempSite, read_tree, write
+
+
+class TestParallelGeneration(TempSite, unittest.TestCase):
+    TEMPLATE = '<title>{{ Title }}</title><link href="/index.css">{{ Content }}'
+
+    def setUp(self):
+        super().setUp()
+        for i in range(12):
+            write(os.path.join(self.content, f"section{i % 3}", f"page{i}.md"), f"# Page {i}\n\nSome **bold** [link](/page{i})")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![img](/images/home.png)")
+
+    def test_discover_pages_is_sorted(self):
+        pages = discover_pages(self.content, "docs")
+        self.assertEqual(len(pages), 13)
+        self.assertEqual(pages, sorted(pages))
+        self.assertIn((os.path.join(self.content, "index.md"), os.path.join("docs", "index.html")), pages)
+
+    def test_parallel_matches_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        parallel = os.path.join(self.tmp.name, "parallel")
+        generate_pages_recursive(self.content, self.template, serial, "/Ssite/")
+        generate_pages_parallel(self.content, self.template, parallel, "/Ssite/", jobs=3)
+        self.assertEqual(read_tree(serial), read_tree(parallel))
+
+    def test_parallel_error_names_source(self):
+        bad = os.path.join(self.content, "section1", "broken.md")
+        write(bad, "# Broken\n\nunclosed **bold")
+        with self.assertRaises(PageBuildError) as cm:
+            generate_pages_parallel(self.content, self.template, os.path.join(self.tmp.name, "out"), "/", jobs=2)
+        self.assertEqual(cm.exception.from_path, bad)
+        self.assertIn(bad, str(cm.exception))
+
+    def test_pipelined_matches_serial(self):
+        serial = os.path.join(self.tmp.name, "serial")
+        pipelined = os.path.join(self.tmp.name, "pipelined")
+        generate_pages_recursive(self.content, self.template, serial, "/Ssite/")
+        generate_pages_pipelined(self.content, self.template, pipelined, "/Ssite/", io_threads=3, queue_size=2)
+        self.assertEqual(read_tree(serial), read_tree(pipelined))
+
+    def test_pipelined_records_manifest(self):
+        out = os.path.join(self.tmp.name, "out")
+        manifest = BuildManifest()
+        generate_pages_pipelined(self.content, self.template, out, "/", manifest)
+        self.assertEqual(len(manifest.pages), 13)
+        untouched = os.path.join(out, "section1", "page1.html")
+        os.utime(untouched, (0, 0))
+        write(os.path.join(self.content, "section0", "page0.md"), "# Changed")
+        generate_pages_pipelined(self.content, self.template, out, "/", manifest)
+        # Only the edited page was rewritten
+        self.assertEqual(os.stat(untouched).st_mtime, 0)
+        self.assertIn("<h1>Changed</h1>", read_tree(out)[os.path.join("section0", "page0.html")])
+
+    def test_pipelined_error_names_source(self):
+        bad = os.path.join(self.content, "section1", "broken.md")
+        write(bad, "# Broken\n\nunclosed **bold")
+        with self.assertRaises(PageBuildError) as cm:
+            generate_pages_pipelined(self.content, self.template, os.path.join(self.tmp.name, "out"), "/")
+        self.assertEqual(cm.exception.from_path, bad)
+
+
+class TestFrontMatterSlots(TempSite, unittest.TestCase):
+    TEMPLATE = "<title>{{ Title }}</title><time>{{ Date }}</time><p>{{ tags }}|{{ Author }}</p>{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        write(os.path.join(self.content, "post.md"), "---\ndate: 2025-01-02\ntags: [a, b&c]\n---\n# Post")
+        write(os.path.join(self.content, "plain.md"), "# Plain")
+        write(os.path.join(self.content, "amp.md"), "---\ntitle: Tom & <Jerry>\n---\n# Amp")
+
+    def page(self, name):
+        with open(os.path.join(self.public, name)) as f:
+            return f.read()
+
+    def test_front_matter_fills_slots(self):
+        generate_pages_recursive(self.content, self.template, self.public, "/")
+        self.assertEqual(
+            self.page("post.html"),
+            "<title>Post</title><time>2025-01-02</time><p>a, b&amp;c|</p><div><h1>Post</h1></div>",
+        )
+        # Slots a page has no value for are left empty
+        self.assertEqual(self.page("plain.html"), "<title>Plain</title><time></time><p>|</p><div><h1>Plain</h1></div>")
+        self.assertTrue(self.page("amp.html").startswith("<title>Tom &amp; &lt;Jerry&gt;</title>"))
+
+    def test_pipelined_and_cached_renders_fill_slots(self):
+        generate_pages_recursive(self.content, self.template, self.public, "/")
+        expected = self.page("post.html")
+        cache = RenderCache(os.path.join(self.tmp.name, "render.sqlite3"))
+        for _ in range(2):
+            out = os.path.join(self.tmp.name, "pipelined")
+            generate_pages_pipelined(self.content, self.template, out, "/", cache=cache)
+            self.assertEqual(read_tree(out)["post.html"], expected)
+        cache.close()
+
+    def test_front_matter_edit_rebuilds_the_page(self):
+        manifest = BuildManifest()
+        generate_pages_recursive(self.content, self.template, self.public, "/", manifest)
+        write(os.path.join(self.content, "post.md"), "---\ndate: 2025-03-04\n---\n# Post")
+        generate_pages_recursive(self.content, self.template, self.public, "/", manifest)
+        self.assertIn("<time>2025-03-04</time>", self.page("post.html"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+
+from highlight import HighlightCache, fence_language, highlight
+
+
+class TestHighlight(unittest.TestCase):
+    def test_python_tokens(self):
+        self.assertEqual(
+            highlight('def f(x=1):  # <one>\n    return "a&b"', "python", HighlightCache()),
+            '<span class="k">def</span> f(x=<span class="m">1</span>):  <span class="c"># &lt;one&gt;</span>\n'
+            '    <span class="k">return</span> <span class="s">"a&amp;b"</span>',
+        )
+
+    def test_aliases(self):
+        self.assertEqual(highlight("echo $HOME", "bash", HighlightCache()), 'echo <span class="nv">$HOME</span>')
+        self.assertEqual(highlight("let x", "ts", HighlightCache()), '<span class="k">let</span> x')
+
+    def test_markup_tags_are_highlighted_inside(self):
+        self.assertEqual(
+            highlight('<a href="/x">T &amp; "q"</a>', "html", HighlightCache()),
+            '<span class="nt">&lt;a</span> <span class="na">href</span>=<span class="s">"/x"</span>'
+            '<span class="nt">&gt;</span>T <span class="ni">&amp;amp;</span> "q"'
+            '<span class="nt">&lt;/a</span><span class="nt">&gt;</span>',
+        )
+
+    def test_unknown_language_is_escaped(self):
+        self.assertEqual(highlight("a < b", "cobol", HighlightCache()), "a &lt; b")
+
+    def test_fence_language(self):
+        self.assertEqual(fence_language("Python title=x.py"), "python")
+        self.assertEqual(fence_language(" c++ "), "c++")
+        self.assertIsNone(fence_language("{.weird}"))
+
+
+class TestHighlightCache(unittest.TestCase):
+    def test_repeated_snippets_are_highlighted_once(self):
+        cache = HighlightCache()
+        for _ in range(3):
+            highlight("x = 1", "py", cache)
+            highlight("x = 1", "python", cache)
+        highlight("x = 1", "javascript", cache)
+        self.assertEqual((cache.misses, cache.hits, len(cache)), (2, 5, 2))
+
+    def test_least_recently_used_entries_are_dropped(self):
+        cache = HighlightCache(max_bytes=100)
+        for number in range(10):
+            highlight(f"x = {number}", "python", cache)
+        # Each entry is 28 bytes ('x = <span class="m">0</span>'), so the last three fit
+        self.assertEqual(cache.size, 84)
+        self.assertEqual(len(cache), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,6 @@
+import io
 import unittest
-from htmlnode import HTMLNode, LeafNode, ParentNode
+from htmlnode import HTMLNode, LeafNode, ParentNode, EMPTY_PROPS
 
 class TestHTMLNode(unittest.TestCase):
     def test_init(self):
@@ -66,4 +67,51 @@ class TestParentNode(unittest.TestCase):
         child_node = LeafNode("span", "child")
         parent_node = ParentNode(tag="div", children=[child_node], props={"class": "container"})
         expected_repr = "ParentNode(tag=div, children=[LeafNode(tag=span, value=child, children=[], props={})], props={'class': 'container'})"
-        self.assertEqual(repr(parent_node), expected_repr)
\ No newline at end of file
+        self.assertEqual(repr(parent_node), expected_repr)
+
+
+class TestStreamingHTML(unittest.TestCase):
+    def test_iter_html_chunks(self):
+        node = ParentNode("div", [LeafNode("b", "bold"), ParentNode("p", [LeafNode(None, "text")], {"class": "x"})])
+        self.assertEqual(
+            list(node.iter_html()),
+            ["<div>", "<b>bold</b>", '<p class="x">', "text", "</p>", "</div>"],
+        )
+
+    def test_write_to_matches_to_html(self):
+        node = ParentNode("div", [LeafNode("a", "link", {"href": "/x"}), LeafNode(None, " tail")])
+        buffer = io.StringIO()
+        node.write_to(buffer)
+        self.assertEqual(buffer.getvalue(), node.to_html())
+
+    def test_deep_tree_does_not_recurse(self):
+        node = LeafNode("span", "leaf")
+        for _ in range(5000):
+            node = ParentNode("div", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<div>" * 5000 + "<span>leaf</span>"))
+
+    def test_parent_without_children_raises(self):
+        with self.assertRaises(ValueError):
+            ParentNode("div", [ParentNode("p", [])]).to_html()
+
+
+class TestCompactNodes(unittest.TestCase):
+    def test_nodes_have_no_instance_dict(self):
+        for node in (HTMLNode(), LeafNode("b", "x"), ParentNode("p", [LeafNode("b", "x")])):
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_empty_defaults_are_shared(self):
+        a = LeafNode("b", "x")
+        b = LeafNode("i", "y")
+        self.assertIs(a.props, b.props)
+        self.assertIs(a.children, b.children)
+        self.assertIs(a.props, EMPTY_PROPS)
+
+    def test_shared_props_are_read_only(self):
+        with self.assertRaises(TypeError):
+            LeafNode("b", "x").props["class"] = "oops"
+
+    def test_empty_leaf_value_renders_empty(self):
+        node = LeafNode("img", "", {"src": "a.png", "alt": "a"})
+        self.assertEqual(node.to_html(), '<img src="a.png" alt="a"></img>')
@@ -0,0 +1,159 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from Generate import discover_pages, generate_pages_recursive
+from assets import FINGERPRINTED_RE, AssetMap
+from copystatic import sync_files
+from images import Image, ImageSet, write_image_derivatives
+from manifest import BuildManifest, hash_bytes
+from siteindex import SiteIndex
+from testsupport import TempSite, write
+
+
+class TestImageSet(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.static = os.path.join(self.tmp.name, "static")
+        write(os.path.join(self.static, "images", "tom.png"), "png")
+        write(os.path.join(self.static, "images", "logo.svg"), "svg")
+        self.tag = hash_bytes(b"png")[:10]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def images(self):
+        return ImageSet(AssetMap.build(self.static, os.path.join(self.tmp.name, "docs"), fingerprint=False))
+
+    @mock.patch("images.image_size", return_value=(1000, 500))
+    def test_attributes(self, image_size):
+        images = self.images()
+        self.assertNotIn("/images/logo.svg", images)
+        self.assertEqual(
+            images.attributes("/images/tom.png", "/Ssite/"),
+            {
+                "width": "1000",
+                "height": "500",
+                "srcset": f"/Ssite/images/tom-480w.{self.tag}.webp 480w, /Ssite/images/tom-960w.{self.tag}.webp 960w, "
+                          f"/Ssite/images/tom-1000w.{self.tag}.webp 1000w",
+                "sizes": "(max-width: 1000px) 100vw, 1000px",
+            },
+        )
+        images.attributes("/images/tom.png")
+        # The size is read once, and only for images that are asked for
+        image_size.assert_called_once_with(os.path.join(self.static, "images", "tom.png"))
+
+    @mock.patch("images.image_size", return_value=(300, 200))
+    def test_small_images_get_one_derivative(self, _):
+        self.assertEqual(self.images().derivatives("/images/tom.png"), [(300, f"/images/tom-300w.{self.tag}.webp")])
+        # Named like fingerprinted assets, so they are served as immutable too
+        self.assertTrue(FINGERPRINTED_RE.search(f"/images/tom-300w.{self.tag}.webp"))
+
+    @mock.patch("images.image_size", return_value=None)
+    def test_unreadable_images_get_nothing(self, _):
+        self.assertEqual(self.images().attributes("/images/tom.png"), {})
+
+    def test_cache_is_pruned(self):
+        cache_dir = os.path.join(self.tmp.name, "cache")
+        public = os.path.join(self.tmp.name, "docs")
+        content_hash = hash_bytes(b"png")
+        for name in (f"{content_hash}-480.webp", f"{hash_bytes(b'gone')}-480.webp", f"{content_hash}-960.webp.123.tmp"):
+            write(os.path.join(cache_dir, name), "webp")
+        manifest = BuildManifest()
+        write_image_derivatives(self.images(), manifest, SiteIndex.scan([], public, manifest), public, cache_dir)
+        # Only the derivative of an image still in the static tree is kept
+        self.assertEqual(os.listdir(cache_dir), [f"{content_hash}-480.webp"])
+
+
+class TestResponsivePages(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+        write(os.path.join(self.static, "images", "a.png"), "png")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![a](/images/a.png)")
+        write(os.path.join(self.content, "post.md"), "# Post\n\ntext")
+
+    def build(self):
+        assets = AssetMap.build(self.static, self.public, self.manifest, fingerprint=False)
+        assets.images = ImageSet(assets)
+        sync_files(self.static, self.public, self.manifest, assets=assets)
+        with mock.patch("images.image_size", return_value=(400, 300)):
+            generate_pages_recursive(self.content, self.template, self.public, "/", self.manifest, assets=assets)
+        with open(os.path.join(self.public, "index.html")) as f:
+            return f.read()
+
+    def test_img_gets_size_and_srcset(self):
+        html = self.build()
+        tag = hash_bytes(b"png")[:10]
+        self.assertIn(
+            f'<img src="/images/a.png" alt="a" width="400" height="300" srcset="/images/a-400w.{tag}.webp 400w" '
+            'sizes="(max-width: 400px) 100vw, 400px">',
+            html,
+        )
+
+    def test_changed_image_rebuilds_the_pages_showing_it(self):
+        self.build()
+        post_mtime = os.stat(os.path.join(self.public, "post.html")).st_mtime_ns
+        write(os.path.join(self.static, "images", "a.png"), "new png")
+        html = self.build()
+        self.assertIn(f"/images/a-400w.{hash_bytes(b'new png')[:10]}.webp", html)
+        self.assertEqual(os.stat(os.path.join(self.public, "post.html")).st_mtime_ns, post_mtime)
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class TestDerivatives(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.cache_dir = os.path.join(root, "cache")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        os.makedirs(os.path.join(self.static, "images"))
+        Image.new("RGB", (1000, 600), "green").save(os.path.join(self.static, "images", "wide.png"))
+        Image.new("P", (200, 100)).save(os.path.join(self.static, "images", "small.png"))
+        Image.new("RGB", (50, 50)).save(os.path.join(self.static, "images", "unused.jpg"))
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![wide](/images/wide.png)\n\n![small](/images/small.png)")
+
+    def build(self, jobs=2):
+        manifest = BuildManifest.load(self.manifest_path)
+        assets = AssetMap.build(self.static, self.public, manifest, fingerprint=False)
+        assets.images = ImageSet(assets)
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, manifest)
+        sync_files(self.static, self.public, manifest, assets=assets)
+        generate_pages_recursive(self.content, self.template, self.public, "/", manifest, site=site, assets=assets)
+        counts = write_image_derivatives(assets.images, manifest, site, self.public, self.cache_dir, jobs)
+        manifest.remove_stale(self.public)
+        manifest.save()
+        return counts
+
+    def derivatives(self):
+        return sorted(name for name in os.listdir(os.path.join(self.public, "images")) if name.endswith(".webp"))
+
+    def test_referenced_images_get_derivatives(self):
+        self.assertEqual(self.build(), {"images": 2, "made": 4, "published": 4, "unchanged": 0})
+        with open(os.path.join(self.static, "images", "wide.png"), "rb") as f:
+            wide = hash_bytes(f.read())[:10]
+        self.assertIn(f"wide-480w.{wide}.webp", self.derivatives())
+        # unused.jpg is in no page, so it is never resized
+        self.assertFalse([name for name in self.derivatives() if name.startswith("unused")])
+        with Image.open(os.path.join(self.public, "images", f"wide-480w.{wide}.webp")) as image:
+            self.assertEqual((image.format, image.size), ("WEBP", (480, 288)))
+        self.assertEqual(self.build(), {"images": 2, "made": 0, "published": 0, "unchanged": 4})
+
+    def test_cache_survives_a_clean_build(self):
+        self.build(jobs=1)
+        for name in self.derivatives():
+            os.remove(os.path.join(self.public, "images", name))
+        os.remove(self.manifest_path)
+        self.assertEqual(self.build(jobs=1), {"images": 2, "made": 0, "published": 4, "unchanged": 0})
+
+    def test_derivatives_follow_references(self):
+        self.build()
+        write(os.path.join(self.content, "index.md"), "# Home\n\n![small](/images/small.png)")
+        self.build()
+        self.assertEqual([name.split("-")[0] for name in self.derivatives()], ["small"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import unittest
+
+from Generate import generate_pages_recursive
+from copystatic import sync_files
+from linkcheck import BrokenLink, check_links, check_site_links, site_targets, url_path
+from manifest import BuildManifest
+from testsupport import TempSite, write
+
+
+class TestUrlPath(unittest.TestCase):
+    def test_external_and_anchors_are_skipped(self):
+        for url in ("https://boot.dev", "mailto:me@example.com", "//cdn.example.com/x.js", "#top", "?q=1"):
+            self.assertIsNone(url_path(url), url)
+
+    def test_internal(self):
+        self.assertEqual(url_path("/blog/tom#intro"), "/blog/tom")
+        self.assertEqual(url_path("../images/a%20b.png?v=2"), "../images/a b.png")
+
+
+class TestCheckLinks(unittest.TestCase):
+    targets = {"/", "/index.html", "/blog/", "/blog", "/blog/index.html", "/images/a.png"}
+
+    def check(self, links, page_url="/blog/index.html"):
+        return check_links([("blog.md", page_url, links)], self.targets)
+
+    def test_root_relative(self):
+        self.assertEqual(self.check([("link", "/blog", 1), ("link", "/blog/", 2), ("image", "/images/a.png", 3)]), [])
+        self.assertEqual(self.check([("link", "/missing", 4)]), [BrokenLink("blog.md", "link", "/missing", 4)])
+
+    def test_relative_resolves_against_the_page(self):
+        self.assertEqual(self.check([("image", "../images/a.png", 1), ("link", "./", 2), ("link", "..", 3)]), [])
+        self.assertEqual(self.check([("image", "images/a.png", 5)]), [BrokenLink("blog.md", "image", "images/a.png", 5)])
+
+    def test_external_links_are_not_checked(self):
+        self.assertEqual(self.check([("link", "https://example.com/missing", 1)]), [])
+
+    def test_str_names_source_and_line(self):
+        self.assertEqual(str(BrokenLink("blog.md", "link", "/x", 7)), "blog.md:7: broken link /x")
+
+
+class TestCheckSiteLinks(TempSite, unittest.TestCase):
+    TEMPLATE = "{{ Content }}"
+
+    def setUp(self):
+        super().setUp()
+        write(os.path.join(self.static, "images", "a.png"), "png")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n[Blog](/blog)\n\nsee\n![missing](/images/b.png)")
+        write(os.path.join(self.content, "blog", "index.md"), "# Blog\n\n[home](/) ![a](../images/a.png) [gone](/gone)")
+
+    def build(self, manifest, basepath="/"):
+        sync_files(self.static, self.public, manifest)
+        generate_pages_recursive(self.content, self.template, self.public, basepath, manifest)
+        return check_site_links(manifest, self.public)
+
+    def test_reports_broken_links_with_lines(self):
+        broken = self.build(BuildManifest())
+        self.assertEqual(
+            [link.as_tuple() for link in broken],
+            [
+                (os.path.join(self.content, "blog", "index.md"), "link", "/gone", 3),
+                (os.path.join(self.content, "index.md"), "image", "/images/b.png", 6),
+            ],
+        )
+
+    def test_basepath_does_not_change_the_result(self):
+        self.assertEqual(len(self.build(BuildManifest(), "/Ssite/")), 2)
+
+    def test_links_of_skipped_pages_are_kept(self):
+        path = os.path.join(self.tmp.name, "manifest.json")
+        manifest = BuildManifest(path)
+        self.build(manifest)
+        manifest.save()
+        # Nothing changed, so nothing is parsed; the links come from the manifest
+        self.assertEqual(len(self.build(BuildManifest.load(path))), 2)
+
+    def test_site_targets(self):
+        manifest = BuildManifest()
+        self.build(manifest)
+        self.assertEqual(
+            site_targets(manifest, self.public),
+            {"/", "/index.html", "/blog/", "/blog", "/blog/index.html", "/images/a.png"},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import unittest
+
+from lrucache import SizedLRUCache
+
+
+class TestSizedLRUCache(unittest.TestCase):
+    def test_least_recently_used_entries_are_dropped(self):
+        cache = SizedLRUCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("b", "bbbb")
+        self.assertEqual(cache.get("a"), "aaaa")
+        cache.put("c", "cccc")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual((len(cache), cache.size, cache.hits, cache.misses), (2, 8, 1, 1))
+
+    def test_replacing_an_entry_replaces_its_size(self):
+        cache = SizedLRUCache(max_bytes=10)
+        cache.put("a", "aaaa")
+        cache.put("a", "aa")
+        self.assertEqual((len(cache), cache.size), (1, 2))
+
+    def test_an_entry_larger_than_max_bytes_is_kept(self):
+        cache = SizedLRUCache(max_bytes=2)
+        cache.put("a", "aaaa")
+        self.assertEqual((cache.get("a"), cache.size), ("aaaa", 4))
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import unittest
+from unittest import mock
+
+from Generate import discover_pages, generate_pages_recursive
+from copystatic import sync_files
+from manifest import BuildManifest
+from siteindex import SiteIndex
+from testsupport import TempSite, write
+
+
+class TestIncrementalBuild(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.manifest_path = os.path.join(root, "cache", "manifest.json")
+        write(os.path.join(self.content, "index.md"), "# Home\n\nhello")
+        write(os.path.join(self.content, "blog", "post", "index.md"), "# Post\n\nbody")
+        write(os.path.join(self.static, "index.css"), "body {}")
+
+    def build(self, basepath="/"):
+        manifest = BuildManifest.load(self.manifest_path)
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, manifest)
+        sync_files(self.static, self.public, manifest)
+        generate_pages_recursive(self.content, self.template, self.public, basepath, manifest, site=site)
+        manifest.remove_stale(self.public)
+        manifest.save()
+        return manifest
+
+    def rebuilt_pages(self, manifest_before, manifest_after):
+        return sorted(
+            key for key, entry in manifest_after.pages.items()
+            if manifest_before.pages.get(key) != entry
+        )
+
+    def test_unchanged_build_skips_everything(self):
+        first = self.build()
+        os.utime(os.path.join(self.public, "index.html"), ns=(1, 1))
+        second = self.build()
+        # The page was not regenerated, so our fake mtime survived
+        self.assertEqual(os.stat(os.path.join(self.public, "index.html")).st_mtime_ns, 1)
+        self.assertEqual(self.rebuilt_pages(first, second), [])
+
+    def test_only_dirty_page_is_rebuilt(self):
+        first = self.build()
+        write(os.path.join(self.content, "index.md"), "# Home\n\nchanged")
+        second = self.build()
+        self.assertEqual(self.rebuilt_pages(first, second), [os.path.normpath(os.path.join(self.content, "index.md"))])
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertIn("changed", f.read())
+
+    def test_template_change_invalidates_all_pages(self):
+        first = self.build()
+        write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        second = self.build()
+        self.assertEqual(len(self.rebuilt_pages(first, second)), 2)
+
+    def test_parser_version_change_invalidates_all_pages(self):
+        first = self.build()
+        with mock.patch("manifest.PARSER_VERSION", 999):
+            second = self.build()
+        self.assertEqual(len(self.rebuilt_pages(first, second)), 2)
+        self.assertEqual(self.rebuilt_pages(second, self.build()), sorted(second.pages))
+
+    def test_basepath_change_invalidates_all_pages(self):
+        first = self.build()
+        second = self.build("/Ssite/")
+        self.assertEqual(len(self.rebuilt_pages(first, second)), 2)
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "post", "index.md"))
+        os.remove(os.path.join(self.static, "index.css"))
+        self.build()
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog")))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_slug_change_deletes_old_output(self):
+        self.build()
+        old = os.path.join(self.public, "blog", "post", "index.html")
+        self.assertTrue(os.path.exists(old))
+        write(os.path.join(self.content, "blog", "post", "index.md"), "---\nslug: the-post\n---\n# Post\n\nbody")
+        manifest = self.build()
+        new = manifest.pages[os.path.normpath(os.path.join(self.content, "blog", "post", "index.md"))]["output"]
+        self.assertNotEqual(new, os.path.normpath(old))
+        self.assertTrue(os.path.exists(new))
+        self.assertFalse(os.path.exists(old))
+        self.assertFalse(os.path.exists(os.path.dirname(old)))
+
+    def test_missing_output_is_regenerated(self):
+        self.build()
+        os.remove(os.path.join(self.public, "index.css"))
+        os.remove(os.path.join(self.public, "index.html"))
+        self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.css")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+
+if __name__ == "__main__":
+    unittest.main()
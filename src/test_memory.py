@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from Generate import discover_pages, iter_pages
+from corpus import CorpusShape, generate_site
+from memory import MemoryBudget, MemoryBudgetError, current_rss, peak_rss
+from testsupport import write
+
+MAIN = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+# A build of any size has to fit in this; see TestLargeBuild
+RSS_CEILING_MB = 384
+
+
+class TestIterPages(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.public = os.path.join(self.tmp.name, "docs")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sorted_depth_first(self):
+        for path in ("b.md", "a/z.md", "a/b/c.md", "c/index.md", "a/a.md"):
+            write(os.path.join(self.content, path), "# x")
+        self.assertEqual(
+            [os.path.relpath(from_path, self.content) for from_path, _ in iter_pages(self.content, self.public)],
+            [os.path.join("a", "a.md"), os.path.join("a", "b", "c.md"), os.path.join("a", "z.md"), "b.md",
+             os.path.join("c", "index.md")],
+        )
+        self.assertEqual(discover_pages(self.content, self.public)[-1][1], os.path.join(self.public, "c", "index.html"))
+
+    def test_deeper_than_the_recursion_limit(self):
+        # Lowered for the walk only: makedirs and the temp dir cleanup recurse themselves
+        depth, limit = 300, 200
+        write(os.path.join(self.content, *["d"] * depth, "index.md"), "# Deep")
+        previous = sys.getrecursionlimit()
+        sys.setrecursionlimit(limit)
+        try:
+            pages = discover_pages(self.content, self.public)
+        finally:
+            sys.setrecursionlimit(previous)
+        self.assertEqual(pages, [(
+            os.path.join(self.content, *["d"] * depth, "index.md"),
+            os.path.join(self.public, *["d"] * depth, "index.html"),
+        )])
+
+
+class TestMemoryBudget(unittest.TestCase):
+    def test_current_rss(self):
+        rss = current_rss()
+        if rss is None:
+            self.skipTest("no way to read the RSS here")
+        self.assertGreater(rss, 1 << 20)
+        if peak_rss() is not None:
+            self.assertGreaterEqual(peak_rss(), rss)
+
+    def test_over_budget_raises(self):
+        if current_rss() is None:
+            self.skipTest("no way to read the RSS here")
+        with self.assertRaises(MemoryBudgetError):
+            MemoryBudget(1 << 20).check("test", force=True)
+
+    def test_within_budget(self):
+        budget = MemoryBudget(1 << 40, interval=4)
+        for _ in range(8):
+            budget.check()
+        if current_rss() is not None:
+            self.assertGreater(budget.peak, 0)
+
+    def test_rss_is_only_read_every_interval(self):
+        budget = MemoryBudget(1, interval=1000)
+        for _ in range(999):
+            budget.check()
+
+
+@unittest.skipIf(peak_rss() is None, "resource is not available")
+class TestLargeBuild(unittest.TestCase):
+    """
+    Build a synthetic site in a child process with --memory-budget and check its peak
+    RSS against RSS_CEILING_MB. The full 200k-page site takes a few minutes, so it only
+    runs with SSITE_LARGE_TESTS=1; a small site is built otherwise.
+    """
+
+    def build(self, pages):
+        with tempfile.TemporaryDirectory() as root:
+            shape = CorpusShape(
+                pages=pages, depth=3, fanout=8, paragraphs=1, words_per_paragraph=10, lists=0,
+                code_blocks=0, links=1, images=0, static_files=2, static_file_size=16,
+            )
+            generate_site(root, shape)
+            subprocess.run(
+                [sys.executable, MAIN, "/", "--memory-budget", str(RSS_CEILING_MB), "--no-cache", "-q"],
+                cwd=root,
+                check=True,
+            )
+            self.assertEqual(sum(len(files) for _, _, files in os.walk(os.path.join(root, "docs"))), pages + 2)
+        self.assertLess(peak_rss(children=True) / 2**20, RSS_CEILING_MB)
+
+    def test_small_site(self):
+        self.build(2000)
+
+    @unittest.skipUnless(os.environ.get("SSITE_LARGE_TESTS"), "set SSITE_LARGE_TESTS=1 to build 200k pages")
+    def test_200k_pages(self):
+        self.build(200_000)
+
+
+if __name__ == "__main__":
+    unittest.main()
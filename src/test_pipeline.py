@@ -0,0 +1,74 @@
+import threading
+import time
+import unittest
+
+from pipeline import Stage, run_pipeline
+
+
+class TestPipeline(unittest.TestCase):
+    def test_every_item_passes_every_stage(self):
+        stages = [Stage("double", lambda x: x * 2, workers=3), Stage("inc", lambda x: x + 1, workers=2)]
+        self.assertEqual(sorted(run_pipeline(range(100), stages, maxsize=4)), [x * 2 + 1 for x in range(100)])
+
+    def test_no_stages(self):
+        self.assertEqual(list(run_pipeline(iter([1, 2]), [])), [1, 2])
+
+    def test_empty_source(self):
+        self.assertEqual(list(run_pipeline([], [Stage("id", lambda x: x, workers=2)])), [])
+
+    def test_backpressure_bounds_items_in_flight(self):
+        lock = threading.Lock()
+        in_flight = [0, 0]
+
+        def source():
+            for i in range(200):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight[1], in_flight[0])
+                yield i
+
+        def slow(x):
+            time.sleep(0.0005)
+            return x
+
+        def done(x):
+            with lock:
+                in_flight[0] -= 1
+            return x
+
+        stages = [Stage("slow", slow), Stage("done", done)]
+        self.assertEqual(len(list(run_pipeline(source(), stages, maxsize=2))), 200)
+        # Two queues of two, one item per worker and one waiting to be queued by each producer
+        self.assertLessEqual(in_flight[1], 10)
+
+    def test_stage_error_is_raised(self):
+        def fail(x):
+            if x == 7:
+                raise ValueError("seven")
+            return x
+
+        with self.assertRaisesRegex(ValueError, "seven"):
+            list(run_pipeline(range(1000), [Stage("fail", fail, workers=2)], maxsize=2))
+
+    def test_source_error_is_raised(self):
+        def source():
+            yield 1
+            raise OSError("disk gone")
+
+        with self.assertRaisesRegex(OSError, "disk gone"):
+            list(run_pipeline(source(), [Stage("id", lambda x: x)]))
+
+    def test_closing_early_stops_threads(self):
+        before = threading.active_count()
+        results = run_pipeline(range(10_000), [Stage("id", lambda x: x, workers=2)], maxsize=2)
+        next(results)
+        results.close()
+        self.assertEqual(threading.active_count(), before)
+
+    def test_stage_needs_a_worker(self):
+        with self.assertRaises(ValueError):
+            Stage("none", lambda x: x, workers=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import gzip
+import os
+import unittest
+
+from Generate import generate_pages_recursive
+from copystatic import sync_files
+from manifest import BuildManifest
+from postprocess import minify_css, minify_html, postprocess_outputs, reset_outputs
+from testsupport import TempSite, write
+
+
+class TestMinifyHtml(unittest.TestCase):
+    def test_collapses_whitespace(self):
+        html = "<!doctype html>\n<html>\n  <head>\n    <title>Hi</title>\n  </head>\n  <body>\n    <p>a   b\n c</p>\n  </body>\n</html>\n"
+        self.assertEqual(minify_html(html), "<!doctype html><html><head><title>Hi</title></head><body><p>a b c</p></body></html>")
+
+    def test_inline_spacing_is_kept(self):
+        self.assertEqual(minify_html("<p><b>a</b>\n  <i>b</i></p>"), "<p><b>a</b> <i>b</i></p>")
+
+    def test_pre_and_code_are_untouched(self):
+        html = "<div>\n<pre><code>def f():\n    return  1\n</code></pre>\n<p>use <code>a  b</code></p>\n</div>"
+        self.assertEqual(
+            minify_html(html),
+            "<div><pre><code>def f():\n    return  1\n</code></pre><p>use <code>a  b</code></p></div>",
+        )
+
+    def test_comments_are_dropped(self):
+        self.assertEqual(minify_html("<p>a<!-- note\n -->b</p>"), "<p>ab</p>")
+
+    def test_style_is_minified_as_css(self):
+        self.assertEqual(minify_html("<style>\n  a { color: red; }\n</style>"), "<style>a{color:red}</style>")
+
+
+class TestMinifyCss(unittest.TestCase):
+    def test_minify(self):
+        css = "/* site */\nbody,\nh1 > a {\n  margin: 0 auto;\n  color: #fff;\n}\n@media (max-width: 600px) { p { font: 1em  serif; } }\n"
+        self.assertEqual(minify_css(css), "body,h1>a{margin:0 auto;color:#fff}@media (max-width:600px){p{font:1em serif}}")
+
+    def test_strings_and_descendant_pseudo_classes_are_kept(self):
+        self.assertEqual(minify_css('a::before { content: "a  ;  b" }'), 'a::before{content:"a  ;  b"}')
+        self.assertEqual(minify_css("nav :hover { width: calc(1px + 2px) }"), "nav :hover{width:calc(1px + 2px)}")
+
+
+class TestPostprocessOutputs(TempSite, unittest.TestCase):
+    TEMPLATE = "<html>\n  <body>\n    {{ Content }}\n  </body>\n</html>\n"
+
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        write(os.path.join(self.static, "index.css"), "body {\n  margin: 0;\n}\n")
+        write(os.path.join(self.static, "robots.txt"), "User-agent: *\n")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n```\nkeep   this\n```")
+        write(os.path.join(self.content, "post", "index.md"), "# Post\n\nbody")
+        self.manifest_path = os.path.join(root, "manifest.json")
+
+    def build(self, minify=True, precompress=True):
+        # The same steps, in the same order, as an incremental main.build
+        self.manifest = BuildManifest.load(self.manifest_path)
+        reset_outputs(self.manifest, minify, precompress)
+        sync_files(self.static, self.public, self.manifest)
+        generate_pages_recursive(self.content, self.template, self.public, "/", self.manifest)
+        self.manifest.remove_stale(self.public)
+        counts = None
+        if minify or precompress:
+            counts = postprocess_outputs(self.manifest, minify, precompress)
+        self.manifest.save()
+        return counts
+
+    def path(self, *parts):
+        return os.path.join(self.public, *parts)
+
+    def read(self, *parts):
+        with open(self.path(*parts)) as f:
+            return f.read()
+
+    def test_minifies_and_precompresses(self):
+        self.assertEqual(self.build(), {"minified": 3, "compressed": 3, "unchanged": 0})
+        home = self.read("index.html")
+        self.assertTrue(home.startswith("<html><body><div><h1>Home</h1><pre><code>keep   this</code></pre>"))
+        self.assertIn("keep   this", home)
+        self.assertEqual(self.read("index.css"), "body{margin:0}")
+        with gzip.open(self.path("index.html.gz"), "rt") as f:
+            self.assertEqual(f.read(), home)
+        self.assertFalse(os.path.exists(self.path("robots.txt.gz")))
+        # The static source is never minified, even though the output is
+        with open(os.path.join(self.static, "index.css")) as f:
+            self.assertEqual(f.read(), "body {\n  margin: 0;\n}\n")
+
+    def test_unchanged_outputs_are_skipped(self):
+        self.build()
+        self.assertEqual(self.build(), {"minified": 0, "compressed": 0, "unchanged": 3})
+        write(os.path.join(self.content, "post", "index.md"), "# Post\n\nedited")
+        self.assertEqual(self.build(), {"minified": 1, "compressed": 1, "unchanged": 2})
+        with gzip.open(self.path("post", "index.html.gz"), "rt") as f:
+            self.assertIn("edited", f.read())
+
+    def test_turning_it_off_restores_the_outputs(self):
+        self.build()
+        self.build(minify=False, precompress=False)
+        self.assertEqual(self.read("index.html"), "<html>\n  <body>\n    <div><h1>Home</h1><pre><code>keep   this</code></pre></div>\n  </body>\n</html>\n")
+        self.assertEqual(self.read("index.css"), "body {\n  margin: 0;\n}\n")
+        self.assertFalse(os.path.exists(self.path("index.html.gz")))
+        self.assertEqual(self.manifest.post, {})
+
+    def test_removed_page_takes_its_siblings(self):
+        self.build()
+        os.remove(os.path.join(self.content, "post", "index.md"))
+        self.build()
+        self.assertFalse(os.path.exists(self.path("post", "index.html")))
+        self.assertFalse(os.path.exists(self.path("post", "index.html.gz")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import json
+import os
+import tempfile
+import unittest
+
+from ExMarkLink import markdown_to_html_node
+from Generate import generate_pages_parallel, generate_pages_recursive
+from profiler import BuildProfiler, count_nodes
+from testsupport import TempSite, write
+
+
+class TestBuildProfiler(unittest.TestCase):
+    def test_stages_are_totalled(self):
+        profiler = BuildProfiler()
+        for _ in range(3):
+            with profiler.stage("parse"):
+                pass
+        with profiler.stage("write", path="a.html"):
+            pass
+        totals = {name: count for name, _, count in profiler.stage_totals()}
+        self.assertEqual(totals, {"parse": 3, "write": 1})
+        self.assertEqual(profiler.events[-1]["args"], {"path": "a.html"})
+
+    def test_stage_recorded_when_body_raises(self):
+        profiler = BuildProfiler()
+        with self.assertRaises(ValueError):
+            with profiler.stage("parse"):
+                raise ValueError("bad")
+        self.assertEqual(len(profiler.events), 1)
+
+    def test_slowest_pages(self):
+        profiler = BuildProfiler()
+        profiler.record_page("fast.md", seconds=0.1)
+        profiler.record_page("slow.md", seconds=0.5)
+        profiler.merge([], {"slower.md": {"seconds": 0.9, "blocks": 4}})
+        self.assertEqual([path for path, _ in profiler.slowest_pages(2)], ["slower.md", "slow.md"])
+        self.assertIn("slower.md", profiler.summary())
+
+    def test_write_trace(self):
+        profiler = BuildProfiler()
+        with profiler.stage("read"):
+            pass
+        with profiler.stage("parse"):
+            pass
+        profiler.record_page("a.md", seconds=0.1)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "trace.json")
+            profiler.write_trace(path)
+            with open(path) as f:
+                trace = json.load(f)
+        self.assertEqual([event["name"] for event in trace["traceEvents"]], ["read", "parse"])
+        self.assertEqual(trace["traceEvents"][0]["ts"], 0)
+        self.assertEqual(trace["traceEvents"][0]["ph"], "X")
+        self.assertEqual(trace["otherData"]["pages"], {"a.md": {"seconds": 0.1}})
+
+    def test_count_nodes(self):
+        node = markdown_to_html_node("# Title\n\nSome **bold** text\n\n- one\n- two")
+        # Title, "Some ", bold, " text", one, two
+        self.assertEqual(count_nodes(node), 6)
+
+
+class TestProfiledGeneration(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(4):
+            write(os.path.join(self.content, f"page{i}.md"), f"# Page {i}\n\nSome **bold** text")
+
+    def check_pages(self, profiler):
+        self.assertEqual(len(profiler.pages), 4)
+        for stats in profiler.pages.values():
+            self.assertEqual(stats["blocks"], 2)
+            self.assertEqual(stats["inline_nodes"], 4)
+            self.assertGreater(stats["output_bytes"], 0)
+        names = {name for name, _, _ in profiler.stage_totals()}
+        self.assertTrue({"read", "parse", "render_write"} <= names)
+
+    def test_serial(self):
+        profiler = BuildProfiler()
+        generate_pages_recursive(self.content, self.template, os.path.join(self.tmp.name, "docs"), "/", profiler=profiler)
+        self.check_pages(profiler)
+
+    def test_parallel_merges_worker_profiles(self):
+        profiler = BuildProfiler()
+        generate_pages_parallel(
+            self.content, self.template, os.path.join(self.tmp.name, "docs"), "/", jobs=2, profiler=profiler
+        )
+        self.check_pages(profiler)
+
+
+if __name__ == "__main__":
+    unittest.main()
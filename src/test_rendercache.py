@@ -0,0 +1,84 @@
+import os
+import pickle
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+import Generate
+from rendercache import RenderCache
+from testsupport import write
+
+
+class TestRenderCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RenderCache(os.path.join(self.tmp.name, "cache", "render.sqlite3"))
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def test_put_get(self):
+        self.assertIsNone(self.cache.get("# Hi", "/"))
+        self.cache.put("# Hi", "/", "Hi", "<div><h1>Hi</h1></div>")
+        self.assertEqual(self.cache.get("# Hi", "/"), ("Hi", "<div><h1>Hi</h1></div>", []))
+        # Links are rebased while parsing, so another basepath is another render
+        self.assertIsNone(self.cache.get("# Hi", "/Ssite/"))
+
+    def test_links_round_trip(self):
+        links = [("link", "/blog", 3), ("image", "/a.png", 5)]
+        self.cache.put("x", "/", "X", "<p>x</p>", links)
+        self.assertEqual(self.cache.get("x", "/")[2], links)
+
+    def test_old_schema_is_replaced(self):
+        path = os.path.join(self.tmp.name, "old.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE pages (key TEXT PRIMARY KEY, title TEXT, html TEXT, size INTEGER, last_used INTEGER)")
+        conn.commit()
+        conn.close()
+        cache = RenderCache(path)
+        cache.put("a", "/", "A", "<p>a</p>")
+        self.assertEqual(cache.get("a", "/"), ("A", "<p>a</p>", []))
+        cache.close()
+
+    def test_parser_version_is_part_of_the_key(self):
+        key = RenderCache.key("# Hi", "/")
+        with mock.patch("rendercache.PARSER_VERSION", 999):
+            self.assertNotEqual(RenderCache.key("# Hi", "/"), key)
+
+    def test_evicts_least_recently_used(self):
+        self.cache.max_bytes = 25
+        self.cache.put("a", "/", "", "x" * 10)
+        self.cache.put("b", "/", "", "y" * 10)
+        self.cache.get("a", "/")
+        self.cache.put("c", "/", "", "z" * 10)
+        self.assertEqual(self.cache.evict(), 1)
+        self.assertIsNone(self.cache.get("b", "/"))
+        self.assertIsNotNone(self.cache.get("a", "/"))
+        self.assertIsNotNone(self.cache.get("c", "/"))
+
+    def test_pickles_for_worker_processes(self):
+        self.cache.put("a", "/", "A", "<p>a</p>")
+        clone = pickle.loads(pickle.dumps(self.cache))
+        self.assertEqual(clone.get("a", "/"), ("A", "<p>a</p>", []))
+        clone.close()
+
+    def test_template_change_does_not_reparse(self):
+        content = os.path.join(self.tmp.name, "content")
+        public = os.path.join(self.tmp.name, "docs")
+        template = os.path.join(self.tmp.name, "template.html")
+        write(os.path.join(content, "index.md"), "# Home\n\n**hello**")
+        write(template, "<title>{{ Title }}</title>{{ Content }}")
+        Generate.generate_pages_recursive(content, template, public, "/", cache=self.cache)
+
+        write(template, "<h1>{{ Title }}</h1><main>{{ Content }}</main>")
+        os.utime(template, ns=(1, 1))
+        with mock.patch("Generate.parse_page", side_effect=AssertionError("parsed again")):
+            Generate.generate_pages_recursive(content, template, public, "/", cache=self.cache)
+        with open(os.path.join(public, "index.html")) as f:
+            self.assertEqual(f.read(), "<h1>Home</h1><main><div><h1>Home</h1><p><b>hello</b></p></div></main>")
+
+
+if __name__ == "__main__":
+    unittest.main()
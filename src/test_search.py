@@ -0,0 +1,149 @@
+import json
+import os
+import unittest
+
+from ExMarkLink import markdown_to_html_node
+from Generate import discover_pages, generate_pages_parallel, generate_pages_recursive
+from manifest import BuildManifest
+from search import (
+    LOADER_NAME, PAGES_NAME, SEARCH_DIR, SearchStore, encode_positions, page_text, shard_name, tokenize,
+    write_search_index,
+)
+from siteindex import SiteIndex
+from testsupport import TempSite, write
+
+
+class TestTokenize(unittest.TestCase):
+    def test_positions(self):
+        self.assertEqual(
+            tokenize("The Ring, the ring of power; " + "x" * 41),
+            {"the": [0, 2], "ring": [1, 3], "of": [4], "power": [5]},
+        )
+
+    def test_encode_positions(self):
+        self.assertEqual(encode_positions([3, 7, 17]), "3,4,10")
+        self.assertEqual(encode_positions([0]), "0")
+
+    def test_shard_name(self):
+        self.assertEqual(shard_name("ring"), "7269.json")
+        self.assertEqual(shard_name("a"), "61.json")
+        self.assertEqual(shard_name("éowyn"), "c3a96f.json")
+
+    def test_tree_and_cached_html_agree(self):
+        node = markdown_to_html_node(
+            "# Tom **Bombadil**\n\nA `code` & [link](/x)\n\n```\ncode_here = 1\n```\n\n```python\nprint('hi')\n```"
+        )
+        self.assertEqual(tokenize(page_text(node)), tokenize(page_text(node.to_html())))
+        self.assertIn("bombadil", tokenize(page_text(node)))
+        # Highlighting spans are markup, not words
+        self.assertNotIn("span", tokenize(page_text(node)))
+
+
+class TestSearchIndex(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.store = SearchStore(os.path.join(root, "search.sqlite3"))
+        write(os.path.join(self.content, "index.md"), "# Home\n\n{{ pages blog }}")
+        write(os.path.join(self.content, "blog", "tom.md"), "# Tom\n\nOld Tom Bombadil is a merry fellow")
+        write(os.path.join(self.content, "blog", "ring.md"), "# The Ring\n\nOne ring to rule them all")
+        write(os.path.join(self.content, "blog", "draft.md"), "---\ndraft: true\n---\n# Secret\n\nunpublished")
+
+    def tearDown(self):
+        self.store.close()
+        super().tearDown()
+
+    def build(self, generate=generate_pages_recursive, search=True, **kwargs):
+        manifest = BuildManifest.load(self.manifest_path)
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, manifest)
+        store = self.store if search else None
+        generate(self.content, self.template, self.public, "/", manifest, site=site, search=store, **kwargs)
+        counts = write_search_index(self.store, site, manifest, self.public, "/") if search else None
+        manifest.remove_stale(self.public)
+        manifest.save()
+        return counts
+
+    def read(self, name):
+        with open(os.path.join(self.public, SEARCH_DIR, name)) as f:
+            return json.load(f)
+
+    def lookup(self, term):
+        """
+        {url: [positions]} for a term, decoded the way search.js does.
+        """
+        pages = self.read(PAGES_NAME)
+        path = os.path.join(self.public, SEARCH_DIR, shard_name(term))
+        if not os.path.exists(path):
+            return {}
+        found = {}
+        for page, *gaps in self.read(shard_name(term)).get(term, []):
+            positions, position = [], 0
+            for gap in gaps:
+                position += gap
+                positions.append(position)
+            found[pages[page][0]] = positions
+        return found
+
+    def test_index(self):
+        counts = self.build()
+        self.assertEqual(counts["indexed"], 0)
+        self.assertEqual(counts["pages"], 3)
+        self.assertEqual(self.read(PAGES_NAME), [["/", "Home"], ["/blog/ring.html", "The Ring"], ["/blog/tom.html", "Tom"]])
+        # The home page lists the posts: "Home The Ring Tom"
+        self.assertEqual(self.lookup("tom"), {"/": [3], "/blog/tom.html": [0, 2]})
+        self.assertEqual(self.lookup("ring"), {"/": [2], "/blog/ring.html": [1, 3]})
+        # Drafts aren't published, so they aren't searchable either
+        self.assertEqual(self.lookup("unpublished"), {})
+        self.assertTrue(os.path.exists(os.path.join(self.public, SEARCH_DIR, LOADER_NAME)))
+
+    def test_parallel_matches_serial(self):
+        self.build()
+        serial = {name: self.read(name) for name in os.listdir(os.path.join(self.public, SEARCH_DIR)) if name.endswith(".json")}
+        os.remove(self.manifest_path)
+        self.store.remove(list(self.store.pages()))
+        counts = self.build(generate_pages_parallel, jobs=2)
+        self.assertEqual(counts["indexed"], 0)
+        parallel = {name: self.read(name) for name in os.listdir(os.path.join(self.public, SEARCH_DIR)) if name.endswith(".json")}
+        self.assertEqual(parallel, serial)
+
+    def test_edit_rewrites_only_affected_shards(self):
+        self.build()
+        write(os.path.join(self.content, "blog", "ring.md"), "# The Ring\n\nOne ring to find them")
+        counts = self.build()
+        self.assertEqual(counts["indexed"], 0)
+        # Only the "fi"(nd) shard is new; "them" kept its position, so "th" is untouched
+        self.assertEqual(counts["written"], 1)
+        self.assertEqual(self.lookup("find"), {"/blog/ring.html": [5]})
+        for term in ("rule", "all"):
+            self.assertFalse(os.path.exists(os.path.join(self.public, SEARCH_DIR, shard_name(term))))
+
+    def test_removed_page_is_dropped(self):
+        self.build()
+        os.remove(os.path.join(self.content, "blog", "tom.md"))
+        self.build()
+        self.assertEqual(self.lookup("bombadil"), {})
+        self.assertEqual(len(self.read(PAGES_NAME)), 2)
+
+    def test_other_files_under_search_are_kept(self):
+        write(os.path.join(self.content, "search", "index.md"), "# Search\n\nfind things")
+        other = os.path.join(self.public, SEARCH_DIR, "notes.txt")
+        write(other, "mine")
+        self.build()
+        self.assertTrue(os.path.exists(other))
+        self.assertTrue(os.path.exists(os.path.join(self.public, SEARCH_DIR, "index.html")))
+        # Without search only the index goes
+        self.build(search=False)
+        self.assertEqual(sorted(os.listdir(os.path.join(self.public, SEARCH_DIR))), ["index.html", "notes.txt"])
+
+    def test_pages_built_without_search_are_indexed_at_the_end(self):
+        self.build(search=False)
+        counts = self.build()
+        # The outputs were up to date, so nothing was rendered while generating
+        self.assertEqual(counts["indexed"], 3)
+        self.assertEqual(self.lookup("merry"), {"/blog/tom.html": [6]})
+        self.assertEqual(self.build()["indexed"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+import os
+import unittest
+
+from manifest import BuildManifest
+from serve import Rebuilder, SiteWatcher, inject_livereload, LIVERELOAD_SCRIPT
+from testsupport import TempSite, write
+
+
+class TestWatchRebuild(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        write(os.path.join(self.content, "index.md"), "# Home\n\nhello")
+        write(os.path.join(self.content, "post", "index.md"), "# Post\n\nbody")
+        write(os.path.join(self.static, "index.css"), "body {}")
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"))
+        self.rebuilder = Rebuilder(self.manifest, "/", self.content, self.static, self.public, self.template)
+        self.watcher = SiteWatcher([self.content, self.static, self.template])
+        self.rebuilder.apply({path: "added" for path in self.watcher.snapshot})
+
+    def touch(self, path, text):
+        write(path, text)
+        # Make sure the edit is visible even on filesystems with coarse mtimes
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000_000))
+
+    def test_initial_apply_builds_everything(self):
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "post", "index.html")))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.css")))
+
+    def test_markdown_edit_rebuilds_only_that_page(self):
+        self.touch(os.path.join(self.content, "post", "index.md"), "# Post\n\nedited")
+        changes = self.watcher.poll()
+        self.assertEqual(changes, {os.path.normpath(os.path.join(self.content, "post", "index.md")): "modified"})
+        touched = self.rebuilder.apply(changes)
+        self.assertEqual(touched, [os.path.normpath(os.path.join(self.public, "post", "index.html"))])
+
+    def test_markdown_edit_parses_only_the_edited_block(self):
+        path = os.path.join(self.content, "post", "index.md")
+        paragraphs = [f"paragraph {number}" for number in range(50)]
+        self.touch(path, "# Post\n\n" + "\n\n".join(paragraphs))
+        self.rebuilder.apply(self.watcher.poll())
+        blocks = self.rebuilder.blocks
+        misses = blocks.misses
+        paragraphs[20] = "edited paragraph"
+        self.touch(path, "# Post\n\n" + "\n\n".join(paragraphs))
+        self.rebuilder.apply(self.watcher.poll())
+        self.assertEqual(blocks.misses - misses, 1)
+        with open(os.path.join(self.public, "post", "index.html")) as f:
+            self.assertIn("<p>paragraph 19</p><p>edited paragraph</p><p>paragraph 21</p>", f.read())
+
+    def test_template_edit_rebuilds_every_page(self):
+        self.touch(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.rebuilder.apply(self.watcher.poll())
+        for page in ("index.html", os.path.join("post", "index.html")):
+            with open(os.path.join(self.public, page)) as f:
+                self.assertTrue(f.read().startswith("<h1>"))
+
+    def test_partial_edit_rebuilds_every_page(self):
+        partial = os.path.join(self.tmp.name, "nav.html")
+        write(partial, "<nav></nav>")
+        self.touch(self.template, "{{> nav.html }}<title>{{ Title }}</title>{{ Content }}")
+        self.rebuilder.apply(self.watcher.poll())
+        watcher = SiteWatcher(self.rebuilder.watched_paths())
+        self.touch(partial, "<nav>new</nav>")
+        touched = self.rebuilder.apply(watcher.poll())
+        self.assertEqual(len(touched), 2)
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertTrue(f.read().startswith("<nav>new</nav>"))
+
+    def test_page_template_edit_rebuilds_the_pages_using_it(self):
+        post_template = os.path.join(self.tmp.name, "post.html")
+        write(post_template, "<article>{{ Content }}</article>")
+        self.touch(os.path.join(self.content, "post", "index.md"), "---\ntemplate: post.html\n---\n# Post\n\nbody")
+        self.rebuilder.apply(self.watcher.poll())
+        watcher = SiteWatcher(self.rebuilder.watched_paths())
+        self.assertIn(os.path.normpath(post_template), watcher.snapshot)
+        self.touch(post_template, "<main>{{ Content }}</main>")
+        touched = self.rebuilder.apply(watcher.poll())
+        self.assertEqual(touched, [os.path.normpath(os.path.join(self.public, "post", "index.html"))])
+        with open(os.path.join(self.public, "post", "index.html")) as f:
+            self.assertTrue(f.read().startswith("<main>"))
+
+    def test_title_edit_rebuilds_listing_page(self):
+        self.touch(os.path.join(self.content, "index.md"), "# Home\n\n{{ pages . }}")
+        self.rebuilder.apply(self.watcher.poll())
+        self.touch(os.path.join(self.content, "post", "index.md"), "# Renamed\n\nbody")
+        touched = self.rebuilder.apply(self.watcher.poll())
+        self.assertEqual(
+            sorted(touched),
+            sorted(os.path.normpath(os.path.join(self.public, *page)) for page in [("index.html",), ("post", "index.html")]),
+        )
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertIn('<a href="/post">Renamed</a>', f.read())
+
+    def test_removed_sources_remove_outputs(self):
+        os.remove(os.path.join(self.content, "post", "index.md"))
+        os.remove(os.path.join(self.static, "index.css"))
+        self.rebuilder.apply(self.watcher.poll())
+        self.assertFalse(os.path.exists(os.path.join(self.public, "post")))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.css")))
+
+    def test_new_static_file_in_new_directory(self):
+        write(os.path.join(self.static, "fonts", "a.woff"), "font")
+        self.rebuilder.apply(self.watcher.poll())
+        self.assertTrue(os.path.exists(os.path.join(self.public, "fonts", "a.woff")))
+
+    def test_no_changes(self):
+        self.assertEqual(self.watcher.poll(), {})
+
+
+class TestLiveReload(unittest.TestCase):
+    def test_inject_before_body(self):
+        self.assertEqual(inject_livereload("<body>x</body>"), "<body>x" + LIVERELOAD_SCRIPT + "</body>")
+
+    def test_inject_without_body(self):
+        self.assertEqual(inject_livereload("<p>x</p>"), "<p>x</p>" + LIVERELOAD_SCRIPT)
+
+
+if __name__ == "__main__":
+    unittest.main()
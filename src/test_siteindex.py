@@ -0,0 +1,165 @@
+import os
+import unittest
+from unittest import mock
+
+from Generate import PageBuildError, discover_pages, generate_pages_parallel, generate_pages_pipelined, generate_pages_recursive
+from manifest import BuildManifest
+from siteindex import SiteIndex, expand_listings, page_url, scan_markdown
+from testsupport import TempSite, write
+
+
+class TestScan(unittest.TestCase):
+    def test_scan_markdown(self):
+        md = "intro\n\n# Title\n\n## Sub\n\n{{ pages blog }}\n\n```\n{{ pages code }}\n```"
+        self.assertEqual(scan_markdown(md), ("Title", ["blog"]))
+
+    def test_page_url(self):
+        self.assertEqual(page_url(os.path.join("docs", "index.html"), "docs"), "/")
+        self.assertEqual(page_url(os.path.join("docs", "blog", "tom", "index.html"), "docs"), "/blog/tom")
+        self.assertEqual(page_url(os.path.join("docs", "blog", "x.html"), "docs"), "/blog/x.html")
+
+    def test_expand_listings(self):
+        listings = {os.path.join("content", "blog"): [("/blog/a", "A"), ("/blog/b", "B")]}
+        md = "# Home\n\n{{ pages blog }}\n\n{{ pages other }}"
+        self.assertEqual(
+            expand_listings(md, os.path.join("content", "index.md"), listings),
+            "# Home\n\n- [A](/blog/a)\n- [B](/blog/b)\n\n{{ pages other }}",
+        )
+
+
+class TestListingPages(TempSite, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.tmp.name
+        self.manifest_path = os.path.join(root, "manifest.json")
+        write(os.path.join(self.content, "index.md"), "# Home\n\n{{ pages blog }}")
+        write(os.path.join(self.content, "about.md"), "# About")
+        write(os.path.join(self.content, "blog", "index.md"), "# Blog\n\n{{ pages . }}")
+        write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom\n\ntext")
+        write(os.path.join(self.content, "blog", "glorfindel", "index.md"), "# Glorfindel\n\ntext")
+
+    def build(self, generate=generate_pages_recursive, drafts=False, keep_bytes=0, **kwargs):
+        manifest = BuildManifest.load(self.manifest_path)
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, manifest, drafts, keep_bytes)
+        self.site = site
+        for page in discover_pages(self.content, self.public):
+            if os.path.exists(page[1]):
+                os.utime(page[1], ns=(1, 1))
+        generate(self.content, self.template, self.public, "/", manifest, site=site, **kwargs)
+        manifest.save()
+        return sorted(
+            os.path.relpath(entry["output"], self.public)
+            for entry in manifest.pages.values()
+            if os.stat(entry["output"]).st_mtime_ns != 1
+        )
+
+    def read(self, *parts):
+        with open(os.path.join(self.public, *parts)) as f:
+            return f.read()
+
+    def test_listing_is_rendered(self):
+        self.build()
+        self.assertIn('<ul><li><a href="/blog/glorfindel">Glorfindel</a></li><li><a href="/blog/tom">Tom</a></li></ul>', self.read("index.html"))
+        self.assertIn('<a href="/blog/tom">Tom</a>', self.read("blog", "index.html"))
+        self.assertNotIn("/about", self.read("index.html"))
+
+    def test_body_edit_rebuilds_only_that_post(self):
+        self.build()
+        write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom\n\nnew text")
+        self.assertEqual(self.build(), [os.path.join("blog", "tom", "index.html")])
+
+    def test_title_edit_rebuilds_the_listing_pages(self):
+        self.build()
+        write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom Bombadil\n\ntext")
+        rebuilt = [os.path.join("blog", "index.html"), os.path.join("blog", "tom", "index.html"), "index.html"]
+        self.assertEqual(self.build(), rebuilt)
+        self.assertIn("Tom Bombadil", self.read("index.html"))
+
+    def test_new_post_rebuilds_the_listing_pages(self):
+        self.build()
+        write(os.path.join(self.content, "blog", "majesty", "index.md"), "# Majesty")
+        rebuilt = [os.path.join("blog", "index.html"), os.path.join("blog", "majesty", "index.html"), "index.html"]
+        self.assertEqual(self.build(), rebuilt)
+
+    def test_parallel_and_pipelined(self):
+        self.build()
+        write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom Bombadil\n\ntext")
+        self.assertEqual(len(self.build(generate_pages_parallel, jobs=2)), 3)
+        write(os.path.join(self.content, "blog", "tom", "index.md"), "# Tom\n\ntext")
+        self.assertEqual(len(self.build(generate_pages_pipelined)), 3)
+        self.assertIn(">Tom<", self.read("index.html"))
+
+    def test_markdown_read_by_the_index_is_not_read_again(self):
+        self.build()
+        expected = self.read("index.html")
+        for generate in (generate_pages_recursive, generate_pages_pipelined):
+            write(os.path.join(self.content, "index.md"), "# Home\n\n{{ pages blog }}\n\nnew")
+            with mock.patch("Generate.read_page", side_effect=AssertionError("read twice")):
+                self.assertEqual(self.build(generate, keep_bytes=1 << 20), ["index.html"])
+            self.assertIn("<p>new</p>", self.read("index.html"))
+            self.assertTrue(all(meta.markdown is None for meta in self.site.pages.values()))
+            write(os.path.join(self.content, "index.md"), "# Home\n\n{{ pages blog }}")
+            self.build(generate, keep_bytes=1 << 20)
+            self.assertEqual(self.read("index.html"), expected)
+
+    def test_markdown_is_kept_up_to_keep_bytes(self):
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, keep_bytes=40)
+        kept = sorted(os.path.relpath(meta.source, self.content) for meta in site.pages.values() if meta.markdown)
+        # In discovery order, as long as they fit: blog/index.md and index.md don't
+        self.assertEqual(kept, ["about.md", os.path.join("blog", "glorfindel", "index.md"), os.path.join("blog", "tom", "index.md")])
+        about = os.path.join(self.content, "about.md")
+        self.assertEqual(site.take_markdown(about), ("# About", site.get(about).hash))
+        # Handed out once; the build reads it again if it needs it twice
+        self.assertIsNone(site.take_markdown(about))
+
+    def post(self, name, front, body="text"):
+        path = os.path.join(self.content, "blog", name, "index.md")
+        write(path, f"---\n{front}\n---\n# {name.title()}\n\n{body}")
+        return path
+
+    def test_dates_order_listings_and_drafts_are_left_out(self):
+        self.post("glorfindel", "date: 2023-01-01")
+        self.post("tom", "date: 2024-01-01\ntitle: Tom Bombadil")
+        self.post("majesty", "draft: true")
+        self.build()
+        self.assertIn(
+            '<ul><li><a href="/blog/tom">Tom Bombadil</a></li><li><a href="/blog/glorfindel">Glorfindel</a></li></ul>',
+            self.read("index.html"),
+        )
+        self.assertIn("<title>Tom Bombadil</title>", self.read("blog", "tom", "index.html"))
+        self.assertNotIn("date:", self.read("blog", "tom", "index.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "majesty", "index.html")))
+        self.build(drafts=True)
+        self.assertIn('<a href="/blog/majesty">Majesty</a>', self.read("index.html"))
+
+    def test_slug_and_template(self):
+        write(os.path.join(self.tmp.name, "post.html"), "<article>{{ Content }}</article>")
+        self.post("tom", "slug: bombadil\ntemplate: post.html")
+        self.build()
+        self.assertIn('<a href="/blog/bombadil">Tom</a>', self.read("index.html"))
+        self.assertTrue(self.read("blog", "bombadil", "index.html").startswith("<article>"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "blog", "tom", "index.html")))
+
+    def test_template_outside_the_template_directory_is_refused(self):
+        path = self.post("tom", "template: ../../x.html")
+        for generate in (generate_pages_recursive, generate_pages_parallel, generate_pages_pipelined):
+            with self.assertRaises(PageBuildError) as raised:
+                self.build(generate)
+            self.assertEqual(raised.exception.from_path, path)
+            self.assertIn("outside", str(raised.exception))
+
+    def test_unchanged_pages_only_have_their_front_matter_read(self):
+        path = self.post("glorfindel", "draft: false")
+        os.utime(path, ns=(10**18, 10**18))
+        self.build()
+        # Same size and mtime: the new heading isn't seen, the new front matter is
+        write(path, "---\ndraft: true \n---\n# Glorfindez\n\ntext")
+        os.utime(path, ns=(10**18, 10**18))
+        site = SiteIndex.scan(discover_pages(self.content, self.public), self.public, BuildManifest.load(self.manifest_path))
+        meta = site.get(path)
+        self.assertEqual((meta.title, meta.draft), ("Glorfindel", True))
+        self.assertEqual(site.listing(os.path.join(self.content, "blog")), [("/blog/tom", "Tom")])
+
+
+if __name__ == "__main__":
+    unittest.main()
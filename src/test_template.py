@@ -0,0 +1,94 @@
+import io
+import os
+import tempfile
+import unittest
+
+from ExMarkLink import markdown_to_html_node
+from htmlnode import LeafNode, ParentNode
+from template import CompiledTemplate, load_template, read_template
+
+
+class TestCompiledTemplate(unittest.TestCase):
+    def render(self, template, values):
+        buffer = io.StringIO()
+        template.render(buffer, values)
+        return buffer.getvalue()
+
+    def test_slots(self):
+        template = CompiledTemplate("<title>{{ Title }}</title><p>{{date}}</p>{{ Content }}")
+        self.assertEqual(template.slots, ["title", "date", "content"])
+        html = self.render(template, {"title": "Hi", "date": "2025-01-01", "content": ParentNode("div", [LeafNode("b", "x")])})
+        self.assertEqual(html, "<title>Hi</title><p>2025-01-01</p><div><b>x</b></div>")
+
+    def test_missing_slot_keeps_placeholder(self):
+        template = CompiledTemplate("{{ Title }} {{ Author }}")
+        self.assertEqual(self.render(template, {"title": "Hi"}), "Hi {{ Author }}")
+
+    def test_basepath_rewrites_template_not_values(self):
+        template = CompiledTemplate('<link href="/index.css" /><img src="/a.png" />{{ Content }}', "/Ssite/")
+        html = self.render(template, {"content": 'href="/literal'})
+        self.assertEqual(html, '<link href="/Ssite/index.css" /><img src="/Ssite/a.png" />href="/literal')
+
+    def test_links_rebased_while_parsing(self):
+        node = markdown_to_html_node("[home](/blog) [ext](https://x.org/)\n\n![a](/images/a.png)\n\n```\nhref=\"/kept\"\n```", "/Ssite/")
+        paragraph, image_paragraph, code = node.children
+        self.assertEqual(paragraph.to_html(), '<p><a href="/Ssite/blog">home</a> <a href="https://x.org/">ext</a></p>')
+        self.assertEqual(image_paragraph.children[0].props["src"], "/Ssite/images/a.png")
+        self.assertEqual(code.to_html(), '<pre><code>href="/kept"</code></pre>')
+
+    def test_load_template_is_cached_until_changed(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("{{ Title }}")
+            first = load_template(path)
+            self.assertIs(load_template(path), first)
+            self.assertIsNot(load_template(path, "/Ssite/"), first)
+            with open(path, "w") as f:
+                f.write("<h1>{{ Title }}</h1>")
+            os.utime(path, ns=(1, 1))
+            self.assertEqual(load_template(path).literals, ["<h1>", "</h1>"])
+
+
+class TestPartials(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.template = self.write("template.html", "{{> partials/head.html }}<main>{{ Content }}</main>")
+        self.head = self.write(os.path.join("partials", "head.html"), "<title>{{ Title }}</title>{{>nav.html}}")
+        self.nav = self.write(os.path.join("partials", "nav.html"), '<a href="/">home</a>')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, text):
+        path = os.path.join(self.tmp.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(text)
+        return path
+
+    def test_includes_are_expanded_relative_to_the_including_file(self):
+        source, dependencies = read_template(self.template)
+        self.assertEqual(source, '<title>{{ Title }}</title><a href="/">home</a><main>{{ Content }}</main>')
+        self.assertEqual(dependencies, [os.path.normpath(p) for p in (self.template, self.head, self.nav)])
+
+    def test_partials_are_rendered_and_rebased(self):
+        buffer = io.StringIO()
+        load_template(self.template, "/Ssite/").render(buffer, {"title": "T", "content": "c"})
+        self.assertEqual(buffer.getvalue(), '<title>T</title><a href="/Ssite/">home</a><main>c</main>')
+
+    def test_partial_edit_reloads_template(self):
+        first = load_template(self.template)
+        self.write(os.path.join("partials", "nav.html"), "<nav></nav>")
+        os.utime(self.nav, ns=(1, 1))
+        self.assertIsNot(load_template(self.template), first)
+        self.assertIn("<nav></nav>", "".join(load_template(self.template).literals))
+
+    def test_include_cycle(self):
+        self.write(os.path.join("partials", "nav.html"), "{{> head.html }}")
+        with self.assertRaisesRegex(ValueError, "cycle"):
+            read_template(self.template)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+
+
+def write(path, text):
+    """
+    Write text (or bytes) to path, creating its directories.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb" if isinstance(text, bytes) else "w") as f:
+        f.write(text)
+
+
+def read_tree(root):
+    """
+    {path relative to root: text} for every file under root.
+    """
+    files = {}
+    for dir_path, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dir_path, filename)
+            with open(path) as f:
+                files[os.path.relpath(path, root)] = f.read()
+    return files
+
+
+class TempSite:
+    """
+    A TestCase mixin for tests that build a site in a temporary directory. setUp makes
+    the directory (tmp) and the content, static, public and template paths in it, and
+    writes TEMPLATE as the template; tearDown removes everything.
+    """
+
+    TEMPLATE = "<title>{{ Title }}</title>{{ Content }}"
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "docs")
+        self.template = os.path.join(root, "template.html")
+        write(self.template, self.TEMPLATE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
@@ -10,6 +10,8 @@ class TextType(Enum):
     IMAGE = 5
 
 class TextNode:
+    __slots__ = ("text", "text_type", "URL")
+
     def __init__(self, text: str, text_type: TextType, URL: str = None):
         self.text = text
         self.text_type = text_type